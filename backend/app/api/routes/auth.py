@@ -23,6 +23,7 @@ from ...schemas.user import (
     UserUpdate,
     UserPasswordUpdate,
     UserListItem,
+    UserListPage,
     UserStats,
     TokenResponse,
     TokenRefreshRequest,
@@ -315,9 +316,9 @@ async def get_current_user_stats(
 
 # ============= 管理员接口 =============
 
-@router.get("/users", response_model=list[UserListItem])
+@router.get("/users", response_model=UserListPage)
 async def list_users(
-    skip: int = 0,
+    cursor: Optional[str] = None,
     limit: int = 100,
     is_active: Optional[bool] = None,
     current_user: User = Depends(get_current_superuser),
@@ -326,12 +327,24 @@ async def list_users(
     """
     获取用户列表(仅管理员)
 
-    - **skip**: 跳过数量
+    按注册时间从新到旧游标分页
+    - **cursor**: 上一页返回的 next_cursor(第一页不传)
     - **limit**: 限制数量(最多100)
     - **is_active**: 是否活跃(可选)
     """
-    users = UserService.list_users(db, skip=skip, limit=min(limit, 100), is_active=is_active)
-    return [UserListItem.model_validate(user) for user in users]
+    try:
+        users, next_cursor = UserService.list_users(
+            db, cursor=cursor, limit=min(limit, 100), is_active=is_active
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return UserListPage(
+        items=[UserListItem.model_validate(user) for user in users],
+        next_cursor=next_cursor,
+    )
 
 
 @router.get("/users/{user_id}", response_model=UserResponse)
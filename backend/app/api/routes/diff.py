@@ -2,17 +2,596 @@
 差异比较相关的API路由
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
+import asyncio
+import hashlib
+import json
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Union
 
+from ...core.config import settings
 from ...core.database import get_db
-from ...schemas.document import DiffResponse, DiffChange
+from ...models.document import Version
+from ...schemas.document import (
+    DiffResponse,
+    DiffChange,
+    DiffStatsResponse,
+    CompactDiffResponse,
+    BatchDiffRequest,
+    BatchDiffResponse,
+    DiffHunk,
+    HunkDiffResponse,
+)
 from ...services.version_service import VersionService
+from ...services.diff_executor import diff_executor, DiffExecutorBusy
+from ...services.diff_cache import diff_cache, DiffResultCache
+from ...services.version_diff_service import VersionDiffService, PRECOMPUTE_MODES
+from ...services.diff_script import DiffScript, MODIFIED
 from ...services.diff_service import DiffService
 
 router = APIRouter(prefix="/diff", tags=["diff"])
 
 
-@router.get("/{version1_id}/{version2_id}", response_model=DiffResponse)
+async def _compute_diff(
+    db: Session,
+    old_version: Version,
+    new_version: Version,
+    diff_mode: str = "semantic",
+    ignore_whitespace: bool = False,
+    ignore_case: bool = False,
+    algorithm: Optional[str] = None,
+    time_budget_ms: Optional[int] = None,
+):
+    """
+    计算两个版本的差异脚本
+
+    依次查询进程内缓存、持久化差异表，未命中时在差异执行器中计算，
+    队列已满时返回 503
+    """
+    algorithm = algorithm or settings.DIFF_ALGORITHM
+    cache_key = None
+    if old_version.content_hash and new_version.content_hash:
+        cache_key = DiffResultCache.make_key(
+            old_version.content_hash,
+            new_version.content_hash,
+            diff_mode,
+            ignore_whitespace,
+            ignore_case,
+            algorithm,
+        )
+        cached = diff_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        # 保存版本时后台预计算的相邻版本差异
+        if (
+            diff_mode in PRECOMPUTE_MODES
+            and not ignore_whitespace
+            and not ignore_case
+        ):
+            stored = VersionDiffService.get_diff(
+                db, old_version, new_version, diff_mode, algorithm
+            )
+            if stored is not None:
+                script, stats = stored
+                diff_cache.put(
+                    cache_key, stored, DiffResultCache.estimate_size(script, stats)
+                )
+                return stored
+
+    try:
+        script, stats = await diff_executor.compute_script(
+            old_version.content,
+            new_version.content,
+            diff_mode=diff_mode,
+            ignore_whitespace=ignore_whitespace,
+            ignore_case=ignore_case,
+            algorithm=algorithm,
+            time_budget_ms=time_budget_ms,
+        )
+    except DiffExecutorBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Diff service is busy, please retry later",
+        )
+
+    # 降级结果与时间预算有关，不写入缓存
+    if cache_key is not None and not stats["degraded"]:
+        diff_cache.put(
+            cache_key, (script, stats), DiffResultCache.estimate_size(script, stats)
+        )
+    return script, stats
+
+
+async def _stats_response(
+    old_version: Version,
+    new_version: Version,
+    diff_mode: str = "semantic",
+    ignore_whitespace: bool = False,
+    ignore_case: bool = False,
+    algorithm: Optional[str] = None,
+    time_budget_ms: Optional[int] = None,
+) -> DiffStatsResponse:
+    """
+    只计算变化量（stats_only）
+
+    不生成差异脚本，结果按内容哈希缓存，队列已满时返回 503
+    """
+    algorithm = algorithm or settings.DIFF_ALGORITHM
+    cache_key = None
+    stats = None
+    if old_version.content_hash and new_version.content_hash:
+        cache_key = ("stats",) + DiffResultCache.make_key(
+            old_version.content_hash,
+            new_version.content_hash,
+            diff_mode,
+            ignore_whitespace,
+            ignore_case,
+            algorithm,
+        )
+        stats = diff_cache.get(cache_key)
+
+    if stats is None:
+        try:
+            stats = await diff_executor.run(
+                DiffService.compute_stats,
+                old_version.content,
+                new_version.content,
+                size=len(old_version.content) + len(new_version.content),
+                diff_mode=diff_mode,
+                ignore_whitespace=ignore_whitespace,
+                ignore_case=ignore_case,
+                algorithm=algorithm,
+                time_budget_ms=time_budget_ms,
+            )
+        except DiffExecutorBusy:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Diff service is busy, please retry later",
+            )
+        if cache_key is not None and not stats["degraded"]:
+            diff_cache.put(cache_key, stats, DiffResultCache.estimate_stats_size(stats))
+
+    return DiffStatsResponse(
+        old_version_id=old_version.id,
+        new_version_id=new_version.id,
+        old_version_number=old_version.version_number,
+        new_version_number=new_version.version_number,
+        stats=stats,
+        degraded=stats.get("degraded", False),
+    )
+
+
+async def _patch_response(
+    old_version: Version,
+    new_version: Version,
+    context: int = 3,
+    algorithm: Optional[str] = None,
+    time_budget_ms: Optional[int] = None,
+) -> StreamingResponse:
+    """
+    以 unified diff 格式流式返回两个版本的差异
+
+    行级 opcodes 在差异执行器中计算，补丁文本按 hunk 逐个生成并发送，
+    不在内存中拼接完整输出
+    """
+    try:
+        script = await diff_executor.run(
+            DiffService.compute_patch_script,
+            old_version.content,
+            new_version.content,
+            size=len(old_version.content) + len(new_version.content),
+            algorithm=algorithm,
+            time_budget_ms=time_budget_ms,
+        )
+    except DiffExecutorBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Diff service is busy, please retry later",
+        )
+
+    title = " ".join(old_version.document.title.split())
+    filename = (
+        f"{old_version.document_id}_v{old_version.version_number}"
+        f"_v{new_version.version_number}.patch"
+    )
+    return StreamingResponse(
+        script.iter_unified(
+            f"a/{title}\tv{old_version.version_number}",
+            f"b/{title}\tv{new_version.version_number}",
+            context,
+        ),
+        media_type="text/x-diff",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+async def _refine_ops(
+    script: DiffScript,
+    ops: Iterable[Tuple[int, int, int, int, int]],
+    refine: Optional[str],
+    algorithm: Optional[str] = None,
+) -> Dict[Tuple, Tuple]:
+    """
+    对修改块做行内细化
+
+    只处理传入的变化（例如当前页的 hunk），结果按块内容缓存；
+    未命中的块分批提交到差异执行器并行计算，执行器繁忙时跳过细化
+
+    Returns:
+        变化 -> (old_spans, new_spans)
+    """
+    if not refine or script.unit != "line":
+        return {}
+
+    algorithm = algorithm or settings.DIFF_ALGORITHM
+    spans = {}
+    missing = []
+    for op in ops:
+        if op[0] != MODIFIED:
+            continue
+        old_start, old_end = script.old_span(op[1], op[2])
+        new_start, new_end = script.new_span(op[3], op[4])
+        old_chunk = script.old_text[old_start:old_end]
+        new_chunk = script.new_text[new_start:new_end]
+        key = (
+            "refine",
+            refine,
+            algorithm,
+            hashlib.md5(old_chunk.encode("utf-8")).hexdigest(),
+            hashlib.md5(new_chunk.encode("utf-8")).hexdigest(),
+        )
+        cached = diff_cache.get(key)
+        if cached is not None:
+            if cached:
+                spans[op] = cached
+            continue
+        missing.append((op, key, old_chunk, new_chunk))
+
+    if not missing:
+        return spans
+
+    batch_count = min(len(missing), diff_executor.workers)
+    batches = [missing[k::batch_count] for k in range(batch_count)]
+
+    async def run_batch(batch):
+        chunks = [(old_chunk, new_chunk) for _, _, old_chunk, new_chunk in batch]
+        try:
+            results = await diff_executor.run(
+                DiffService.refine_changes,
+                chunks,
+                refine,
+                algorithm,
+                size=sum(len(a) + len(b) for a, b in chunks),
+            )
+        except DiffExecutorBusy:
+            return
+        for (op, key, _, _), result in zip(batch, results):
+            # 无法细化的块也缓存（空元组），避免重复尝试
+            value = result or ()
+            size = 128 + 32 * (len(result[0]) + len(result[1]) if result else 0)
+            diff_cache.put(key, value, size)
+            if result:
+                spans[op] = result
+
+    await asyncio.gather(*(run_batch(batch) for batch in batches))
+    return spans
+
+
+async def _diff_response(
+    old_version: Version,
+    new_version: Version,
+    script: DiffScript,
+    stats: Dict,
+    response_format: str = "full",
+    context: int = 3,
+    hunk_offset: int = 0,
+    limit: int = 50,
+    refine: Optional[str] = None,
+    algorithm: Optional[str] = None,
+):
+    """
+    按请求的格式构造差异响应
+
+    紧凑格式直接序列化 opcodes，不为每个变化创建 DiffChange 对象；
+    hunk 格式只为当前页的 hunk 创建 DiffChange（也只细化当前页）；
+    ndjson 格式边序列化边发送
+    """
+    if response_format == "hunks":
+        hunks = script.hunks(context)
+        page = hunks[hunk_offset:hunk_offset + limit]
+        next_offset = hunk_offset + limit
+        spans = await _refine_ops(
+            script, (op for hunk in page for op in hunk.ops), refine, algorithm
+        )
+        return HunkDiffResponse(
+            old_version_id=old_version.id,
+            new_version_id=new_version.id,
+            old_version_number=old_version.version_number,
+            new_version_number=new_version.version_number,
+            unit=script.unit,
+            context=context,
+            hunks=[
+                DiffHunk(
+                    old_start=hunk.old_start + 1,
+                    old_count=hunk.old_end - hunk.old_start,
+                    new_start=hunk.new_start + 1,
+                    new_count=hunk.new_end - hunk.new_start,
+                    changes=[script.change(*op, spans=spans.get(op)) for op in hunk.ops],
+                )
+                for hunk in page
+            ],
+            total_hunks=len(hunks),
+            hunk_offset=hunk_offset,
+            next_hunk_offset=next_offset if next_offset < len(hunks) else None,
+            stats=stats,
+            degraded=stats.get("degraded", False),
+        )
+
+    spans = await _refine_ops(script, script, refine, algorithm)
+
+    if response_format == "ndjson":
+        return StreamingResponse(
+            _ndjson_records(old_version, new_version, script, stats, spans),
+            media_type="application/x-ndjson",
+        )
+
+    if response_format == "compact":
+        return JSONResponse(
+            content=_diff_payload(
+                old_version, new_version, script, stats, "compact", spans
+            )
+        )
+
+    return DiffResponse(
+        old_version_id=old_version.id,
+        new_version_id=new_version.id,
+        old_version_number=old_version.version_number,
+        new_version_number=new_version.version_number,
+        changes=[script.change(*op, spans=spans.get(op)) for op in script],
+        stats=stats,
+        degraded=stats.get("degraded", False),
+    )
+
+
+def _diff_payload(
+    old_version: Version,
+    new_version: Version,
+    script: DiffScript,
+    stats: Dict,
+    response_format: str = "full",
+    spans: Optional[Dict[Tuple, Tuple]] = None,
+) -> Dict:
+    """
+    构造可直接序列化的差异结果（不经过 pydantic 校验，空字段省略）
+
+    紧凑格式下行内细化结果以 [变化序号, old_spans, new_spans] 列表给出
+    """
+    spans = spans or {}
+    payload = {
+        "old_version_id": old_version.id,
+        "new_version_id": new_version.id,
+        "old_version_number": old_version.version_number,
+        "new_version_number": new_version.version_number,
+    }
+    if response_format == "compact":
+        payload["old_content_hash"] = old_version.content_hash
+        payload["new_content_hash"] = new_version.content_hash
+        payload.update(script.to_compact())
+        if spans:
+            payload["spans"] = [
+                [index, *spans[op]] for index, op in enumerate(script) if op in spans
+            ]
+    else:
+        payload["changes"] = [
+            script.change_dict(*op, spans=spans.get(op)) for op in script
+        ]
+    payload["stats"] = stats
+    payload["degraded"] = stats.get("degraded", False)
+    return payload
+
+
+def _ndjson_records(
+    old_version: Version,
+    new_version: Version,
+    script: DiffScript,
+    stats: Dict,
+    spans: Optional[Dict[Tuple, Tuple]] = None,
+) -> Iterator[str]:
+    """
+    生成 NDJSON 差异流
+
+    首行为 type=header 的版本信息，中间每行一个变化（字段同 DiffChange），
+    末行为 type=stats 的统计信息
+    """
+    yield json.dumps(
+        {
+            "type": "header",
+            "old_version_id": old_version.id,
+            "new_version_id": new_version.id,
+            "old_version_number": old_version.version_number,
+            "new_version_number": new_version.version_number,
+            "unit": script.unit,
+        }
+    ) + "\n"
+    yield from script.iter_ndjson(spans=spans)
+    yield json.dumps(
+        {"type": "stats", "stats": stats, "degraded": stats.get("degraded", False)}
+    ) + "\n"
+
+
+@router.post("/batch", response_model=BatchDiffResponse)
+async def compare_versions_batch(
+    request: BatchDiffRequest,
+    db: Session = Depends(get_db),
+):
+    """
+    批量比较多对版本的差异
+
+    - **pairs**: 版本对列表，`old` / `new` 为字符串时表示版本ID，为整数时表示版本号
+    - **document_id**: 使用版本号时必填
+    - 其余选项与单个比较接口相同，**format** 支持 `full` 和 `compact`
+
+    所有版本内容通过一次查询加载，相同的版本对只计算一次，各版本对并行计算；
+    结果按 "旧:新" 为键返回，单个版本对的错误记录在 errors 中，不影响其他结果
+    """
+    pairs = {pair.key: pair for pair in request.pairs}
+    if len(pairs) > settings.DIFF_BATCH_MAX_PAIRS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many pairs (max {settings.DIFF_BATCH_MAX_PAIRS})",
+        )
+
+    refs = [ref for pair in pairs.values() for ref in (pair.old, pair.new)]
+    version_ids = {ref for ref in refs if isinstance(ref, str)}
+    version_numbers = {ref for ref in refs if isinstance(ref, int)}
+    if version_numbers and not request.document_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="document_id is required when comparing by version number",
+        )
+
+    versions = VersionService.get_versions_in(
+        db, list(version_ids), request.document_id, list(version_numbers)
+    )
+    by_id = {version.id: version for version in versions}
+    by_number = {
+        version.version_number: version
+        for version in versions
+        if version.document_id == request.document_id
+    }
+
+    def resolve(ref):
+        return by_id.get(ref) if isinstance(ref, str) else by_number.get(ref)
+
+    results = {}
+    errors = {}
+    semaphore = asyncio.Semaphore(settings.DIFF_BATCH_CONCURRENCY)
+
+    async def run_pair(keys, old_version, new_version):
+        async with semaphore:
+            try:
+                script, stats = await _compute_diff(
+                    db,
+                    old_version,
+                    new_version,
+                    diff_mode=request.diff_mode,
+                    ignore_whitespace=request.ignore_whitespace,
+                    ignore_case=request.ignore_case,
+                    algorithm=request.algorithm,
+                    time_budget_ms=request.time_budget_ms,
+                )
+            except HTTPException as e:
+                for key in keys:
+                    errors[key] = e.detail
+                return
+        payload = _diff_payload(old_version, new_version, script, stats, request.format)
+        for key in keys:
+            results[key] = payload
+
+    # 以版本ID与版本号混用时，不同的键可能指向同一对版本
+    resolved = {}
+    for key, pair in pairs.items():
+        old_version = resolve(pair.old)
+        new_version = resolve(pair.new)
+        if not old_version or not new_version:
+            errors[key] = "Version not found"
+        elif old_version.document_id != new_version.document_id:
+            errors[key] = "Versions must belong to the same document"
+        else:
+            entry = resolved.setdefault(
+                (old_version.id, new_version.id), ([], old_version, new_version)
+            )
+            entry[0].append(key)
+
+    await asyncio.gather(*(run_pair(*entry) for entry in resolved.values()))
+
+    return JSONResponse(content={"results": results, "errors": errors})
+
+
+@router.get("/cache/stats")
+async def get_diff_cache_stats():
+    """
+    获取差异结果缓存的统计信息
+
+    包含条目数、占用字节数以及命中/未命中/淘汰次数
+    """
+    return diff_cache.stats()
+
+
+@router.get("/{version1_id}/{version2_id}/patch")
+async def export_patch_by_id(
+    version1_id: str,
+    version2_id: str,
+    context: int = Query(default=3, ge=0, le=100, description="上下文行数"),
+    algorithm: Optional[str] = Query(
+        default=None,
+        pattern="^(difflib|myers|patience|histogram)$",
+        description="差异算法: difflib, myers, patience, histogram",
+    ),
+    time_budget_ms: Optional[int] = Query(
+        default=None, ge=1, le=60000, description="计算时间预算（毫秒）"
+    ),
+    db: Session = Depends(get_db),
+):
+    """
+    导出两个版本之间的 unified diff 补丁（通过版本ID）
+
+    - **context**: 每个 hunk 前后的上下文行数
+    - **algorithm**: 差异算法（默认使用配置 DIFF_ALGORITHM）
+    - **time_budget_ms**: 计算时间预算，超出时只保留公共首尾行，中间部分整体替换
+
+    响应为 text/x-diff 流，按换行符分行，可直接用于 `patch` / `git apply`
+    """
+    version1 = VersionService.get_version(db, version1_id)
+    version2 = VersionService.get_version(db, version2_id)
+
+    if not version1 or not version2:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Version not found"
+        )
+
+    if version1.document_id != version2.document_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Versions must belong to the same document",
+        )
+
+    return await _patch_response(version1, version2, context, algorithm, time_budget_ms)
+
+
+@router.get("/document/{document_id}/number/{version_num1}/{version_num2}/patch")
+async def export_patch_by_number(
+    document_id: str,
+    version_num1: int,
+    version_num2: int,
+    context: int = Query(default=3, ge=0, le=100),
+    algorithm: Optional[str] = Query(
+        default=None, pattern="^(difflib|myers|patience|histogram)$"
+    ),
+    time_budget_ms: Optional[int] = Query(default=None, ge=1, le=60000),
+    db: Session = Depends(get_db),
+):
+    """
+    导出两个版本之间的 unified diff 补丁（通过版本号）
+    """
+    version1 = VersionService.get_version_by_number(db, document_id, version_num1)
+    version2 = VersionService.get_version_by_number(db, document_id, version_num2)
+
+    if not version1 or not version2:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Version not found"
+        )
+
+    return await _patch_response(version1, version2, context, algorithm, time_budget_ms)
+
+
+@router.get(
+    "/{version1_id}/{version2_id}",
+    response_model=Union[
+        DiffResponse, CompactDiffResponse, HunkDiffResponse, DiffStatsResponse
+    ],
+)
 async def compare_versions_by_id(
     version1_id: str,
     version2_id: str,
@@ -25,6 +604,29 @@ async def compare_versions_by_id(
         default=False, description="是否忽略空白字符差异"
     ),
     ignore_case: bool = Query(default=False, description="是否忽略大小写"),
+    algorithm: Optional[str] = Query(
+        default=None,
+        pattern="^(difflib|myers|patience|histogram)$",
+        description="差异算法: difflib, myers, patience, histogram",
+    ),
+    time_budget_ms: Optional[int] = Query(
+        default=None, ge=1, le=60000, description="计算时间预算（毫秒），超出则降级"
+    ),
+    response_format: str = Query(
+        default="full",
+        alias="format",
+        pattern="^(full|compact|hunks|ndjson)$",
+        description="响应格式: full, compact, hunks, ndjson",
+    ),
+    context: int = Query(default=3, ge=0, le=100, description="hunk 上下文行数"),
+    hunk_offset: int = Query(default=0, ge=0, description="hunk 分页起始位置"),
+    limit: int = Query(default=50, ge=1, le=500, description="每页 hunk 数"),
+    refine: Optional[str] = Query(
+        default=None, pattern="^(word|char)$", description="修改块的行内细化粒度"
+    ),
+    stats_only: bool = Query(
+        default=False, description="只返回统计信息，不生成变化内容"
+    ),
     db: Session = Depends(get_db),
 ):
     """
@@ -39,6 +641,24 @@ async def compare_versions_by_id(
       - `semantic`: 语义级差异（推荐，智能）
     - **ignore_whitespace**: 忽略空白字符
     - **ignore_case**: 忽略大小写
+    - **algorithm**: 差异算法（默认使用配置 DIFF_ALGORITHM）
+      - `myers`: Myers O(ND)，耗时与编辑距离成正比
+      - `patience` / `histogram`: 以低频行为锚点，对齐效果更直观
+      - `difflib`: 标准库 SequenceMatcher
+    - **time_budget_ms**: 计算时间预算，超出时按 character → word → line → 整块替换
+      逐级降级，响应中 `degraded` 为 true
+    - **format**: 响应格式
+      - `full`: 完整的 DiffChange 列表
+      - `compact`: opcodes（字符偏移）+ 插入的文本，未变化和删除的内容由
+        客户端从旧版本内容中截取（版本不可变，可长期缓存）
+      - `hunks`: 类似 unified diff，只返回变化及前后 **context** 个单元的上下文，
+        按 **hunk_offset** / **limit** 分页，`next_hunk_offset` 为下一页的起始位置
+      - `ndjson`: 流式响应（application/x-ndjson），首行 header，每行一个变化，
+        末行为 stats 记录，适合超大文档
+    - **refine**: 行级/语义模式下对修改块做行内细化（`word` 或 `char`），
+      在变化中附加 `old_spans` / `new_spans`，只高亮实际变化的单词或字符
+    - **stats_only**: 只返回新增、删除、修改、未变化的数量（忽略 format 等参数），
+      不生成变化内容，适合版本列表和统计面板。语义模式按行计数
     """
     # 获取版本
     version1 = VersionService.get_version(db, version1_id)
@@ -56,28 +676,48 @@ async def compare_versions_by_id(
             detail="Versions must belong to the same document",
         )
 
+    if stats_only:
+        return await _stats_response(
+            version1,
+            version2,
+            diff_mode=diff_mode,
+            ignore_whitespace=ignore_whitespace,
+            ignore_case=ignore_case,
+            algorithm=algorithm,
+            time_budget_ms=time_budget_ms,
+        )
+
     # 计算差异
-    changes, stats = DiffService.compute_diff(
-        version1.content,
-        version2.content,
+    script, stats = await _compute_diff(
+        db,
+        version1,
+        version2,
         diff_mode=diff_mode,
         ignore_whitespace=ignore_whitespace,
         ignore_case=ignore_case,
+        algorithm=algorithm,
+        time_budget_ms=time_budget_ms,
     )
 
-    return DiffResponse(
-        old_version_id=version1_id,
-        new_version_id=version2_id,
-        old_version_number=version1.version_number,
-        new_version_number=version2.version_number,
-        changes=changes,
-        stats=stats,
+    return await _diff_response(
+        version1,
+        version2,
+        script,
+        stats,
+        response_format,
+        context,
+        hunk_offset,
+        limit,
+        refine,
+        algorithm,
     )
 
 
 @router.get(
     "/document/{document_id}/number/{version_num1}/{version_num2}",
-    response_model=DiffResponse,
+    response_model=Union[
+        DiffResponse, CompactDiffResponse, HunkDiffResponse, DiffStatsResponse
+    ],
 )
 async def compare_versions_by_number(
     document_id: str,
@@ -88,6 +728,18 @@ async def compare_versions_by_number(
     ),
     ignore_whitespace: bool = Query(default=False),
     ignore_case: bool = Query(default=False),
+    algorithm: Optional[str] = Query(
+        default=None, pattern="^(difflib|myers|patience|histogram)$"
+    ),
+    time_budget_ms: Optional[int] = Query(default=None, ge=1, le=60000),
+    response_format: str = Query(
+        default="full", alias="format", pattern="^(full|compact|hunks|ndjson)$"
+    ),
+    context: int = Query(default=3, ge=0, le=100),
+    hunk_offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=50, ge=1, le=500),
+    refine: Optional[str] = Query(default=None, pattern="^(word|char)$"),
+    stats_only: bool = Query(default=False),
     db: Session = Depends(get_db),
 ):
     """
@@ -107,32 +759,67 @@ async def compare_versions_by_number(
             status_code=status.HTTP_404_NOT_FOUND, detail="Version not found"
         )
 
+    if stats_only:
+        return await _stats_response(
+            version1,
+            version2,
+            diff_mode=diff_mode,
+            ignore_whitespace=ignore_whitespace,
+            ignore_case=ignore_case,
+            algorithm=algorithm,
+            time_budget_ms=time_budget_ms,
+        )
+
     # 计算差异
-    changes, stats = DiffService.compute_diff(
-        version1.content,
-        version2.content,
+    script, stats = await _compute_diff(
+        db,
+        version1,
+        version2,
         diff_mode=diff_mode,
         ignore_whitespace=ignore_whitespace,
         ignore_case=ignore_case,
+        algorithm=algorithm,
+        time_budget_ms=time_budget_ms,
     )
 
-    return DiffResponse(
-        old_version_id=version1.id,
-        new_version_id=version2.id,
-        old_version_number=version1.version_number,
-        new_version_number=version2.version_number,
-        changes=changes,
-        stats=stats,
+    return await _diff_response(
+        version1,
+        version2,
+        script,
+        stats,
+        response_format,
+        context,
+        hunk_offset,
+        limit,
+        refine,
+        algorithm,
     )
 
 
-@router.get("/document/{document_id}/latest/{version_id}", response_model=DiffResponse)
+@router.get(
+    "/document/{document_id}/latest/{version_id}",
+    response_model=Union[
+        DiffResponse, CompactDiffResponse, HunkDiffResponse, DiffStatsResponse
+    ],
+)
 async def compare_with_latest(
     document_id: str,
     version_id: str,
     diff_mode: str = Query(default="semantic"),
     ignore_whitespace: bool = Query(default=False),
     ignore_case: bool = Query(default=False),
+    algorithm: Optional[str] = Query(
+        default=None, pattern="^(difflib|myers|patience|histogram)$"
+    ),
+    time_budget_ms: Optional[int] = Query(default=None, ge=1, le=60000),
+    response_format: str = Query(
+        default="full", alias="format", pattern="^(full|compact|hunks|ndjson)$"
+    ),
+    context: int = Query(default=3, ge=0, le=100),
+    hunk_offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=50, ge=1, le=500),
+    refine: Optional[str] = Query(default=None, pattern="^(word|char)$"),
+    stats_only: bool = Query(default=False),
     db: Session = Depends(get_db),
 ):
     """
@@ -154,31 +841,51 @@ async def compare_with_latest(
             status_code=status.HTTP_404_NOT_FOUND, detail="No latest version found"
         )
 
+    if stats_only:
+        return await _stats_response(
+            old_version,
+            latest_version,
+            diff_mode=diff_mode,
+            ignore_whitespace=ignore_whitespace,
+            ignore_case=ignore_case,
+            algorithm=algorithm,
+            time_budget_ms=time_budget_ms,
+        )
+
     # 如果是同一版本，返回空差异
     if old_version.id == latest_version.id:
-        return DiffResponse(
-            old_version_id=old_version.id,
-            new_version_id=latest_version.id,
-            old_version_number=old_version.version_number,
-            new_version_number=latest_version.version_number,
-            changes=[],
-            stats={"added": 0, "deleted": 0, "modified": 0, "unchanged": 0},
+        return await _diff_response(
+            old_version,
+            latest_version,
+            DiffScript(old_version.content, latest_version.content, "line"),
+            {"added": 0, "deleted": 0, "modified": 0, "unchanged": 0},
+            response_format,
+            context,
+            hunk_offset,
+            limit,
         )
 
     # 计算差异
-    changes, stats = DiffService.compute_diff(
-        old_version.content,
-        latest_version.content,
+    script, stats = await _compute_diff(
+        db,
+        old_version,
+        latest_version,
         diff_mode=diff_mode,
         ignore_whitespace=ignore_whitespace,
         ignore_case=ignore_case,
+        algorithm=algorithm,
+        time_budget_ms=time_budget_ms,
     )
 
-    return DiffResponse(
-        old_version_id=old_version.id,
-        new_version_id=latest_version.id,
-        old_version_number=old_version.version_number,
-        new_version_number=latest_version.version_number,
-        changes=changes,
-        stats=stats,
+    return await _diff_response(
+        old_version,
+        latest_version,
+        script,
+        stats,
+        response_format,
+        context,
+        hunk_offset,
+        limit,
+        refine,
+        algorithm,
     )
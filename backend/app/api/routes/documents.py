@@ -1,7 +1,7 @@
 """
 文档相关的API路由
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
@@ -12,14 +12,21 @@ from ...schemas.document import (
     DocumentCreate,
     DocumentUpdate,
     DocumentResponse,
+    DocumentListPage,
     VersionCreate,
     VersionResponse,
     VersionListItem,
+    VersionListPage,
+    VersionActivityResponse,
+    BlameResponse,
     VersionTagCreate,
     VersionTagResponse,
     SuccessResponse,
 )
 from ...services.version_service import VersionService
+from ...services.version_diff_service import VersionDiffService
+from ...services.version_storage import VersionStorage
+from ...services.blame_service import BlameService
 
 router = APIRouter(prefix="/documents", tags=["documents"])
 
@@ -27,21 +34,29 @@ router = APIRouter(prefix="/documents", tags=["documents"])
 @router.post("", response_model=DocumentResponse, status_code=status.HTTP_201_CREATED)
 async def create_document(
     doc_data: DocumentCreate,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """
     创建新文档
 
-    创建一个新文档并自动生成初始版本
+    创建一个新文档并自动生成初始版本，初始版本的变化量和压缩存储在后台完成
     """
-    document = VersionService.create_document(db, doc_data, owner_id=current_user.id)
+    document, initial_version = VersionService.create_document(
+        db, doc_data, owner_id=current_user.id
+    )
+    background_tasks.add_task(
+        VersionDiffService.precompute_parent_diffs, initial_version.id
+    )
+    # 预计算完成后再压缩初始版本
+    background_tasks.add_task(VersionStorage.compact_after_save, initial_version.id)
     return document
 
 
-@router.get("", response_model=List[DocumentResponse])
+@router.get("", response_model=DocumentListPage)
 async def get_documents(
-    skip: int = 0,
+    cursor: Optional[str] = None,
     limit: int = 20,
     sort_by: str = "updated_at",
     folder_id: Optional[str] = None,
@@ -51,16 +66,19 @@ async def get_documents(
     """
     获取当前用户的文档列表
 
-    支持分页和排序
-    - **skip**: 跳过的记录数
+    支持游标分页和排序
+    - **cursor**: 上一页返回的 next_cursor（第一页不传，须使用相同的排序字段）
     - **limit**: 返回的最大记录数
     - **sort_by**: 排序字段 (updated_at, created_at, title)
     - **folder_id**: 文件夹ID筛选(可选)
     """
-    documents = VersionService.get_user_documents(
-        db, current_user.id, skip, limit, sort_by, folder_id
-    )
-    return documents
+    try:
+        documents, next_cursor = VersionService.get_user_documents(
+            db, current_user.id, cursor, limit, sort_by, folder_id
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return DocumentListPage(items=documents, next_cursor=next_cursor)
 
 
 @router.get("/{document_id}", response_model=DocumentResponse)
@@ -154,6 +172,7 @@ async def delete_document(
 async def create_version(
     document_id: str,
     version_data: VersionCreate,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
@@ -161,6 +180,7 @@ async def create_version(
     创建新版本
 
     为文档创建新版本。如果内容未变化，则不创建新版本。
+    创建成功后在后台预计算与父版本的差异，并将父版本转为增量存储。
     """
     # 检查文档权限
     document = VersionService.get_document(db, document_id)
@@ -186,13 +206,17 @@ async def create_version(
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Document not found"
         )
+
+    background_tasks.add_task(VersionDiffService.precompute_parent_diffs, version.id)
+    # 预计算完成后再压缩新版本、将父版本转为增量存储
+    background_tasks.add_task(VersionStorage.compact_after_save, version.id)
     return version
 
 
-@router.get("/{document_id}/versions", response_model=List[VersionListItem])
+@router.get("/{document_id}/versions", response_model=VersionListPage)
 async def get_versions(
     document_id: str,
-    skip: int = 0,
+    cursor: Optional[str] = None,
     limit: int = 50,
     save_type: str = None,
     db: Session = Depends(get_db),
@@ -200,29 +224,47 @@ async def get_versions(
     """
     获取文档的版本列表
 
-    返回文档的所有版本（不含内容，减少数据量）
-    - **skip**: 跳过的记录数
+    返回文档的所有版本（不含内容，内容长度读取保存时记录的列，不读取内容），
+    按版本号从新到旧游标分页
+    - **cursor**: 上一页返回的 next_cursor（第一页不传）
     - **limit**: 返回的最大记录数
     - **save_type**: 筛选保存类型 (manual, auto, draft)
     """
-    versions = VersionService.get_versions(db, document_id, skip, limit, save_type)
-
-    # 转换为列表项格式（不包含完整内容）
-    version_items = []
-    for v in versions:
-        version_items.append(
-            VersionListItem(
-                id=v.id,
-                version_number=v.version_number,
-                created_at=v.created_at,
-                author=v.author,
-                commit_message=v.commit_message,
-                save_type=v.save_type,
-                content_length=len(v.content),
-            )
+    try:
+        rows, next_cursor = VersionService.get_versions(
+            db, document_id, cursor, limit, save_type
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return VersionListPage(
+        items=[VersionListItem.model_validate(row) for row in rows],
+        next_cursor=next_cursor,
+    )
+
+
+@router.get("/{document_id}/activity", response_model=VersionActivityResponse)
+async def get_version_activity(document_id: str, db: Session = Depends(get_db)):
+    """
+    获取文档的版本活动数据
+
+    一次查询返回所有版本的新增/删除行数和字节变化（按列组织），
+    用于绘制活动曲线，不读取版本内容也不计算差异
+    """
+    document = VersionService.get_document(db, document_id)
+    if not document:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Document not found"
         )
 
-    return version_items
+    rows = VersionService.get_version_activity(db, document_id)
+    return VersionActivityResponse(
+        document_id=document_id,
+        version_numbers=[row.version_number for row in rows],
+        created_at=[row.created_at for row in rows],
+        lines_added=[row.lines_added for row in rows],
+        lines_removed=[row.lines_removed for row in rows],
+        byte_delta=[row.byte_delta for row in rows],
+    )
 
 
 @router.get("/{document_id}/versions/{version_id}", response_model=VersionResponse)
@@ -257,11 +299,44 @@ async def get_version_by_number(
     return version
 
 
+@router.get("/{document_id}/blame/{version_number}", response_model=BlameResponse)
+async def get_blame(
+    document_id: str,
+    version_number: int,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+):
+    """
+    获取指定版本的逐行溯源信息（blame）
+
+    返回连续且来源相同的行区间，以及最后修改这些行的版本和作者。
+    行来源索引在保存版本后的后台任务中增量维护；旧版本缺失索引时本次请求只计算不写入，
+    并在后台补建
+    """
+    version = VersionService.get_version_by_number(db, document_id, version_number)
+    if not version:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Version not found"
+        )
+    if not BlameService.is_indexed(db, version.id):
+        background_tasks.add_task(BlameService.backfill_version, version.id)
+
+    return BlameResponse(
+        document_id=document_id,
+        version_id=version.id,
+        version_number=version.version_number,
+        ranges=BlameService.get_blame(db, version),
+    )
+
+
 @router.post(
     "/{document_id}/restore/{version_id}", response_model=VersionResponse
 )
 async def restore_version(
-    document_id: str, version_id: str, db: Session = Depends(get_db)
+    document_id: str,
+    version_id: str,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
 ):
     """
     恢复到指定版本
@@ -274,6 +349,10 @@ async def restore_version(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Version not found or does not belong to this document",
         )
+
+    background_tasks.add_task(VersionDiffService.precompute_parent_diffs, version.id)
+    # 预计算完成后再压缩新版本、将父版本转为增量存储
+    background_tasks.add_task(VersionStorage.compact_after_save, version.id)
     return version
 
 
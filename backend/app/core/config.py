@@ -43,6 +43,46 @@ class Settings(BaseSettings):
     # 文件存储配置
     MAX_CONTENT_SIZE: int = 10 * 1024 * 1024  # 10MB
 
+    # 差异比较配置
+    DIFF_ALGORITHM: str = "myers"  # difflib, myers, patience, histogram
+    DIFF_TIME_BUDGET_MS: int = 5000  # 单次差异计算的时间预算
+    DIFF_COST_BUDGET: int = 20_000_000  # 单个粒度的计算量预算（比较步数）
+    DIFF_LEVEL_TIME_SHARE: float = 0.5  # 每个粒度最多使用剩余时间预算的比例，其余留给更粗的粒度
+    DIFF_UNITS_PER_SECOND: int = 1_000_000  # 预估每秒可切分和预处理的比较单元数，用于跳过明显超时的粒度
+    DIFF_WORD_TOKENIZER: str = "cjk"  # 单词模式分词器: whitespace, cjk, jieba（需安装）
+    DIFF_TOKEN_CACHE_MAX_BYTES: int = 32 * 1024 * 1024  # 分词结果缓存容量（每个进程，字节）
+    DIFF_LONG_LINE_THRESHOLD: int = 1000  # 超过该长度的行按句子/标点切分为伪行，0 表示不切分
+    DIFF_PSEUDO_LINE_WIDTH: int = 200  # 按句子切分后仍超过该长度的片段继续按标点或定宽切分
+    DIFF_MOVE_MIN_LINES: int = 3  # 语义模式下识别为移动的最少连续行数
+
+    # 语义模式替换块的相似度判定（逐级：长度上界 -> 字符上界 -> shingle Jaccard -> 精确 ratio）
+    DIFF_SIMILARITY_THRESHOLD: float = 0.3  # 相似度超过该值视为修改，否则为删除 + 新增
+    DIFF_SHINGLE_SIZE: int = 3  # shingle 的字符数
+    DIFF_SHINGLE_ACCEPT: float = 0.5  # Jaccard 不低于该值直接判定为修改
+    DIFF_SHINGLE_REJECT: float = 0.02  # Jaccard 不高于该值直接判定为删除 + 新增
+
+    # 修改块的行内细化（refine=word|char）
+    DIFF_REFINE_MAX_CHARS: int = 20_000  # 超过该字符数的修改块不细化
+    DIFF_REFINE_COST_BUDGET: int = 1_000_000  # 单个修改块的计算量预算
+
+    # 差异计算进程池配置
+    DIFF_EXECUTOR_WORKERS: int = 0  # 0 表示使用 CPU 核数
+    DIFF_EXECUTOR_MAX_PENDING: int = 32  # 最大排队任务数，超出返回 503
+    DIFF_EXECUTOR_INLINE_THRESHOLD: int = 64 * 1024  # 小于该字符数时直接计算
+
+    # 差异结果缓存配置（进程内 LRU）
+    DIFF_CACHE_MAX_BYTES: int = 128 * 1024 * 1024
+
+    # 批量差异比较配置
+    DIFF_BATCH_MAX_PAIRS: int = 200  # 单次请求最多比较的版本对数
+    DIFF_BATCH_CONCURRENCY: int = 8  # 同时计算的版本对数
+
+    # 版本存储配置（反向增量 + 关键帧）
+    VERSION_KEYFRAME_INTERVAL: int = 50  # 每隔多少个版本保存一个完整关键帧，0 表示不使用增量存储
+    VERSION_DELTA_MAX_RATIO: float = 0.5  # 增量不超过完整内容的该比例时才以增量存储
+    VERSION_CODEC: str = "zlib"  # 压缩编码: plain（不压缩）, zlib, lzma, zstd（需安装 zstandard）
+    VERSION_COMPRESS_MIN_BYTES: int = 4096  # 小于该字节数（UTF-8）的内容和增量不压缩
+
     # 时区配置
     DEFAULT_TIMEZONE: str = "Asia/Shanghai"
 
@@ -0,0 +1,118 @@
+"""
+键集（游标）分页
+按上一页最后一行的排序键定位下一页，不使用 OFFSET，任意深度的分页查询代价相同
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from sqlalchemy import DateTime, and_, or_
+from sqlalchemy.orm import Query
+
+# 排序键：(列, 是否降序)；最后一个排序键必须唯一（通常为主键）
+SortKey = Tuple[Any, bool]
+
+
+def encode_cursor(name: str, values: Sequence[Any]) -> str:
+    """
+    编码游标（对客户端不透明）
+
+    Args:
+        name: 排序方式名称（游标只能用于同一排序方式）
+        values: 上一页最后一行的排序键值
+
+    Returns:
+        URL 安全的游标字符串
+    """
+    payload = [
+        value.isoformat() if isinstance(value, datetime) else value
+        for value in values
+    ]
+    data = json.dumps([name, payload], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, name: str, keys: Sequence[SortKey]) -> List[Any]:
+    """
+    解码游标，游标无效或不属于该排序方式时抛出 ValueError
+
+    Args:
+        cursor: 游标字符串
+        name: 排序方式名称
+        keys: 排序键
+
+    Returns:
+        排序键值列表
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_name, values = json.loads(data)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if cursor_name != name or not isinstance(values, list) or len(values) != len(keys):
+        raise ValueError("Invalid cursor")
+
+    decoded = []
+    for (column, _), value in zip(keys, values):
+        if value is None:
+            decoded.append(value)
+            continue
+        if isinstance(column.type, DateTime):
+            try:
+                value = datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise ValueError("Invalid cursor")
+        else:
+            # 只接受与列类型一致的标量（bool 是 int 的子类，单独排除）
+            python_type = column.type.python_type
+            if isinstance(value, bool) or not isinstance(value, python_type):
+                raise ValueError("Invalid cursor")
+        decoded.append(value)
+    return decoded
+
+
+def keyset_page(
+    query: Query,
+    keys: Sequence[SortKey],
+    cursor: Optional[str],
+    limit: int,
+    name: str = "default",
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    按排序键分页查询
+
+    Args:
+        query: 已添加筛选条件、尚未排序的查询（ORM 对象或按列查询均可）
+        keys: 排序键
+        cursor: 上一页返回的游标（第一页为 None）
+        limit: 每页数量
+        name: 排序方式名称
+
+    Returns:
+        (当前页的行, 下一页的游标)；没有下一页时游标为 None
+    """
+    if cursor:
+        values = decode_cursor(cursor, name, keys)
+        # (k1, k2, ...) 位于游标之后：k1 越过游标，或 k1 相等且后续键越过游标
+        conditions = []
+        for index, (column, descending) in enumerate(keys):
+            after = column < values[index] if descending else column > values[index]
+            conditions.append(
+                and_(*[keys[i][0] == values[i] for i in range(index)], after)
+            )
+        query = query.filter(or_(*conditions))
+
+    query = query.order_by(
+        *[column.desc() if descending else column.asc() for column, descending in keys]
+    )
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    next_cursor = encode_cursor(
+        name, [getattr(last, column.key) for column, _ in keys]
+    )
+    return rows, next_cursor
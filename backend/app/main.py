@@ -8,6 +8,7 @@ from contextlib import asynccontextmanager
 
 from .core.config import settings
 from .core.database import init_db
+from .services.diff_executor import diff_executor
 from .api.routes import documents, diff, websocket, auth, verification
 
 
@@ -18,9 +19,11 @@ async def lifespan(app: FastAPI):
     print("Initializing database...")
     init_db()
     print("Database initialized successfully!")
+    diff_executor.start()
     yield
     # 关闭时执行
     print("Shutting down...")
+    diff_executor.shutdown()
 
 
 # 创建 FastAPI 应用
@@ -1,8 +1,17 @@
 """
 文档数据模型
 """
-from sqlalchemy import Column, String, DateTime, Integer, ForeignKey, Text, Index
-from sqlalchemy.orm import relationship
+from sqlalchemy import (
+    Column,
+    String,
+    DateTime,
+    Integer,
+    ForeignKey,
+    Text,
+    Index,
+    LargeBinary,
+)
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
 from ..core.database import Base
 import uuid
@@ -31,6 +40,13 @@ class Document(Base):
     owner = relationship("User", back_populates="documents")
     folder = relationship("Folder", back_populates="documents")
 
+    # 文档列表按所有者和排序字段游标分页（ID 保证顺序唯一）
+    __table_args__ = (
+        Index("idx_owner_updated", "owner_id", "updated_at", "id"),
+        Index("idx_owner_created", "owner_id", "created_at", "id"),
+        Index("idx_owner_title", "owner_id", "title", "id"),
+    )
+
     def __repr__(self):
         return f"<Document(id={self.id}, title={self.title}, owner={self.owner_id})>"
 
@@ -43,18 +59,45 @@ class Version(Base):
     id = Column(String(36), primary_key=True, default=generate_uuid)
     document_id = Column(String(36), ForeignKey("documents.id", ondelete="CASCADE"), nullable=False)
     version_number = Column(Integer, nullable=False)
-    content = Column(Text, nullable=False)
+    # 完整内容；以增量或内容块存储时为空，由 VersionStorage 还原。
+    # content / delta / payload 延迟加载（同属 content 组），需要内容的查询使用
+    # VersionStorage.with_content()，列表查询不读取这些列
+    content = deferred(Column(Text, nullable=True), group="content")
     content_hash = Column(String(64), index=True)
+    content_length = Column(Integer, nullable=True)  # 内容字符数
+    content_bytes = Column(Integer, nullable=True)  # 内容 UTF-8 字节数
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     author = Column(String(100), default="anonymous")  # 保留用于向后兼容
     author_id = Column(String(36), ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
     commit_message = Column(Text)
     save_type = Column(String(20), default="manual")  # manual, auto, draft
     parent_version_id = Column(String(36), ForeignKey("versions.id"), nullable=True)
+    # 相对父版本的变化量（保存后在后台计算，尚未计算时为空）
+    lines_added = Column(Integer, nullable=True)
+    lines_removed = Column(Integer, nullable=True)
+    byte_delta = Column(Integer, nullable=True)  # UTF-8 字节数之差
+    # 存储方式: full（完整内容）, delta（相对 delta_base_id 版本的反向增量）,
+    # blob（完整内容保存在 blob_hash 指向的共享内容块中）
+    storage = Column(String(10), nullable=False, default="full", server_default="full")
+    blob_hash = Column(String(64), ForeignKey("content_blobs.hash"), nullable=True)
+    # 基准版本删除时置空（删除文档时基准版本可能先于依赖它的增量版本被删除）
+    delta_base_id = Column(
+        String(36), ForeignKey("versions.id", ondelete="SET NULL"), nullable=True
+    )
+    delta = deferred(Column(Text, nullable=True), group="content")  # JSON 增量，见 VersionStorage
+    # 压缩编码: plain（未压缩）, zlib, lzma, zstd；压缩时 content / delta 为空
+    codec = Column(String(10), nullable=False, default="plain", server_default="plain")
+    # 压缩后的完整内容或增量
+    payload = deferred(Column(LargeBinary(length=2**32 - 1), nullable=True), group="content")
 
     # 关联关系
     document = relationship("Document", back_populates="versions")
-    parent_version = relationship("Version", remote_side=[id], backref="child_versions")
+    parent_version = relationship(
+        "Version",
+        remote_side=[id],
+        foreign_keys=[parent_version_id],
+        backref="child_versions",
+    )
     tags = relationship("VersionTag", back_populates="version", cascade="all, delete-orphan")
     author_user = relationship("User")
 
@@ -68,6 +111,24 @@ class Version(Base):
         return f"<Version(id={self.id}, doc_id={self.document_id}, v={self.version_number})>"
 
 
+class ContentBlob(Base):
+    """内容块表模型（按内容的 SHA-256 去重，内容相同的版本共享同一行）"""
+
+    __tablename__ = "content_blobs"
+
+    hash = Column(String(64), primary_key=True)  # 内容的 SHA-256（十六进制）
+    size = Column(Integer, nullable=False)  # 内容字符数
+    # 压缩编码: plain（未压缩）, zlib, lzma, zstd；压缩时 content 为空
+    codec = Column(String(10), nullable=False, default="plain", server_default="plain")
+    content = Column(Text, nullable=True)
+    payload = Column(LargeBinary(length=2**32 - 1), nullable=True)  # 压缩后的内容
+    ref_count = Column(Integer, nullable=False, default=0)  # 引用该内容块的版本数
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<ContentBlob(hash={self.hash}, refs={self.ref_count})>"
+
+
 class VersionTag(Base):
     """版本标签表模型"""
 
@@ -84,3 +145,44 @@ class VersionTag(Base):
 
     def __repr__(self):
         return f"<VersionTag(id={self.id}, tag={self.tag_name})>"
+
+
+class VersionLineOrigin(Base):
+    """版本行来源索引表模型（blame），每行最后一次被修改时的版本号"""
+
+    __tablename__ = "version_line_origins"
+
+    version_id = Column(String(36), ForeignKey("versions.id", ondelete="CASCADE"), primary_key=True)
+    origins = Column(Text, nullable=False)  # JSON 游程编码: [[version_number, line_count], ...]
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<VersionLineOrigin(version_id={self.version_id})>"
+
+
+class VersionDiff(Base):
+    """持久化差异缓存表模型（按内容哈希索引，跨文档共享）"""
+
+    __tablename__ = "version_diffs"
+
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    old_content_hash = Column(String(64), nullable=False)
+    new_content_hash = Column(String(64), nullable=False)
+    diff_mode = Column(String(20), nullable=False)
+    algorithm = Column(String(20), nullable=False)
+    result = Column(Text, nullable=False)  # JSON: {"script": {"unit", "ops"}, "stats": {...}}
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index(
+            "idx_version_diff_key",
+            "old_content_hash",
+            "new_content_hash",
+            "diff_mode",
+            "algorithm",
+            unique=True,
+        ),
+    )
+
+    def __repr__(self):
+        return f"<VersionDiff(old={self.old_content_hash}, new={self.new_content_hash}, mode={self.diff_mode})>"
@@ -1,7 +1,7 @@
 """
 用户相关的数据模型
 """
-from sqlalchemy import Column, String, Boolean, TIMESTAMP, Text, ForeignKey
+from sqlalchemy import Column, String, Boolean, TIMESTAMP, Text, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from ..core.database import Base
@@ -29,6 +29,11 @@ class User(Base):
     documents = relationship("Document", back_populates="owner", cascade="all, delete-orphan")
     folders = relationship("Folder", back_populates="owner", cascade="all, delete-orphan")
 
+    # 用户列表按注册时间游标分页
+    __table_args__ = (
+        Index("idx_users_created", "created_at", "id"),
+    )
+
 
 class UserSession(Base):
     """用户会话表"""
@@ -2,7 +2,7 @@
 文档相关的 Pydantic 模式
 """
 from pydantic import BaseModel, Field, ConfigDict, field_serializer
-from typing import Optional, List
+from typing import Dict, Optional, List, Tuple, Union
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
@@ -48,6 +48,12 @@ class DocumentResponse(DocumentBase):
         return local_time.isoformat()
 
 
+class DocumentListPage(BaseModel):
+    """文档列表分页响应模式"""
+    items: List[DocumentResponse]
+    next_cursor: Optional[str] = None  # 下一页的游标，没有下一页时为 None
+
+
 # ============ Version Schemas ============
 
 class VersionBase(BaseModel):
@@ -95,7 +101,13 @@ class VersionListItem(BaseModel):
     author: str
     commit_message: Optional[str]
     save_type: str
-    content_length: int
+    # 内容字符数和 UTF-8 字节数（保存时记录，旧版本回填前为 None）
+    content_length: Optional[int] = None
+    content_bytes: Optional[int] = None
+    # 相对父版本的变化量（尚未计算时为 None）
+    lines_added: Optional[int] = None
+    lines_removed: Optional[int] = None
+    byte_delta: Optional[int] = None
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -110,6 +122,69 @@ class VersionListItem(BaseModel):
         return local_time.isoformat()
 
 
+class VersionListPage(BaseModel):
+    """版本列表分页响应模式"""
+    items: List[VersionListItem]
+    next_cursor: Optional[str] = None  # 下一页的游标，没有下一页时为 None
+
+
+class VersionActivityResponse(BaseModel):
+    """
+    文档的版本活动数据（用于绘制活动曲线）
+
+    各列表按版本号升序一一对应，尚未计算的变化量为 None
+    """
+    document_id: str
+    version_numbers: List[int]
+    created_at: List[datetime]
+    lines_added: List[Optional[int]]
+    lines_removed: List[Optional[int]]
+    byte_delta: List[Optional[int]]
+
+    @field_serializer('created_at')
+    def serialize_datetimes(self, values: List[datetime]) -> List[str]:
+        """将 UTC 时间转换为本地时区并序列化为 ISO 格式字符串"""
+        result = []
+        for value in values:
+            if value is not None and value.tzinfo is None:
+                value = value.replace(tzinfo=ZoneInfo("UTC"))
+            result.append(
+                value.astimezone(ZoneInfo("Asia/Shanghai")).isoformat()
+                if value is not None
+                else None
+            )
+        return result
+
+
+class BlameRange(BaseModel):
+    """逐行溯源区间：连续且来源版本相同的行"""
+    start_line: int
+    end_line: int
+    version_number: int
+    version_id: Optional[str] = None
+    author: Optional[str] = None
+    author_id: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+    @field_serializer('created_at')
+    def serialize_datetime(self, value: datetime) -> str:
+        """将 UTC 时间转换为本地时区并序列化为 ISO 格式字符串"""
+        if value is None:
+            return None
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=ZoneInfo("UTC"))
+        local_time = value.astimezone(ZoneInfo("Asia/Shanghai"))
+        return local_time.isoformat()
+
+
+class BlameResponse(BaseModel):
+    """逐行溯源响应模式"""
+    document_id: str
+    version_id: str
+    version_number: int
+    ranges: List[BlameRange]
+
+
 # ============ Version Tag Schemas ============
 
 class VersionTagCreate(BaseModel):
@@ -138,17 +213,45 @@ class DiffRequest(BaseModel):
     diff_mode: str = Field(default="semantic", pattern="^(character|word|line|semantic)$")
     ignore_whitespace: bool = False
     ignore_case: bool = False
+    algorithm: Optional[str] = Field(default=None, pattern="^(difflib|myers|patience|histogram)$")
+    time_budget_ms: Optional[int] = Field(default=None, ge=1, le=60000)
+
+
+class DiffPair(BaseModel):
+    """批量比较中的一对版本：字符串为版本ID，整数为版本号（需提供 document_id）"""
+    old: Union[str, int]
+    new: Union[str, int]
+
+    @property
+    def key(self) -> str:
+        """结果字典中的键"""
+        return f"{self.old}:{self.new}"
+
+
+class BatchDiffRequest(BaseModel):
+    """批量差异比较请求模式"""
+    document_id: Optional[str] = None
+    pairs: List[DiffPair] = Field(..., min_length=1)
+    diff_mode: str = Field(default="semantic", pattern="^(character|word|line|semantic)$")
+    ignore_whitespace: bool = False
+    ignore_case: bool = False
+    algorithm: Optional[str] = Field(default=None, pattern="^(difflib|myers|patience|histogram)$")
+    time_budget_ms: Optional[int] = Field(default=None, ge=1, le=60000)
+    format: str = Field(default="full", pattern="^(full|compact)$")
 
 
 class DiffChange(BaseModel):
     """差异变化项"""
-    type: str  # 'added', 'deleted', 'modified', 'unchanged'
+    type: str  # 'added', 'deleted', 'modified', 'unchanged', 'moved'
     old_text: Optional[str] = None
     new_text: Optional[str] = None
     old_line_start: Optional[int] = None
     old_line_end: Optional[int] = None
     new_line_start: Optional[int] = None
     new_line_end: Optional[int] = None
+    # refine 时修改块内发生变化的区间（相对于 old_text / new_text 的字符偏移）
+    old_spans: Optional[List[Tuple[int, int]]] = None
+    new_spans: Optional[List[Tuple[int, int]]] = None
 
 
 class DiffResponse(BaseModel):
@@ -159,6 +262,73 @@ class DiffResponse(BaseModel):
     new_version_number: int
     changes: List[DiffChange]
     stats: dict  # 统计信息：添加行数、删除行数等
+    degraded: bool = False  # 是否因超出计算预算而降级到更粗的粒度
+
+
+class DiffStatsResponse(BaseModel):
+    """只含统计信息的差异响应（stats_only）"""
+    old_version_id: str
+    new_version_id: str
+    old_version_number: int
+    new_version_number: int
+    stats: dict
+    degraded: bool = False
+
+
+class CompactDiffResponse(BaseModel):
+    """
+    紧凑格式差异响应
+
+    opcodes 每项为 [类型, 旧文本起, 旧文本止, 新文本起, 新文本止]（字符偏移），
+    类型: 0 未变化, 1 修改, 2 删除, 3 新增, 4 移动（旧位置 -> 新位置）；
+    inserted 依次为修改和新增变化的新文本
+    """
+    old_version_id: str
+    new_version_id: str
+    old_version_number: int
+    new_version_number: int
+    old_content_hash: Optional[str] = None
+    new_content_hash: Optional[str] = None
+    unit: str  # 比较单元: line, word, char
+    opcodes: List[Tuple[int, int, int, int, int]]
+    inserted: List[str]
+    stats: dict
+    degraded: bool = False
+
+
+class BatchDiffResponse(BaseModel):
+    """
+    批量差异比较响应
+
+    results 和 errors 的键为 "旧:新"（与请求中的标识一致）
+    """
+    results: Dict[str, Union[DiffResponse, CompactDiffResponse]]
+    errors: Dict[str, str] = {}
+
+
+class DiffHunk(BaseModel):
+    """差异块：相邻的变化及其上下文，位置为从1开始的比较单元序号"""
+    old_start: int
+    old_count: int
+    new_start: int
+    new_count: int
+    changes: List[DiffChange]
+
+
+class HunkDiffResponse(BaseModel):
+    """分页的 hunk 格式差异响应"""
+    old_version_id: str
+    new_version_id: str
+    old_version_number: int
+    new_version_number: int
+    unit: str  # 比较单元: line, word, char
+    context: int
+    hunks: List[DiffHunk]
+    total_hunks: int
+    hunk_offset: int
+    next_hunk_offset: Optional[int] = None  # 没有更多 hunk 时为 None
+    stats: dict
+    degraded: bool = False
 
 
 # ============ Common Response ============
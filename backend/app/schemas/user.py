@@ -2,7 +2,7 @@
 用户相关的 Pydantic 模型
 """
 from pydantic import BaseModel, EmailStr, Field, ConfigDict, field_serializer
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
@@ -95,6 +95,12 @@ class UserListItem(BaseModel):
         return local_time.isoformat()
 
 
+class UserListPage(BaseModel):
+    """用户列表分页响应"""
+    items: List[UserListItem]
+    next_cursor: Optional[str] = None  # 下一页的游标,没有下一页时为None
+
+
 # ============= Token 响应模型 =============
 
 class TokenResponse(BaseModel):
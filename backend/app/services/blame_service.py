@@ -0,0 +1,333 @@
+"""
+逐行溯源（blame）服务
+为每个版本维护行来源索引：每一行最后一次被修改时所在的版本号
+"""
+import json
+import logging
+import time
+from array import array
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models.document import Version, VersionLineOrigin
+from .version_storage import VersionStorage
+from .diff_algorithms import (
+    DiffBudget,
+    DiffBudgetExceeded,
+    diff_sequences,
+    prepare_sequences,
+)
+from .diff_script import DiffScript, UNCHANGED
+
+logger = logging.getLogger(__name__)
+
+
+class BlameService:
+    """
+    逐行溯源服务
+
+    行来源以游程编码保存：[[版本号, 连续行数], ...]，
+    新版本的索引在保存后的后台任务中，由父版本的索引和预计算的行级差异增量计算
+    """
+
+    @staticmethod
+    def _split_lines(content: str) -> List[str]:
+        """与行级差异一致的分行方式"""
+        return content.splitlines(keepends=True)
+
+    @staticmethod
+    def _expand(runs: List[List[int]]) -> array:
+        """游程编码展开为逐行的版本号数组"""
+        origins = array("l")
+        for version_number, count in runs:
+            origins.extend(array("l", [version_number]) * count)
+        return origins
+
+    @staticmethod
+    def _compress(origins: array) -> List[List[int]]:
+        """逐行的版本号数组压缩为游程编码"""
+        runs: List[List[int]] = []
+        for version_number in origins:
+            if runs and runs[-1][0] == version_number:
+                runs[-1][1] += 1
+            else:
+                runs.append([version_number, 1])
+        return runs
+
+    @staticmethod
+    def _line_opcodes(old_lines: List[str], new_lines: List[str]):
+        """
+        计算行级 opcodes
+
+        超出计算预算时只保留公共前缀和后缀，中间部分视为整体替换
+        """
+        budget = DiffBudget(
+            time.monotonic() + settings.DIFF_TIME_BUDGET_MS / 1000,
+            settings.DIFF_COST_BUDGET,
+        )
+        try:
+            opcodes, _ = diff_sequences(
+                old_lines, new_lines, settings.DIFF_ALGORITHM, budget
+            )
+            return opcodes
+        except DiffBudgetExceeded:
+            prepared = prepare_sequences(old_lines, new_lines)
+            prefix, suffix = prepared.prefix, prepared.suffix
+            old_end, new_end = len(old_lines) - suffix, len(new_lines) - suffix
+            return [
+                ("equal", 0, prefix, 0, prefix),
+                ("replace", prefix, old_end, prefix, new_end),
+                ("equal", old_end, len(old_lines), new_end, len(new_lines)),
+            ]
+
+    @staticmethod
+    def compute_origins(
+        parent_content: Optional[str],
+        parent_runs: Optional[List[List[int]]],
+        content: str,
+        version_number: int,
+    ) -> List[List[int]]:
+        """
+        根据父版本的行来源计算新版本的行来源
+
+        Args:
+            parent_content: 父版本内容（没有父版本时为 None）
+            parent_runs: 父版本的行来源（游程编码）
+            content: 新版本内容
+            version_number: 新版本号
+
+        Returns:
+            新版本的行来源（游程编码）
+        """
+        new_lines = BlameService._split_lines(content)
+        if parent_content is None or not parent_runs:
+            return [[version_number, len(new_lines)]] if new_lines else []
+
+        old_lines = BlameService._split_lines(parent_content)
+        parent_origins = BlameService._expand(parent_runs)
+        origins = array("l")
+        for tag, i1, i2, j1, j2 in BlameService._line_opcodes(old_lines, new_lines):
+            if tag == "equal":
+                origins.extend(parent_origins[i1:i2])
+            elif j2 > j1:
+                origins.extend(array("l", [version_number]) * (j2 - j1))
+        return BlameService._compress(origins)
+
+    @staticmethod
+    def origins_from_script(
+        parent_runs: List[List[int]],
+        line_script: DiffScript,
+        version_number: int,
+    ) -> List[List[int]]:
+        """
+        根据父版本的行来源和已计算的行级差异脚本计算新版本的行来源（不再重新比较）
+
+        超长行被切分为伪行时，真实行的任一伪行有变化即视为该行被修改
+
+        Args:
+            parent_runs: 父版本的行来源（游程编码）
+            line_script: 父版本到新版本的行级差异脚本
+            version_number: 新版本号
+
+        Returns:
+            新版本的行来源（游程编码）
+        """
+        old_numbers = line_script.old_line_numbers
+        new_numbers = line_script.new_line_numbers
+        parent_origins = BlameService._expand(parent_runs)
+        line_count = len(BlameService._split_lines(line_script.new_text))
+        origins = array("l", [version_number]) * line_count
+        changed = bytearray(line_count)
+        for change_type, i1, i2, j1, j2 in line_script:
+            if change_type != UNCHANGED:
+                for j in range(j1, j2):
+                    changed[new_numbers[j] - 1 if new_numbers else j] = 1
+            elif old_numbers is None and new_numbers is None:
+                origins[j1:j2] = parent_origins[i1:i2]
+            else:
+                for i, j in zip(range(i1, i2), range(j1, j2)):
+                    line = new_numbers[j] - 1 if new_numbers else j
+                    origins[line] = parent_origins[old_numbers[i] - 1 if old_numbers else i]
+        for line, flag in enumerate(changed):
+            if flag:
+                origins[line] = version_number
+        return BlameService._compress(origins)
+
+    @staticmethod
+    def _get_row(db: Session, version_id: str) -> Optional[VersionLineOrigin]:
+        return (
+            db.query(VersionLineOrigin)
+            .filter(VersionLineOrigin.version_id == version_id)
+            .first()
+        )
+
+    @staticmethod
+    def _indexed_ids(db: Session, document_id: str) -> Set[str]:
+        """文档中已建立行来源索引的版本ID"""
+        return {
+            row.version_id
+            for row in db.query(VersionLineOrigin.version_id)
+            .join(Version, Version.id == VersionLineOrigin.version_id)
+            .filter(Version.document_id == document_id)
+        }
+
+    @staticmethod
+    def is_indexed(db: Session, version_id: str) -> bool:
+        """版本是否已建立行来源索引"""
+        return (
+            db.query(VersionLineOrigin.version_id)
+            .filter(VersionLineOrigin.version_id == version_id)
+            .first()
+            is not None
+        )
+
+    @staticmethod
+    def index_version(
+        db: Session,
+        version: Version,
+        parent: Optional[Version],
+        line_script: Optional[DiffScript] = None,
+    ) -> None:
+        """
+        为新版本建立行来源索引并提交（由保存版本后的后台任务调用）
+
+        Args:
+            db: 数据库会话
+            version: 新版本
+            parent: 父版本（可选）
+            line_script: 父版本到新版本的行级差异脚本（有父版本时复用，避免重新比较）
+        """
+        if BlameService.is_indexed(db, version.id):
+            return
+        parent_runs = BlameService.get_origins(db, parent) if parent else None
+        if parent_runs and line_script is not None:
+            runs = BlameService.origins_from_script(
+                parent_runs, line_script, version.version_number
+            )
+        else:
+            VersionStorage.materialize(db, [version, parent])
+            runs = BlameService.compute_origins(
+                parent.content if parent else None,
+                parent_runs,
+                version.content,
+                version.version_number,
+            )
+        db.add(VersionLineOrigin(version_id=version.id, origins=json.dumps(runs)))
+        try:
+            db.commit()
+        except IntegrityError:
+            # 其他任务已写入该版本的索引
+            db.rollback()
+
+    @staticmethod
+    def backfill_version(version_id: str) -> None:
+        """
+        后台任务：补建版本及其缺失索引的祖先版本的行来源索引
+
+        Args:
+            version_id: 版本ID
+        """
+        db = SessionLocal()
+        try:
+            version = db.get(Version, version_id)
+            if version is not None:
+                BlameService.get_origins(db, version)
+                db.commit()
+        except IntegrityError:
+            db.rollback()
+        except Exception as e:
+            logger.error(f"Failed to backfill blame index for version {version_id}: {e}")
+        finally:
+            db.close()
+
+    @staticmethod
+    def get_origins(
+        db: Session, version: Version, persist: bool = True
+    ) -> List[List[int]]:
+        """
+        获取版本的行来源，缺失时沿父版本链回溯到最近的已索引版本再逐个补建
+
+        Args:
+            db: 数据库会话
+            version: 版本
+            persist: 是否将补建的记录加入会话（由调用方提交）；
+                为 False 时只计算不写入，用于只读请求
+
+        Returns:
+            行来源（游程编码）
+        """
+        indexed = BlameService._indexed_ids(db, version.document_id)
+        chain: List[Version] = []
+        current: Optional[Version] = version
+        runs: Optional[List[List[int]]] = None
+        while current is not None:
+            if current.id in indexed:
+                runs = json.loads(BlameService._get_row(db, current.id).origins)
+                break
+            chain.append(current)
+            current = current.parent_version
+
+        if not chain:
+            return runs
+
+        parent = current
+        VersionStorage.materialize(db, chain + [parent])
+        for missing in reversed(chain):
+            runs = BlameService.compute_origins(
+                parent.content if parent else None,
+                runs,
+                missing.content,
+                missing.version_number,
+            )
+            if persist:
+                db.add(VersionLineOrigin(version_id=missing.id, origins=json.dumps(runs)))
+            parent = missing
+        if persist:
+            db.flush()
+        return runs
+
+    @staticmethod
+    def get_blame(db: Session, version: Version) -> List[Dict]:
+        """
+        获取版本的逐行溯源信息（只读：缺失的索引只计算不写入，由调用方安排后台补建）
+
+        Args:
+            db: 数据库会话
+            version: 版本
+
+        Returns:
+            连续且来源相同的行区间列表
+        """
+        runs = BlameService.get_origins(db, version, persist=False)
+        numbers = {version_number for version_number, _ in runs}
+        origins: Dict[int, Version] = {}
+        if numbers:
+            origins = {
+                origin.version_number: origin
+                for origin in db.query(Version).filter(
+                    Version.document_id == version.document_id,
+                    Version.version_number.in_(numbers),
+                )
+            }
+
+        ranges = []
+        line = 1
+        for version_number, count in runs:
+            origin = origins.get(version_number)
+            ranges.append(
+                {
+                    "start_line": line,
+                    "end_line": line + count - 1,
+                    "version_number": version_number,
+                    "version_id": origin.id if origin else None,
+                    "author": origin.author if origin else None,
+                    "author_id": origin.author_id if origin else None,
+                    "created_at": origin.created_at if origin else None,
+                }
+            )
+            line += count
+        return ranges
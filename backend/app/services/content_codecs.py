@@ -0,0 +1,60 @@
+"""
+版本内容压缩编码
+可插拔的压缩实现，标准库提供 zlib 和 lzma，安装 zstandard 后可使用 zstd
+"""
+import lzma
+import zlib
+from typing import Callable, Dict, Tuple
+
+# 编码器：(压缩函数, 解压函数)
+ContentCodec = Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]
+
+# 未压缩（内容直接保存在 content / delta 列中）
+CODEC_PLAIN = "plain"
+
+CONTENT_CODECS: Dict[str, ContentCodec] = {
+    "zlib": (lambda data: zlib.compress(data, 6), zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+
+# zstandard 为可选依赖，压缩和解压速度明显快于 zlib
+try:
+    import zstandard
+
+    CONTENT_CODECS["zstd"] = (
+        lambda data: zstandard.ZstdCompressor(level=6).compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompress(data),
+    )
+except ImportError:
+    pass
+
+
+def register_content_codec(name: str, codec: ContentCodec) -> None:
+    """
+    注册自定义压缩编码
+
+    Args:
+        name: 编码名称（保存在 versions.codec 列中，用于配置 VERSION_CODEC）
+        codec: (压缩函数, 解压函数)
+    """
+    CONTENT_CODECS[name] = codec
+
+
+def get_content_codec(name: str) -> ContentCodec:
+    """按名称获取压缩编码，未知名称时抛出 ValueError"""
+    try:
+        return CONTENT_CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unknown content codec: {name}")
+
+
+def compress_text(text: str, name: str) -> bytes:
+    """按指定编码压缩文本（UTF-8）"""
+    compress, _ = get_content_codec(name)
+    return compress(text.encode("utf-8"))
+
+
+def decompress_text(data: bytes, name: str) -> str:
+    """按指定编码解压文本"""
+    _, decompress = get_content_codec(name)
+    return decompress(data).decode("utf-8")
@@ -0,0 +1,632 @@
+"""
+差异算法引擎
+提供可插拔的序列比较算法（difflib / Myers / patience / histogram），
+所有算法统一返回 difflib 风格的 opcodes
+"""
+import bisect
+import difflib
+import math
+import time
+from array import array
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+# (tag, i1, i2, j1, j2)，与 difflib.SequenceMatcher.get_opcodes() 一致
+Opcode = Tuple[str, int, int, int, int]
+# (i, j, size)，与 difflib.SequenceMatcher.get_matching_blocks() 一致
+MatchingBlock = Tuple[int, int, int]
+
+# histogram 算法中元素出现次数上限，超过则退化为 Myers
+HISTOGRAM_MAX_CHAIN = 64
+
+# Myers 中间蛇搜索的编辑距离上限的下界（参照 GNU diff 的 too_expensive），
+# 实际上限取 max(该值, sqrt(n + m))，超过后放弃最优解，在搜索最远的点处分割
+MYERS_TOO_EXPENSIVE_MIN = 256
+
+
+class DiffBudgetExceeded(Exception):
+    """差异计算超出时间或计算量预算"""
+
+
+class DiffBudget:
+    """
+    差异计算预算
+
+    算法在主循环中按工作量调用 charge()，超过截止时间或计算量上限时
+    抛出 DiffBudgetExceeded，由调用方降级到更粗的粒度
+    """
+
+    __slots__ = ("deadline", "max_cost", "cost")
+
+    def __init__(self, deadline: float, max_cost: int):
+        self.deadline = deadline
+        self.max_cost = max_cost
+        self.cost = 0
+
+    def charge(self, amount: int) -> None:
+        """累计计算量并检查是否超出预算"""
+        self.cost += amount
+        if self.cost > self.max_cost or time.monotonic() > self.deadline:
+            raise DiffBudgetExceeded(f"diff budget exceeded after {self.cost} steps")
+
+
+def _opcodes_from_blocks(
+    blocks: List[MatchingBlock], len_a: int, len_b: int
+) -> List[Opcode]:
+    """将匹配块转换为 opcodes（逻辑与 difflib 相同）"""
+    opcodes: List[Opcode] = []
+    i = j = 0
+    for ai, bj, size in sorted(blocks) + [(len_a, len_b, 0)]:
+        if i < ai and j < bj:
+            opcodes.append(("replace", i, ai, j, bj))
+        elif i < ai:
+            opcodes.append(("delete", i, ai, j, bj))
+        elif j < bj:
+            opcodes.append(("insert", i, ai, j, bj))
+        i, j = ai + size, bj + size
+        if size:
+            # 合并相邻的 equal 块
+            if opcodes and opcodes[-1][0] == "equal":
+                opcodes[-1] = ("equal", opcodes[-1][1], i, opcodes[-1][3], j)
+            else:
+                opcodes.append(("equal", ai, i, bj, j))
+    return opcodes
+
+
+def _trim_region(
+    a: Sequence[Hashable],
+    b: Sequence[Hashable],
+    alo: int,
+    ahi: int,
+    blo: int,
+    bhi: int,
+    blocks: List[MatchingBlock],
+) -> Tuple[int, int, int, int]:
+    """去掉区间首尾的相同元素，并记录为匹配块"""
+    start = alo
+    while alo < ahi and blo < bhi and a[alo] == b[blo]:
+        alo += 1
+        blo += 1
+    if alo > start:
+        blocks.append((start, blo - (alo - start), alo - start))
+
+    end = ahi
+    while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+        ahi -= 1
+        bhi -= 1
+    if end > ahi:
+        blocks.append((ahi, bhi, end - ahi))
+
+    return alo, ahi, blo, bhi
+
+
+# ============ Myers O(ND) ============
+
+
+def _middle_snake(
+    a: Sequence[Hashable],
+    alo: int,
+    ahi: int,
+    b: Sequence[Hashable],
+    blo: int,
+    bhi: int,
+    budget: Optional[DiffBudget] = None,
+) -> Tuple[int, int, int, int]:
+    """
+    在线性空间内查找中间蛇（Myers 1986, 4b 节）
+
+    编辑距离超过 too_expensive 时不再寻找最优的中间蛇，而是在正向或反向搜索
+    到达最远（x + y 最大）的点处分割，单次搜索的代价不超过 O(too_expensive * (n + m))；
+    结果仍是有效的编辑脚本，但不保证最短
+
+    Returns:
+        中间蛇的起止坐标 (x0, y0, x1, y1)，相对于区间起点；
+        放弃最优解时返回长度为 0 的分割点
+    """
+    n = ahi - alo
+    m = bhi - blo
+    delta = n - m
+    odd = delta & 1
+    max_d = (n + m + 1) // 2
+    too_expensive = max(MYERS_TOO_EXPENSIVE_MIN, math.isqrt(n + m))
+    # 对角线 k = x - y 的取值范围为 [-m, n]，两侧各留一个哨兵位
+    offset = m + 1
+    forward = [-1] * (n + m + 3)
+    backward = [-1] * (n + m + 3)
+    # 当前已搜索的对角线范围，限制在编辑图内，避免一侧很短时退化为 O(D^2)
+    fmin = fmax = bmin = bmax = 0
+
+    for d in range(max_d + 1):
+        if budget is not None:
+            budget.charge(fmax - fmin + bmax - bmin + 2)
+
+        # 正向搜索
+        if d:
+            if fmin > -m:
+                fmin -= 1
+                forward[offset + fmin - 1] = -1
+            else:
+                fmin += 1
+            if fmax < n:
+                fmax += 1
+                forward[offset + fmax + 1] = -1
+            else:
+                fmax -= 1
+        for k in range(fmin, fmax + 1, 2):
+            if d:
+                lo = forward[offset + k - 1]
+                hi = forward[offset + k + 1]
+                x = lo + 1 if lo >= hi else hi
+            else:
+                x = 0
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[alo + x] == b[blo + y]:
+                x += 1
+                y += 1
+            forward[offset + k] = x
+            rk = delta - k
+            if odd and d and bmin <= rk <= bmax and x + backward[offset + rk] >= n:
+                return x0, y0, x, y
+
+        # 反向搜索（在反转坐标系中进行）
+        if d:
+            if bmin > -m:
+                bmin -= 1
+                backward[offset + bmin - 1] = -1
+            else:
+                bmin += 1
+            if bmax < n:
+                bmax += 1
+                backward[offset + bmax + 1] = -1
+            else:
+                bmax -= 1
+        for k in range(bmin, bmax + 1, 2):
+            if d:
+                lo = backward[offset + k - 1]
+                hi = backward[offset + k + 1]
+                x = lo + 1 if lo >= hi else hi
+            else:
+                x = 0
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[ahi - 1 - x] == b[bhi - 1 - y]:
+                x += 1
+                y += 1
+            backward[offset + k] = x
+            fk = delta - k
+            if not odd and fmin <= fk <= fmax and x + forward[offset + fk] >= n:
+                return n - x, m - y, n - x0, m - y0
+
+        if d >= too_expensive:
+            return _furthest_point(forward, fmin, fmax, backward, bmin, bmax, offset, n, m)
+
+    # 理论上不可达：最坏情况下 D = n + m
+    return 0, 0, 0, 0
+
+
+def _furthest_point(
+    forward: List[int],
+    fmin: int,
+    fmax: int,
+    backward: List[int],
+    bmin: int,
+    bmax: int,
+    offset: int,
+    n: int,
+    m: int,
+) -> Tuple[int, int, int, int]:
+    """正向和反向搜索中到达最远的点，作为放弃最优解时的分割点"""
+    best, point = -1, (0, 0)
+    for k in range(fmin, fmax + 1, 2):
+        x = forward[offset + k]
+        y = x - k
+        if 0 <= x <= n and 0 <= y <= m and x + y > best:
+            best, point = x + y, (x, y)
+    for k in range(bmin, bmax + 1, 2):
+        x = backward[offset + k]
+        y = x - k
+        if 0 <= x <= n and 0 <= y <= m and x + y > best:
+            best, point = x + y, (n - x, m - y)
+    x, y = point
+    return x, y, x, y
+
+
+def _myers_blocks(
+    a: Sequence[Hashable],
+    b: Sequence[Hashable],
+    alo: int,
+    ahi: int,
+    blo: int,
+    bhi: int,
+    blocks: List[MatchingBlock],
+    budget: Optional[DiffBudget] = None,
+) -> None:
+    """Myers 分治算法，使用显式栈避免深度递归"""
+    stack = [(alo, ahi, blo, bhi)]
+    while stack:
+        alo, ahi, blo, bhi = stack.pop()
+        alo, ahi, blo, bhi = _trim_region(a, b, alo, ahi, blo, bhi, blocks)
+        if alo == ahi or blo == bhi:
+            continue
+
+        x0, y0, x1, y1 = _middle_snake(a, alo, ahi, b, blo, bhi, budget)
+        if x1 > x0:
+            blocks.append((alo + x0, blo + y0, x1 - x0))
+        stack.append((alo + x1, ahi, blo + y1, bhi))
+        stack.append((alo, alo + x0, blo, blo + y0))
+
+
+def myers_opcodes(
+    a: Sequence[Hashable], b: Sequence[Hashable], budget: Optional[DiffBudget] = None
+) -> List[Opcode]:
+    """Myers O(ND) 最短编辑脚本，耗时与编辑距离成正比"""
+    # 只在对方序列中出现过的元素才可能匹配，先剔除其余元素缩小编辑图；
+    # 最长公共子序列不变，结果仍是最短编辑脚本
+    in_b = set(b)
+    in_a = set(a)
+    keep_a = [i for i, item in enumerate(a) if item in in_b]
+    keep_b = [j for j, item in enumerate(b) if item in in_a]
+
+    blocks: List[MatchingBlock] = []
+    if len(keep_a) == len(a) and len(keep_b) == len(b):
+        _myers_blocks(a, b, 0, len(a), 0, len(b), blocks, budget)
+    elif keep_a and keep_b:
+        reduced: List[MatchingBlock] = []
+        _myers_blocks(
+            [a[i] for i in keep_a],
+            [b[j] for j in keep_b],
+            0,
+            len(keep_a),
+            0,
+            len(keep_b),
+            reduced,
+            budget,
+        )
+        # 映射回原始下标（相邻的单元素块由 _opcodes_from_blocks 合并）
+        for i, j, size in reduced:
+            blocks.extend((keep_a[i + t], keep_b[j + t], 1) for t in range(size))
+    return _opcodes_from_blocks(blocks, len(a), len(b))
+
+
+# ============ Patience ============
+
+
+def _longest_increasing(pairs: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """按 b 顺序给出的 (i, j) 对中，求 i 严格递增的最长子序列（patience 排序）"""
+    tails: List[int] = []
+    tail_index: List[int] = []
+    prev: List[int] = [-1] * len(pairs)
+    for idx, (i, _) in enumerate(pairs):
+        pos = bisect.bisect_left(tails, i)
+        if pos == len(tails):
+            tails.append(i)
+            tail_index.append(idx)
+        else:
+            tails[pos] = i
+            tail_index[pos] = idx
+        prev[idx] = tail_index[pos - 1] if pos else -1
+
+    result = []
+    idx = tail_index[-1] if tail_index else -1
+    while idx != -1:
+        result.append(pairs[idx])
+        idx = prev[idx]
+    result.reverse()
+    return result
+
+
+def _patience_blocks(
+    a: Sequence[Hashable],
+    b: Sequence[Hashable],
+    alo: int,
+    ahi: int,
+    blo: int,
+    bhi: int,
+    blocks: List[MatchingBlock],
+    budget: Optional[DiffBudget] = None,
+) -> None:
+    """patience 算法：以两侧均唯一的元素为锚点，无锚点时退化为 Myers"""
+    stack = [(alo, ahi, blo, bhi)]
+    while stack:
+        alo, ahi, blo, bhi = stack.pop()
+        alo, ahi, blo, bhi = _trim_region(a, b, alo, ahi, blo, bhi, blocks)
+        if alo == ahi or blo == bhi:
+            continue
+        if budget is not None:
+            budget.charge(ahi - alo + bhi - blo)
+
+        count_a: Dict[Hashable, int] = {}
+        position: Dict[Hashable, int] = {}
+        for i in range(alo, ahi):
+            item = a[i]
+            count_a[item] = count_a.get(item, 0) + 1
+            position[item] = i
+        count_b: Dict[Hashable, int] = {}
+        for j in range(blo, bhi):
+            item = b[j]
+            if count_a.get(item) == 1:
+                count_b[item] = count_b.get(item, 0) + 1
+
+        # 锚点：在 a 和 b 中各出现恰好一次的元素
+        pairs = [
+            (position[b[j]], j) for j in range(blo, bhi) if count_b.get(b[j]) == 1
+        ]
+        anchors = _longest_increasing(pairs)
+        if not anchors:
+            _myers_blocks(a, b, alo, ahi, blo, bhi, blocks, budget)
+            continue
+
+        prev_i, prev_j = alo, blo
+        for i, j in anchors:
+            blocks.append((i, j, 1))
+            stack.append((prev_i, i, prev_j, j))
+            prev_i, prev_j = i + 1, j + 1
+        stack.append((prev_i, ahi, prev_j, bhi))
+
+
+def patience_opcodes(
+    a: Sequence[Hashable], b: Sequence[Hashable], budget: Optional[DiffBudget] = None
+) -> List[Opcode]:
+    """patience diff，对代码和结构化文本的对齐效果更符合直觉"""
+    blocks: List[MatchingBlock] = []
+    _patience_blocks(a, b, 0, len(a), 0, len(b), blocks, budget)
+    return _opcodes_from_blocks(blocks, len(a), len(b))
+
+
+# ============ Histogram ============
+
+
+def _histogram_blocks(
+    a: Sequence[Hashable],
+    b: Sequence[Hashable],
+    alo: int,
+    ahi: int,
+    blo: int,
+    bhi: int,
+    blocks: List[MatchingBlock],
+    budget: Optional[DiffBudget] = None,
+) -> None:
+    """
+    histogram 算法（参照 JGit 实现）
+    选取区间内出现次数最少的公共元素扩展为最长公共片段作为分割点，
+    元素过于常见时退化为 Myers
+    """
+    stack = [(alo, ahi, blo, bhi)]
+    while stack:
+        alo, ahi, blo, bhi = stack.pop()
+        alo, ahi, blo, bhi = _trim_region(a, b, alo, ahi, blo, bhi, blocks)
+        if alo == ahi or blo == bhi:
+            continue
+        if budget is not None:
+            budget.charge(ahi - alo + bhi - blo)
+
+        occurrences: Dict[Hashable, List[int]] = {}
+        for i in range(alo, ahi):
+            occurrences.setdefault(a[i], []).append(i)
+
+        best = None  # (count, -size, i, j, size)
+        j = blo
+        while j < bhi:
+            positions = occurrences.get(b[j])
+            if not positions or len(positions) > HISTOGRAM_MAX_CHAIN:
+                j += 1
+                continue
+            if best is not None and len(positions) > best[0]:
+                j += 1
+                continue
+
+            next_j = j + 1
+            for i in positions:
+                # 向两侧扩展匹配
+                si, sj = i, j
+                while si > alo and sj > blo and a[si - 1] == b[sj - 1]:
+                    si -= 1
+                    sj -= 1
+                ei, ej = i + 1, j + 1
+                while ei < ahi and ej < bhi and a[ei] == b[ej]:
+                    ei += 1
+                    ej += 1
+                count = min(
+                    len(occurrences.get(a[k], positions)) for k in range(si, ei)
+                )
+                candidate = (count, -(ei - si), si, sj, ei - si)
+                if best is None or candidate < best:
+                    best = candidate
+                next_j = max(next_j, ej)
+            j = next_j
+
+        if best is None:
+            if any(item in occurrences for item in b[blo:bhi]):
+                # 公共元素都过于常见，交给 Myers 处理
+                _myers_blocks(a, b, alo, ahi, blo, bhi, blocks, budget)
+            continue
+
+        _, _, si, sj, size = best
+        blocks.append((si, sj, size))
+        stack.append((si + size, ahi, sj + size, bhi))
+        stack.append((alo, si, blo, sj))
+
+
+def histogram_opcodes(
+    a: Sequence[Hashable], b: Sequence[Hashable], budget: Optional[DiffBudget] = None
+) -> List[Opcode]:
+    """histogram diff，对大量重复元素的文本比 patience 更稳健"""
+    blocks: List[MatchingBlock] = []
+    _histogram_blocks(a, b, 0, len(a), 0, len(b), blocks, budget)
+    return _opcodes_from_blocks(blocks, len(a), len(b))
+
+
+# ============ difflib ============
+
+
+def difflib_opcodes(
+    a: Sequence[Hashable], b: Sequence[Hashable], budget: Optional[DiffBudget] = None
+) -> List[Opcode]:
+    """
+    标准库 SequenceMatcher（原有实现，最坏情况为平方复杂度）
+    SequenceMatcher 无法中途打断，只在开始前检查预算
+    """
+    if budget is not None:
+        budget.charge(len(a) + len(b))
+    return difflib.SequenceMatcher(None, a, b).get_opcodes()
+
+
+# 已注册的差异算法
+DIFF_ALGORITHMS: Dict[
+    str, Callable[[Sequence, Sequence, Optional[DiffBudget]], List[Opcode]]
+] = {
+    "difflib": difflib_opcodes,
+    "myers": myers_opcodes,
+    "patience": patience_opcodes,
+    "histogram": histogram_opcodes,
+}
+
+
+def get_opcodes(
+    a: Sequence[Hashable],
+    b: Sequence[Hashable],
+    algorithm: str = "myers",
+    budget: Optional[DiffBudget] = None,
+) -> List[Opcode]:
+    """
+    使用指定算法计算两个序列的 opcodes
+
+    Args:
+        a: 旧序列
+        b: 新序列
+        algorithm: 算法名称 (difflib, myers, patience, histogram)
+        budget: 计算预算（可选）
+
+    Returns:
+        difflib 风格的 opcodes 列表
+
+    Raises:
+        ValueError: 未知的算法名称
+        DiffBudgetExceeded: 超出计算预算
+    """
+    engine = DIFF_ALGORITHMS.get(algorithm)
+    if engine is None:
+        raise ValueError(f"Unknown diff algorithm: {algorithm}")
+    return engine(a, b, budget)
+
+
+# ============ 预处理 ============
+
+
+class PreparedSequences:
+    """
+    预处理后的待比较序列
+
+    去掉公共首尾后，中间部分的每个不同元素被映射为整数ID，
+    算法只需在紧凑的整数数组上比较
+    """
+
+    __slots__ = ("old_ids", "new_ids", "prefix", "suffix", "old_length", "new_length", "vocabulary")
+
+    def __init__(
+        self,
+        old_ids: array,
+        new_ids: array,
+        prefix: int,
+        suffix: int,
+        old_length: int,
+        new_length: int,
+        vocabulary: int,
+    ):
+        self.old_ids = old_ids
+        self.new_ids = new_ids
+        self.prefix = prefix
+        self.suffix = suffix
+        self.old_length = old_length
+        self.new_length = new_length
+        self.vocabulary = vocabulary
+
+    def stats(self) -> Dict[str, int]:
+        """预处理统计信息：裁剪掉的首尾长度与实际参与比较的长度"""
+        return {
+            "prefix_trimmed": self.prefix,
+            "suffix_trimmed": self.suffix,
+            "old_compared": len(self.old_ids),
+            "new_compared": len(self.new_ids),
+            "unique_tokens": self.vocabulary,
+        }
+
+
+def prepare_sequences(
+    a: Sequence[Hashable],
+    b: Sequence[Hashable],
+    budget: Optional[DiffBudget] = None,
+) -> PreparedSequences:
+    """
+    裁剪公共前缀/后缀，并将中间部分的元素映射为整数ID
+
+    Args:
+        a: 旧序列（行、单词或字符）
+        b: 新序列
+        budget: 计算预算（可选），中间部分过大时在映射前即放弃
+
+    Returns:
+        预处理结果
+    """
+    len_a, len_b = len(a), len(b)
+    limit = min(len_a, len_b)
+
+    prefix = 0
+    while prefix < limit and a[prefix] == b[prefix]:
+        prefix += 1
+
+    suffix = 0
+    limit -= prefix
+    while suffix < limit and a[len_a - 1 - suffix] == b[len_b - 1 - suffix]:
+        suffix += 1
+
+    if budget is not None:
+        budget.charge(len_a + len_b - 2 * (prefix + suffix))
+
+    ids: Dict[Hashable, int] = {}
+    old_ids = array("l", [ids.setdefault(item, len(ids)) for item in a[prefix:len_a - suffix]])
+    new_ids = array("l", [ids.setdefault(item, len(ids)) for item in b[prefix:len_b - suffix]])
+
+    return PreparedSequences(old_ids, new_ids, prefix, suffix, len_a, len_b, len(ids))
+
+
+def diff_sequences(
+    a: Sequence[Hashable],
+    b: Sequence[Hashable],
+    algorithm: str = "myers",
+    budget: Optional[DiffBudget] = None,
+) -> Tuple[List[Opcode], Dict[str, int]]:
+    """
+    完整的比较流程：预处理 -> 算法比较中间部分 -> 还原为完整序列的 opcodes
+
+    Args:
+        a: 旧序列
+        b: 新序列
+        algorithm: 算法名称
+        budget: 计算预算（可选）
+
+    Returns:
+        opcodes 列表和预处理统计信息
+    """
+    prepared = prepare_sequences(a, b, budget)
+    prefix = prepared.prefix
+
+    opcodes: List[Opcode] = []
+    if prefix:
+        opcodes.append(("equal", 0, prefix, 0, prefix))
+
+    if prepared.old_ids or prepared.new_ids:
+        for tag, i1, i2, j1, j2 in get_opcodes(
+            prepared.old_ids, prepared.new_ids, algorithm, budget
+        ):
+            opcodes.append((tag, i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix))
+
+    if prepared.suffix:
+        i2, j2 = prepared.old_length, prepared.new_length
+        i1, j1 = i2 - prepared.suffix, j2 - prepared.suffix
+        if opcodes and opcodes[-1][0] == "equal":
+            opcodes[-1] = ("equal", opcodes[-1][1], i2, opcodes[-1][3], j2)
+        else:
+            opcodes.append(("equal", i1, i2, j1, j2))
+
+    return opcodes, prepared.stats()
@@ -0,0 +1,115 @@
+"""
+差异结果缓存
+以内容哈希和比较选项为键的进程内 LRU 缓存，按字节数限制容量
+"""
+import sys
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, Hashable, Optional, Tuple
+
+from ..core.config import settings
+
+if TYPE_CHECKING:
+    from .diff_script import DiffScript
+
+# 每个缓存条目除文本外的固定开销估算（字节）
+_ENTRY_OVERHEAD = 256
+
+
+class DiffResultCache:
+    """
+    差异结果 LRU 缓存
+
+    版本内容不可变，差异结果只取决于两个版本的内容哈希和比较选项，
+    因此可以安全地跨请求复用
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(
+        old_hash: str,
+        new_hash: str,
+        diff_mode: str,
+        ignore_whitespace: bool,
+        ignore_case: bool,
+        algorithm: str,
+    ) -> Tuple:
+        """生成缓存键"""
+        return (old_hash, new_hash, diff_mode, ignore_whitespace, ignore_case, algorithm)
+
+    @staticmethod
+    def estimate_size(script: "DiffScript", stats: Dict) -> int:
+        """估算差异结果占用的内存（字节）"""
+        return _ENTRY_OVERHEAD + sys.getsizeof(stats) + script.estimate_size()
+
+    @staticmethod
+    def estimate_stats_size(stats: Dict) -> int:
+        """估算只含统计信息的结果占用的内存（字节）"""
+        return _ENTRY_OVERHEAD + sys.getsizeof(stats)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """读取缓存，命中时移动到最近使用位置"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, size: int) -> bool:
+        """
+        写入缓存，超出容量时淘汰最久未使用的条目
+
+        Returns:
+            是否写入成功（单个结果超过总容量时不缓存）
+        """
+        if size > self.max_bytes:
+            return False
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+        return True
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """缓存统计信息"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# 全局差异结果缓存实例
+diff_cache = DiffResultCache(settings.DIFF_CACHE_MAX_BYTES)
@@ -0,0 +1,136 @@
+"""
+差异计算执行器
+将 CPU 密集的差异计算从事件循环转移到进程池
+"""
+import asyncio
+import functools
+import multiprocessing
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..core.config import settings
+from ..schemas.document import DiffChange
+from .diff_service import DiffService
+from .diff_script import DiffScript
+
+logger = logging.getLogger(__name__)
+
+
+class DiffExecutorBusy(Exception):
+    """差异计算队列已满"""
+
+
+class DiffExecutor:
+    """
+    差异计算执行器
+
+    小文本直接在当前线程计算（避免进程间传输开销），
+    大文本提交到进程池，并限制排队中的任务数量
+    """
+
+    def __init__(self):
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self.max_pending = settings.DIFF_EXECUTOR_MAX_PENDING
+        self.inline_threshold = settings.DIFF_EXECUTOR_INLINE_THRESHOLD
+
+    @property
+    def running(self) -> bool:
+        """进程池是否已启动"""
+        return self._pool is not None
+
+    @property
+    def workers(self) -> int:
+        """工作进程数，未启动时为 1（直接在当前线程计算）"""
+        return self._pool._max_workers if self._pool is not None else 1
+
+    @property
+    def pending(self) -> int:
+        """正在执行或排队中的任务数"""
+        return self._pending
+
+    def start(self, max_workers: Optional[int] = None):
+        """
+        启动进程池
+
+        Args:
+            max_workers: 工作进程数，默认取配置（0 表示 CPU 核数）
+        """
+        if self._pool is not None:
+            return
+
+        workers = max_workers or settings.DIFF_EXECUTOR_WORKERS or None
+        # 使用 spawn 避免 fork 时继承事件循环和数据库连接
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        logger.info(f"Diff executor started with {self._pool._max_workers} workers")
+
+    def shutdown(self):
+        """关闭进程池，取消尚未开始的任务"""
+        if self._pool is None:
+            return
+
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+
+    async def run(self, func: Callable, *args: Any, size: int = 0, **kwargs: Any) -> Any:
+        """
+        执行差异计算相关的函数
+
+        Args:
+            func: 可被 pickle 的模块级函数或静态方法
+            size: 输入规模（字符数），低于阈值时直接计算
+            *args, **kwargs: 传给 func 的参数
+
+        Returns:
+            func 的返回值
+
+        Raises:
+            DiffExecutorBusy: 排队任务数已达上限
+        """
+        if self._pool is None or size < self.inline_threshold:
+            return func(*args, **kwargs)
+
+        if self._pending >= self.max_pending:
+            raise DiffExecutorBusy(
+                f"Too many pending diff computations ({self._pending})"
+            )
+
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._pool, functools.partial(func, *args, **kwargs)
+            )
+        finally:
+            self._pending -= 1
+
+    async def compute_diff(
+        self, old_text: str, new_text: str, **options: Any
+    ) -> Tuple[List[DiffChange], Dict]:
+        """异步版本的 DiffService.compute_diff"""
+        return await self.run(
+            DiffService.compute_diff,
+            old_text,
+            new_text,
+            size=len(old_text) + len(new_text),
+            **options,
+        )
+
+    async def compute_script(
+        self, old_text: str, new_text: str, **options: Any
+    ) -> Tuple[DiffScript, Dict]:
+        """异步版本的 DiffService.compute_script"""
+        return await self.run(
+            DiffService.compute_script,
+            old_text,
+            new_text,
+            size=len(old_text) + len(new_text),
+            **options,
+        )
+
+
+# 全局差异计算执行器实例
+diff_executor = DiffExecutor()
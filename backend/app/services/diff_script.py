@@ -0,0 +1,493 @@
+"""
+差异脚本
+紧凑的、基于数组的差异结果表示，按需转换为 DiffChange 或紧凑传输格式
+"""
+import json
+import re
+import sys
+from array import array
+from itertools import accumulate
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from ..core.config import settings
+from ..schemas.document import DiffChange
+from .tokenizers import split_words
+
+# 变化类型编码
+UNCHANGED = 0
+MODIFIED = 1
+DELETED = 2
+ADDED = 3
+MOVED = 4  # i1:i2 为移动前的位置，j1:j2 为移动后的位置
+
+CHANGE_TYPES = ("unchanged", "modified", "deleted", "added", "moved")
+
+
+class Hunk(NamedTuple):
+    """
+    hunk：相邻的变化及其上下文
+
+    old_start:old_end / new_start:new_end 为 hunk 覆盖的单元区间。
+    moved 变化的 i1:i2 是移动来源，不计入旧文本区间，
+    只含移动的 hunk 的旧文本区间为移动插入位置的空区间
+    """
+
+    old_start: int
+    old_end: int
+    new_start: int
+    new_end: int
+    ops: List[Tuple[int, int, int, int, int]]
+
+
+# 超长行的切分点：句末标点（含其后的引号、括号和空白）。
+# 英文句点等需后接空白，避免在小数、域名处切分
+_SENTENCE_END_PATTERN = re.compile(
+    r"[;。！？；…]+[\"'”’)\]]*\s*|[.!?]+[\"'”’)\]]*(?:\s+|$)"
+)
+# 次一级的切分点：逗号、冒号、JSON 括号和空白
+_SOFT_BREAK_PATTERN = re.compile(r"[,，、:：{}\[\]]\s*|\s+")
+
+
+def _split_at(text: str, start: int, end: int, pattern: "re.Pattern") -> List[int]:
+    """返回 text[start:end] 中 pattern 每次匹配的结束位置（不含 end）"""
+    return [
+        match.end()
+        for match in pattern.finditer(text, start, end)
+        if start < match.end() < end
+    ]
+
+
+def _pseudo_line_cuts(text: str, start: int, end: int, width: int) -> List[int]:
+    """
+    计算超长行的切分位置
+
+    先在每个句末切分，仍超过 width 的片段在每个次级切分点切分，
+    再超长的部分按定宽切分。切分点由内容决定（定宽除外），
+    因此前面的修改不会使后面的切分点整体错位
+    """
+    cuts = []
+    piece_start = start
+    for sentence_end in _split_at(text, start, end, _SENTENCE_END_PATTERN) + [end]:
+        if sentence_end - piece_start > width:
+            soft = _split_at(text, piece_start, sentence_end, _SOFT_BREAK_PATTERN)
+            pos = piece_start
+            for cut in soft + [sentence_end]:
+                while cut - pos > width:
+                    pos += width
+                    cuts.append(pos)
+                cuts.append(cut)
+                pos = cut
+        else:
+            cuts.append(sentence_end)
+        piece_start = sentence_end
+    return cuts
+
+
+def tokenize_lines(
+    text: str, split: Optional[Tuple[int, int]] = None
+) -> Tuple[List[str], array, Optional[array]]:
+    """
+    按行切分，超长行（如压缩的 JSON、没有换行的长段落）切分为多个伪行
+
+    Args:
+        text: 文本
+        split: (超长行阈值, 伪行宽度)，默认取配置，阈值为 0 表示不切分
+
+    Returns:
+        行（或伪行）列表、每行的起始偏移（末尾附加文本长度）、
+        每个伪行所在的真实行号（从1开始；没有超长行时为 None）
+    """
+    threshold, width = split or (
+        settings.DIFF_LONG_LINE_THRESHOLD,
+        settings.DIFF_PSEUDO_LINE_WIDTH,
+    )
+    lines = text.splitlines(keepends=True)
+    bounds = array("q", [0])
+    bounds.extend(accumulate(len(line) for line in lines))
+
+    if not threshold or all(len(line) <= threshold for line in lines):
+        return lines, bounds, None
+
+    pseudo_lines = []
+    pseudo_bounds = array("q", [0])
+    line_numbers = array("q")
+    for number, line in enumerate(lines, 1):
+        start = bounds[number - 1]
+        if len(line) <= threshold:
+            cuts = [start + len(line)]
+        else:
+            cuts = _pseudo_line_cuts(text, start, start + len(line), max(width, 1))
+        for cut in cuts:
+            pseudo_lines.append(text[pseudo_bounds[-1]:cut])
+            pseudo_bounds.append(cut)
+            line_numbers.append(number)
+    return pseudo_lines, pseudo_bounds, line_numbers
+
+
+def tokenize(
+    text: str, unit: str, tokenizer: Optional[str] = None
+) -> Tuple[Sequence[str], Optional[array]]:
+    """
+    将文本切分为比较单元
+
+    Args:
+        text: 文本
+        unit: 比较单元 (line, word, char)
+        tokenizer: 单词模式的分词器名称，默认取配置 DIFF_WORD_TOKENIZER
+
+    Returns:
+        比较用的单元序列，以及每个单元在原文中的起始偏移（末尾附加文本长度）；
+        字符模式下偏移即下标，返回 None
+    """
+    if unit == "char":
+        return text, None
+
+    if unit == "word":
+        tokens, starts = split_words(text, tokenizer or settings.DIFF_WORD_TOKENIZER)
+        if not tokens:
+            return tokens, array("q", [0])
+        # 单词后的空白归入该单元，首个单元从文本开头算起
+        bounds = array("q", starts)
+        bounds[0] = 0
+        bounds.append(len(text))
+        return tokens, bounds
+
+    lines, bounds, _ = tokenize_lines(text)
+    return lines, bounds
+
+
+def _line_range(line_numbers: Optional[array], i1: int, i2: int) -> Tuple[int, int]:
+    """单元区间对应的真实行号范围（从1开始，包含两端）"""
+    if line_numbers is None:
+        return i1 + 1, i2
+    return line_numbers[i1], line_numbers[i2 - 1]
+
+
+def _unified_range(start: int, end: int) -> str:
+    """unified diff hunk 头中的行范围（同 difflib）"""
+    length = end - start
+    if length == 1:
+        return str(start + 1)
+    return f"{start + 1 if length else start},{length}"
+
+
+class DiffScript:
+    """
+    差异脚本
+
+    每个变化以 (类型, i1, i2, j1, j2) 五个整数存放在同一个数组中，
+    下标指向比较单元（行、单词或字符），原文只保存一份。
+    行模式下超长行被切分为伪行时，old_line_numbers / new_line_numbers
+    记录每个伪行所在的真实行号
+    """
+
+    __slots__ = (
+        "old_text",
+        "new_text",
+        "unit",
+        "old_bounds",
+        "new_bounds",
+        "old_line_numbers",
+        "new_line_numbers",
+        "ops",
+    )
+
+    def __init__(
+        self,
+        old_text: str,
+        new_text: str,
+        unit: str,
+        old_bounds: Optional[array] = None,
+        new_bounds: Optional[array] = None,
+        old_line_numbers: Optional[array] = None,
+        new_line_numbers: Optional[array] = None,
+    ):
+        self.old_text = old_text
+        self.new_text = new_text
+        self.unit = unit
+        self.old_bounds = old_bounds
+        self.new_bounds = new_bounds
+        self.old_line_numbers = old_line_numbers
+        self.new_line_numbers = new_line_numbers
+        self.ops = array("q")
+
+    def __len__(self) -> int:
+        return len(self.ops) // 5
+
+    def __iter__(self) -> Iterator[Tuple[int, int, int, int, int]]:
+        ops = self.ops
+        for k in range(0, len(ops), 5):
+            yield ops[k], ops[k + 1], ops[k + 2], ops[k + 3], ops[k + 4]
+
+    def append(self, change_type: int, i1: int, i2: int, j1: int, j2: int) -> None:
+        """追加一个变化"""
+        self.ops.extend((change_type, i1, i2, j1, j2))
+
+    def old_span(self, i1: int, i2: int) -> Tuple[int, int]:
+        """旧文本中单元区间对应的字符偏移"""
+        if self.old_bounds is None:
+            return i1, i2
+        return self.old_bounds[i1], self.old_bounds[i2]
+
+    def new_span(self, j1: int, j2: int) -> Tuple[int, int]:
+        """新文本中单元区间对应的字符偏移"""
+        if self.new_bounds is None:
+            return j1, j2
+        return self.new_bounds[j1], self.new_bounds[j2]
+
+    def change_dict(
+        self,
+        change_type: int,
+        i1: int,
+        i2: int,
+        j1: int,
+        j2: int,
+        spans: Optional[Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]] = None,
+    ) -> Dict:
+        """
+        将一个变化转换为与 DiffChange 字段一致的字典（省略空字段）
+
+        spans 为行内细化得到的 (old_spans, new_spans)
+        """
+        lines = self.unit == "line"
+        change = {"type": CHANGE_TYPES[change_type]}
+
+        if change_type != ADDED:
+            start, end = self.old_span(i1, i2)
+            change["old_text"] = self.old_text[start:end]
+            if lines:
+                change["old_line_start"], change["old_line_end"] = _line_range(
+                    self.old_line_numbers, i1, i2
+                )
+        if change_type != DELETED:
+            start, end = self.new_span(j1, j2)
+            change["new_text"] = self.new_text[start:end]
+            if lines:
+                change["new_line_start"], change["new_line_end"] = _line_range(
+                    self.new_line_numbers, j1, j2
+                )
+        if spans:
+            change["old_spans"], change["new_spans"] = spans
+
+        return change
+
+    def change(
+        self,
+        change_type: int,
+        i1: int,
+        i2: int,
+        j1: int,
+        j2: int,
+        spans: Optional[Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]] = None,
+    ) -> DiffChange:
+        """将一个变化转换为 DiffChange"""
+        return DiffChange(**self.change_dict(change_type, i1, i2, j1, j2, spans))
+
+    def iter_changes(self) -> Iterator[DiffChange]:
+        """逐个生成 DiffChange"""
+        for op in self:
+            yield self.change(*op)
+
+    def to_changes(self) -> List[DiffChange]:
+        """转换为 DiffChange 列表"""
+        return list(self.iter_changes())
+
+    def iter_ndjson(
+        self, batch_size: int = 256, spans: Optional[Dict[Tuple, Tuple]] = None
+    ) -> Iterator[str]:
+        """
+        逐批生成换行分隔的 JSON，每行一个变化
+
+        不经过 DiffChange 校验，直接序列化字典；spans 为按变化索引的行内细化结果
+        """
+        spans = spans or {}
+        batch = []
+        for op in self:
+            change = self.change_dict(*op, spans=spans.get(op))
+            batch.append(json.dumps(change, ensure_ascii=False))
+            if len(batch) >= batch_size:
+                yield "\n".join(batch) + "\n"
+                batch = []
+        if batch:
+            yield "\n".join(batch) + "\n"
+
+    def hunks(self, context: int = 3) -> List[Hunk]:
+        """
+        将变化分组为 hunk（类似 unified diff）
+
+        每个 hunk 包含相邻的变化以及前后最多 context 个未变化单元，
+        间隔超过 2 * context 个单元的变化分属不同 hunk
+
+        Args:
+            context: 上下文单元数（行模式下即行数）
+
+        Returns:
+            hunk 列表，每个 hunk 的 ops 为 (类型, i1, i2, j1, j2) 列表
+        """
+        return list(self.iter_hunks(context))
+
+    def iter_hunks(self, context: int = 3) -> Iterator[Hunk]:
+        """逐个生成 hunk（同 hunks），不含任何变化的分组不会生成"""
+        group = []
+        changed = False
+        # 旧文本的当前位置（moved 变化不推进），用作只含移动的 hunk 的旧文本区间
+        old_pos = 0
+        for change_type, i1, i2, j1, j2 in self:
+            if change_type == UNCHANGED:
+                if changed:
+                    if i2 - i1 <= 2 * context:
+                        # 间隔较短，与下一个变化合并到同一个 hunk
+                        group.append((UNCHANGED, i1, i2, j1, j2))
+                        old_pos = i2
+                        continue
+                    # 结束当前 hunk 的后置上下文
+                    if context:
+                        group.append((UNCHANGED, i1, i1 + context, j1, j1 + context))
+                    yield self._hunk(group, i1)
+                # 下一个 hunk 的前置上下文（替换之前只有上下文的分组）
+                head = min(i2 - i1, context)
+                group = [(UNCHANGED, i2 - head, i2, j2 - head, j2)] if head else []
+                changed = False
+                old_pos = i2
+                continue
+            group.append((change_type, i1, i2, j1, j2))
+            changed = True
+            if change_type != MOVED:
+                old_pos = i2
+
+        if not changed:
+            return
+        if group[-1][0] == UNCHANGED:
+            # 文本末尾的未变化内容只保留 context 个单元
+            _, i1, i2, j1, j2 = group.pop()
+            tail = min(i2 - i1, context)
+            if tail:
+                group.append((UNCHANGED, i1, i1 + tail, j1, j1 + tail))
+            old_pos = i1
+        yield self._hunk(group, old_pos)
+
+    @staticmethod
+    def _hunk(group: List[Tuple[int, int, int, int, int]], old_pos: int) -> Hunk:
+        """计算分组覆盖的区间，moved 变化的旧区间（移动来源）不参与计算"""
+        old_ranges = [(op[1], op[2]) for op in group if op[0] != MOVED]
+        if old_ranges:
+            old_start, old_end = old_ranges[0][0], old_ranges[-1][1]
+        else:
+            old_start = old_end = old_pos
+        return Hunk(old_start, old_end, group[0][3], group[-1][4], group)
+
+    def iter_unified(
+        self, from_label: str, to_label: str, context: int = 3
+    ) -> Iterator[str]:
+        """
+        逐个 hunk 生成 unified diff 文本
+
+        只适用于按换行符切分（未切分伪行、不含移动）的行级脚本，
+        见 DiffService.compute_patch_script
+
+        Args:
+            from_label: 旧文件名（--- 行）
+            to_label: 新文件名（+++ 行）
+            context: 上下文行数
+
+        Returns:
+            文本片段迭代器：首个片段包含文件头，之后每个片段为一个 hunk
+        """
+        header = f"--- {from_label}\n+++ {to_label}\n"
+        for hunk in self.iter_hunks(context):
+            parts = [
+                header,
+                f"@@ -{_unified_range(hunk.old_start, hunk.old_end)} "
+                f"+{_unified_range(hunk.new_start, hunk.new_end)} @@\n",
+            ]
+            header = ""
+            for change_type, i1, i2, j1, j2 in hunk.ops:
+                if change_type == UNCHANGED:
+                    self._patch_lines(parts, " ", self.old_text, self.old_bounds, i1, i2)
+                    continue
+                if change_type != ADDED:
+                    self._patch_lines(parts, "-", self.old_text, self.old_bounds, i1, i2)
+                if change_type != DELETED:
+                    self._patch_lines(parts, "+", self.new_text, self.new_bounds, j1, j2)
+            yield "".join(parts)
+
+    @staticmethod
+    def _patch_lines(
+        parts: List[str], prefix: str, text: str, bounds: array, start: int, end: int
+    ) -> None:
+        """追加带前缀的行，末行没有换行符时附加标记"""
+        for k in range(start, end):
+            line = text[bounds[k]:bounds[k + 1]]
+            parts.append(prefix + line)
+            if not line.endswith("\n"):
+                parts.append("\n\\ No newline at end of file\n")
+
+    def to_compact(self) -> Dict:
+        """
+        转换为紧凑传输格式
+
+        opcodes 中每项为 [类型, 旧文本起, 旧文本止, 新文本起, 新文本止]（字符偏移），
+        inserted 依次给出 modified/added 变化的新文本，其余内容（包括 moved）
+        由客户端从旧文本中截取
+        """
+        opcodes = []
+        inserted = []
+        for change_type, i1, i2, j1, j2 in self:
+            old_start, old_end = self.old_span(i1, i2)
+            new_start, new_end = self.new_span(j1, j2)
+            opcodes.append((change_type, old_start, old_end, new_start, new_end))
+            if change_type in (MODIFIED, ADDED):
+                inserted.append(self.new_text[new_start:new_end])
+        return {"unit": self.unit, "opcodes": opcodes, "inserted": inserted}
+
+    def to_state(self) -> Dict:
+        """导出不含原文的状态（用于持久化），可通过 from_state 还原"""
+        state = {"unit": self.unit, "ops": self.ops.tolist()}
+        if self.unit == "word":
+            state["tokenizer"] = settings.DIFF_WORD_TOKENIZER
+        elif self.unit == "line":
+            state["line_split"] = [
+                settings.DIFF_LONG_LINE_THRESHOLD,
+                settings.DIFF_PSEUDO_LINE_WIDTH,
+            ]
+        return state
+
+    @classmethod
+    def from_state(cls, state: Dict, old_text: str, new_text: str) -> "DiffScript":
+        """由 to_state 导出的状态和原文还原差异脚本"""
+        unit = state["unit"]
+        if unit == "line":
+            # 按保存时的切分参数还原伪行（旧数据没有该字段，未切分）
+            split = tuple(state.get("line_split", (0, 0)))
+            _, old_bounds, old_line_numbers = tokenize_lines(old_text, split)
+            _, new_bounds, new_line_numbers = tokenize_lines(new_text, split)
+            script = cls(
+                old_text,
+                new_text,
+                unit,
+                old_bounds,
+                new_bounds,
+                old_line_numbers,
+                new_line_numbers,
+            )
+        else:
+            tokenizer = state.get("tokenizer")
+            _, old_bounds = tokenize(old_text, unit, tokenizer)
+            _, new_bounds = tokenize(new_text, unit, tokenizer)
+            script = cls(old_text, new_text, unit, old_bounds, new_bounds)
+        script.ops = array("q", state["ops"])
+        return script
+
+    def estimate_size(self) -> int:
+        """估算占用的内存（字节）"""
+        size = sys.getsizeof(self.old_text) + sys.getsizeof(self.new_text)
+        size += self.ops.itemsize * len(self.ops)
+        for bounds in (
+            self.old_bounds,
+            self.new_bounds,
+            self.old_line_numbers,
+            self.new_line_numbers,
+        ):
+            if bounds is not None:
+                size += bounds.itemsize * len(bounds)
+        return size
@@ -1,10 +1,57 @@
 """
 差异比较服务
-基于 difflib 实现文本差异算法
+基于可插拔的差异算法引擎实现文本差异比较
 """
 import difflib
-from typing import List, Dict, Tuple, Optional
+import re
+import time
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+from typing import Callable, List, Dict, Tuple, Optional, Sequence, TypeVar
+from ..core.config import settings
 from ..schemas.document import DiffChange
+from .diff_algorithms import (
+    DiffBudget,
+    DiffBudgetExceeded,
+    diff_sequences,
+    prepare_sequences,
+)
+from .diff_script import (
+    DiffScript,
+    tokenize,
+    tokenize_lines,
+    UNCHANGED,
+    MODIFIED,
+    DELETED,
+    ADDED,
+    MOVED,
+)
+
+# 忽略空白的字符模式下参与比较的字符
+_NON_SPACE_PATTERN = re.compile(r"\S")
+
+# 替换块相似度判定的各层名称（用于统计由哪一层做出判定）
+SIMILARITY_LAYERS = ("real_quick_ratio", "quick_ratio", "shingle", "ratio")
+
+# 移动检测时锚点行允许的最多出现次数，更常见的行（如空行、括号）不作为锚点
+MOVE_MAX_CANDIDATES = 8
+
+# 单词模式预估单元数时分词的样本长度
+_WORD_ESTIMATE_SAMPLE = 65536
+
+T = TypeVar("T")
+
+# 差异模式对应的比较单元
+UNIT_BY_MODE = {"character": "char", "word": "word", "line": "line"}
+
+# 超出预算时的降级顺序：character -> word -> line -> block
+DEGRADATION_ORDER = {
+    "character": "word",
+    "word": "line",
+    "semantic": "line",
+    "line": "block",
+}
 
 
 class DiffService:
@@ -17,272 +64,844 @@ class DiffService:
         diff_mode: str = "semantic",
         ignore_whitespace: bool = False,
         ignore_case: bool = False,
+        algorithm: Optional[str] = None,
+        time_budget_ms: Optional[int] = None,
+        cost_budget: Optional[int] = None,
     ) -> Tuple[List[DiffChange], Dict]:
         """
         计算两个文本之间的差异
 
+        参数同 compute_script
+
+        Returns:
+            差异列表和统计信息
+        """
+        script, stats = DiffService.compute_script(
+            old_text,
+            new_text,
+            diff_mode=diff_mode,
+            ignore_whitespace=ignore_whitespace,
+            ignore_case=ignore_case,
+            algorithm=algorithm,
+            time_budget_ms=time_budget_ms,
+            cost_budget=cost_budget,
+        )
+        return script.to_changes(), stats
+
+    @staticmethod
+    def compute_script(
+        old_text: str,
+        new_text: str,
+        diff_mode: str = "semantic",
+        ignore_whitespace: bool = False,
+        ignore_case: bool = False,
+        algorithm: Optional[str] = None,
+        time_budget_ms: Optional[int] = None,
+        cost_budget: Optional[int] = None,
+    ) -> Tuple[DiffScript, Dict]:
+        """
+        计算两个文本之间的差异，返回紧凑的差异脚本
+
         Args:
             old_text: 旧文本
             new_text: 新文本
             diff_mode: 差异模式 (character, word, line, semantic)
             ignore_whitespace: 是否忽略空白字符
             ignore_case: 是否忽略大小写
+            algorithm: 差异算法 (difflib, myers, patience, histogram)，默认取配置
+            time_budget_ms: 时间预算（毫秒），默认取配置
+            cost_budget: 计算量预算，默认取配置
 
         Returns:
-            差异列表和统计信息
+            差异脚本和统计信息。超出预算时自动降级到更粗的粒度，
+            stats 中的 degraded 和 effective_mode 标明实际使用的模式
         """
-        # 文本预处理
-        if ignore_whitespace:
-            old_text = " ".join(old_text.split())
-            new_text = " ".join(new_text.split())
+        # 忽略空白/大小写只作用于比较用的键，原文和行号保持不变
+        options = {"ignore_whitespace": ignore_whitespace, "ignore_case": ignore_case}
+        algorithm = algorithm or settings.DIFF_ALGORITHM
+        if time_budget_ms is None:
+            time_budget_ms = settings.DIFF_TIME_BUDGET_MS
+        if cost_budget is None:
+            cost_budget = settings.DIFF_COST_BUDGET
 
-        if ignore_case:
-            old_text = old_text.lower()
-            new_text = new_text.lower()
-
-        # 根据模式选择差异算法
-        if diff_mode == "line":
-            return DiffService._line_diff(old_text, new_text)
-        elif diff_mode == "word":
-            return DiffService._word_diff(old_text, new_text)
-        elif diff_mode == "character":
-            return DiffService._character_diff(old_text, new_text)
-        else:  # semantic (默认)
-            return DiffService._semantic_diff(old_text, new_text)
+        if diff_mode not in DEGRADATION_ORDER:
+            diff_mode = "semantic"
+
+        mode, result = DiffService._run_degrading(
+            diff_mode,
+            old_text,
+            new_text,
+            time_budget_ms,
+            cost_budget,
+            lambda mode, budget: DiffService._mode_diff(
+                mode, old_text, new_text, algorithm, budget, **options
+            ),
+        )
+        if result is None:
+            result = DiffService._block_diff(old_text, new_text, **options)
+        script, stats = result
+
+        stats["degraded"] = mode != diff_mode
+        stats["effective_mode"] = mode
+        return script, stats
 
     @staticmethod
-    def _line_diff(old_text: str, new_text: str) -> Tuple[List[DiffChange], Dict]:
-        """行级差异比较"""
-        old_lines = old_text.splitlines(keepends=True)
-        new_lines = new_text.splitlines(keepends=True)
+    def compute_stats(
+        old_text: str,
+        new_text: str,
+        diff_mode: str = "semantic",
+        ignore_whitespace: bool = False,
+        ignore_case: bool = False,
+        algorithm: Optional[str] = None,
+        time_budget_ms: Optional[int] = None,
+        cost_budget: Optional[int] = None,
+    ) -> Dict:
+        """
+        只统计变化量（新增、删除、修改、未变化的单元数），不生成差异脚本
 
-        diff = difflib.unified_diff(old_lines, new_lines, lineterm="")
-        changes = []
-        stats = {"added": 0, "deleted": 0, "modified": 0, "unchanged": 0}
+        比较单元在预处理时映射为整数ID后直接由 opcodes 计数，
+        不截取变化文本，也不创建 DiffChange。语义模式按行计数
+        （不做相似度判定和移动检测），修改数为替换块中较多一侧的行数
+
+        参数同 compute_script
+
+        Returns:
+            统计信息，degraded 和 effective_mode 含义同 compute_script
+        """
+        options = {"ignore_whitespace": ignore_whitespace, "ignore_case": ignore_case}
+        algorithm = algorithm or settings.DIFF_ALGORITHM
+        if time_budget_ms is None:
+            time_budget_ms = settings.DIFF_TIME_BUDGET_MS
+        if cost_budget is None:
+            cost_budget = settings.DIFF_COST_BUDGET
+
+        if diff_mode not in DEGRADATION_ORDER:
+            diff_mode = "semantic"
+
+        start_mode = "line" if diff_mode == "semantic" else diff_mode
+        mode, stats = DiffService._run_degrading(
+            start_mode,
+            old_text,
+            new_text,
+            time_budget_ms,
+            cost_budget,
+            lambda mode, budget: DiffService._count_units(
+                old_text, new_text, UNIT_BY_MODE[mode], algorithm, budget, **options
+            ),
+        )
+        if stats is None:
+            _, stats = DiffService._block_diff(old_text, new_text, **options)
 
-        # 使用 SequenceMatcher 获取更详细的差异信息
-        matcher = difflib.SequenceMatcher(None, old_lines, new_lines)
+        stats["degraded"] = mode != start_mode
+        stats["effective_mode"] = mode
+        return stats
 
-        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+    @staticmethod
+    def _run_degrading(
+        mode: str,
+        old_text: str,
+        new_text: str,
+        time_budget_ms: int,
+        cost_budget: int,
+        run: Callable[[str, DiffBudget], T],
+    ) -> Tuple[str, Optional[T]]:
+        """
+        从指定粒度开始计算，超出预算时逐级降级
+
+        每个粒度只使用剩余时间的 DIFF_LEVEL_TIME_SHARE（最后一个粒度使用全部剩余时间），
+        保证较粗的粒度总有时间执行；预估比较单元数明显超出时间或计算量预算的粒度
+        直接跳过，不做切分和预处理
+
+        Args:
+            mode: 起始模式
+            old_text: 旧文本
+            new_text: 新文本
+            time_budget_ms: 总时间预算（毫秒）
+            cost_budget: 单个粒度的计算量预算
+            run: 按 (模式, 预算) 计算的函数
+
+        Returns:
+            (实际使用的模式, 计算结果)；所有粒度都超出预算时为 ("block", None)
+        """
+        deadline = time.monotonic() + time_budget_ms / 1000
+        middle = None
+        while mode != "block":
+            remaining = max(deadline - time.monotonic(), 0.0)
+            if DEGRADATION_ORDER[mode] != "block":
+                remaining *= settings.DIFF_LEVEL_TIME_SHARE
+            if middle is None:
+                middle = DiffService._trimmed_middle(old_text, new_text)
+            units = DiffService._estimate_units(middle, mode)
+            if units <= min(cost_budget, remaining * settings.DIFF_UNITS_PER_SECOND):
+                budget = DiffBudget(time.monotonic() + remaining, cost_budget)
+                try:
+                    return mode, run(mode, budget)
+                except DiffBudgetExceeded:
+                    pass
+            mode = DEGRADATION_ORDER[mode]
+        return mode, None
+
+    @staticmethod
+    def _trimmed_middle(old_text: str, new_text: str) -> Tuple[str, str]:
+        """去掉两个文本的公共前缀和后缀（按字符，二分查找并由切片比较完成）"""
+        limit = min(len(old_text), len(new_text))
+        low, high = 0, limit
+        while low < high:
+            mid = (low + high + 1) // 2
+            if old_text.startswith(new_text[low:mid], low):
+                low = mid
+            else:
+                high = mid - 1
+        prefix = low
+
+        old_len, new_len = len(old_text), len(new_text)
+        low, high = 0, limit - prefix
+        while low < high:
+            mid = (low + high + 1) // 2
+            if old_text.endswith(new_text[new_len - mid:new_len - low], 0, old_len - low):
+                low = mid
+            else:
+                high = mid - 1
+        suffix = low
+        return old_text[prefix:old_len - suffix], new_text[prefix:new_len - suffix]
+
+    @staticmethod
+    def _estimate_units(middle: Tuple[str, str], mode: str) -> int:
+        """
+        预估两个文本去掉公共首尾后需要比较的单元总数
+
+        字符模式为字符数，行模式（含语义模式）为换行数，
+        单词模式按开头一段的分词结果估算
+        """
+        old_middle, new_middle = middle
+        if mode == "character":
+            return len(old_middle) + len(new_middle)
+        if mode == "word":
+            total = len(old_middle) + len(new_middle)
+            sample = (old_middle or new_middle)[:_WORD_ESTIMATE_SAMPLE]
+            if not sample:
+                return 0
+            tokens, _ = tokenize(sample, "word")
+            return total * max(len(tokens), 1) // len(sample)
+        return old_middle.count("\n") + new_middle.count("\n") + 2
+
+    @staticmethod
+    def compute_patch_script(
+        old_text: str,
+        new_text: str,
+        algorithm: Optional[str] = None,
+        time_budget_ms: Optional[int] = None,
+        cost_budget: Optional[int] = None,
+    ) -> DiffScript:
+        """
+        计算用于导出 unified diff 的行级差异脚本
+
+        只按换行符切分（不切分超长行为伪行，也不识别其他换行字符），
+        保证生成的补丁可以被 patch / git apply 应用。超出预算时不降级，
+        只保留公共首尾行，中间部分整体替换
+
+        Args:
+            old_text: 旧文本
+            new_text: 新文本
+            algorithm: 差异算法，默认取配置
+            time_budget_ms: 时间预算（毫秒），默认取配置
+            cost_budget: 计算量预算，默认取配置
+
+        Returns:
+            行级差异脚本（只含 unchanged / modified / deleted / added）
+        """
+        algorithm = algorithm or settings.DIFF_ALGORITHM
+        if time_budget_ms is None:
+            time_budget_ms = settings.DIFF_TIME_BUDGET_MS
+        if cost_budget is None:
+            cost_budget = settings.DIFF_COST_BUDGET
+
+        old_lines, old_bounds = DiffService._newline_units(old_text)
+        new_lines, new_bounds = DiffService._newline_units(new_text)
+        script = DiffScript(old_text, new_text, "line", old_bounds, new_bounds)
+
+        budget = DiffBudget(time.monotonic() + time_budget_ms / 1000, cost_budget)
+        try:
+            opcodes, _ = diff_sequences(old_lines, new_lines, algorithm, budget)
+        except DiffBudgetExceeded:
+            prepared = prepare_sequences(old_lines, new_lines)
+            prefix, suffix = prepared.prefix, prepared.suffix
+            old_end, new_end = len(old_lines) - suffix, len(new_lines) - suffix
+            opcodes = [
+                ("equal", 0, prefix, 0, prefix),
+                ("replace", prefix, old_end, prefix, new_end),
+                ("equal", old_end, len(old_lines), new_end, len(new_lines)),
+            ]
+
+        types = {"equal": UNCHANGED, "replace": MODIFIED, "delete": DELETED, "insert": ADDED}
+        for tag, i1, i2, j1, j2 in opcodes:
+            if i2 > i1 or j2 > j1:
+                if tag == "replace" and i1 == i2:
+                    tag = "insert"
+                elif tag == "replace" and j1 == j2:
+                    tag = "delete"
+                script.append(types[tag], i1, i2, j1, j2)
+        return script
+
+    @staticmethod
+    def _newline_units(text: str) -> Tuple[List[str], array]:
+        """按换行符切分行（保留换行符），返回行列表和行起始偏移"""
+        lines = text.split("\n")
+        last = lines.pop()
+        lines = [line + "\n" for line in lines]
+        if last:
+            lines.append(last)
+        bounds = array("q", [0])
+        bounds.extend(accumulate(len(line) for line in lines))
+        return lines, bounds
+
+    @staticmethod
+    def _count_units(
+        old_text: str,
+        new_text: str,
+        unit: str,
+        algorithm: str,
+        budget: Optional[DiffBudget],
+        ignore_whitespace: bool = False,
+        ignore_case: bool = False,
+    ) -> Dict:
+        """按比较单元计数（与 _unit_diff 的统计一致）"""
+        old_keys, _, _ = DiffService._comparison_units(
+            old_text, unit, ignore_whitespace, ignore_case
+        )
+        new_keys, _, _ = DiffService._comparison_units(
+            new_text, unit, ignore_whitespace, ignore_case
+        )
+        stats = {"added": 0, "deleted": 0, "modified": 0, "unchanged": 0}
+        opcodes, stats["preprocess"] = diff_sequences(old_keys, new_keys, algorithm, budget)
+        for tag, i1, i2, j1, j2 in opcodes:
             if tag == "equal":
                 stats["unchanged"] += i2 - i1
-                # 添加未变化的内容，用于显示完整文本
-                changes.append(
-                    DiffChange(
-                        type="unchanged",
-                        old_text="".join(old_lines[i1:i2]),
-                        new_text="".join(old_lines[i1:i2]),
-                        old_line_start=i1 + 1,
-                        old_line_end=i2,
-                        new_line_start=i1 + 1,
-                        new_line_end=i2,
-                    )
-                )
             elif tag == "replace":
                 stats["modified"] += max(i2 - i1, j2 - j1)
-                changes.append(
-                    DiffChange(
-                        type="modified",
-                        old_text="".join(old_lines[i1:i2]),
-                        new_text="".join(new_lines[j1:j2]),
-                        old_line_start=i1 + 1,
-                        old_line_end=i2,
-                        new_line_start=j1 + 1,
-                        new_line_end=j2,
-                    )
-                )
             elif tag == "delete":
                 stats["deleted"] += i2 - i1
-                changes.append(
-                    DiffChange(
-                        type="deleted",
-                        old_text="".join(old_lines[i1:i2]),
-                        old_line_start=i1 + 1,
-                        old_line_end=i2,
-                    )
-                )
             elif tag == "insert":
                 stats["added"] += j2 - j1
-                changes.append(
-                    DiffChange(
-                        type="added",
-                        new_text="".join(new_lines[j1:j2]),
-                        new_line_start=j1 + 1,
-                        new_line_end=j2,
-                    )
-                )
+        return stats
 
-        return changes, stats
+    @staticmethod
+    def _mode_diff(
+        mode: str,
+        old_text: str,
+        new_text: str,
+        algorithm: str,
+        budget: DiffBudget,
+        **options: bool,
+    ) -> Tuple[DiffScript, Dict]:
+        """根据模式选择差异粒度"""
+        if mode == "line":
+            return DiffService._line_diff(old_text, new_text, algorithm, budget, **options)
+        elif mode == "word":
+            return DiffService._word_diff(old_text, new_text, algorithm, budget, **options)
+        elif mode == "character":
+            return DiffService._character_diff(
+                old_text, new_text, algorithm, budget, **options
+            )
+        else:  # semantic (默认)
+            return DiffService._semantic_diff(
+                old_text, new_text, algorithm, budget, **options
+            )
 
     @staticmethod
-    def _word_diff(old_text: str, new_text: str) -> Tuple[List[DiffChange], Dict]:
-        """单词级差异比较"""
-        old_words = old_text.split()
-        new_words = new_text.split()
+    def _comparison_units(
+        text: str,
+        unit: str,
+        ignore_whitespace: bool = False,
+        ignore_case: bool = False,
+    ) -> Tuple[Sequence[str], Optional[array], Optional[array]]:
+        """
+        切分比较单元并生成比较用的键
+
+        忽略空白时行的键为折叠空白后的内容，字符模式跳过空白字符
+        （空白归入前一个单元）；忽略大小写时键转为小写。
+        偏移始终指向原文，因此返回给用户的文本和行号不受影响
+
+        Returns:
+            比较用的键序列、单元偏移（同 tokenize），
+            以及行模式下超长行切分为伪行时每个伪行的真实行号
+        """
+        line_numbers = None
+        if unit == "line":
+            keys, bounds, line_numbers = tokenize_lines(text)
+            if ignore_whitespace:
+                keys = [" ".join(line.split()) for line in keys]
+        elif unit == "char" and ignore_whitespace:
+            starts = [match.start() for match in _NON_SPACE_PATTERN.finditer(text)]
+            keys = [text[start] for start in starts]
+            bounds = array("q", starts or [0])
+            if starts:
+                bounds[0] = 0
+                bounds.append(len(text))
+        else:
+            keys, bounds = tokenize(text, unit)
 
-        matcher = difflib.SequenceMatcher(None, old_words, new_words)
-        changes = []
+        if ignore_case:
+            if isinstance(keys, str):
+                lowered = keys.lower()
+                # 个别字符小写后长度会变化，此时逐字符转换以保持下标对应
+                keys = lowered if len(lowered) == len(keys) else [c.lower() for c in keys]
+            else:
+                keys = [key.lower() for key in keys]
+
+        return keys, bounds, line_numbers
+
+    @staticmethod
+    def _block_diff(
+        old_text: str,
+        new_text: str,
+        ignore_whitespace: bool = False,
+        ignore_case: bool = False,
+    ) -> Tuple[DiffScript, Dict]:
+        """整块替换（最粗粒度，超出预算时的最终兜底）"""
         stats = {"added": 0, "deleted": 0, "modified": 0, "unchanged": 0}
+        old_lines, old_bounds, old_numbers = DiffService._comparison_units(
+            old_text, "line", ignore_whitespace, ignore_case
+        )
+        new_lines, new_bounds, new_numbers = DiffService._comparison_units(
+            new_text, "line", ignore_whitespace, ignore_case
+        )
+        script = DiffScript(
+            old_text, new_text, "line", old_bounds, new_bounds, old_numbers, new_numbers
+        )
+        n, m = len(old_lines), len(new_lines)
 
-        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
-            if tag == "equal":
-                stats["unchanged"] += i2 - i1
-                # 添加未变化的内容，用于显示完整文本
-                changes.append(
-                    DiffChange(
-                        type="unchanged",
-                        old_text=" ".join(old_words[i1:i2]),
-                        new_text=" ".join(old_words[i1:i2]),
-                    )
-                )
-            elif tag == "replace":
-                stats["modified"] += max(i2 - i1, j2 - j1)
-                changes.append(
-                    DiffChange(
-                        type="modified",
-                        old_text=" ".join(old_words[i1:i2]),
-                        new_text=" ".join(new_words[j1:j2]),
-                    )
-                )
-            elif tag == "delete":
-                stats["deleted"] += i2 - i1
-                changes.append(
-                    DiffChange(type="deleted", old_text=" ".join(old_words[i1:i2]))
-                )
-            elif tag == "insert":
-                stats["added"] += j2 - j1
-                changes.append(
-                    DiffChange(type="added", new_text=" ".join(new_words[j1:j2]))
-                )
+        if old_lines == new_lines:
+            if n:
+                stats["unchanged"] = n
+                script.append(UNCHANGED, 0, n, 0, m)
+        elif not n:
+            stats["added"] = m
+            script.append(ADDED, 0, 0, 0, m)
+        elif not m:
+            stats["deleted"] = n
+            script.append(DELETED, 0, n, 0, 0)
+        else:
+            stats["modified"] = 1
+            script.append(MODIFIED, 0, n, 0, m)
 
-        return changes, stats
+        return script, stats
 
     @staticmethod
-    def _character_diff(old_text: str, new_text: str) -> Tuple[List[DiffChange], Dict]:
-        """字符级差异比较"""
-        matcher = difflib.SequenceMatcher(None, old_text, new_text)
-        changes = []
+    def refine_change(
+        old_chunk: str,
+        new_chunk: str,
+        refine: str = "word",
+        algorithm: Optional[str] = None,
+    ) -> Optional[Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]]:
+        """
+        对修改块做行内细化（第二级差异）
+
+        Args:
+            old_chunk: 修改前的文本
+            new_chunk: 修改后的文本
+            refine: 细化粒度 (word, char)
+            algorithm: 差异算法，默认取配置
+
+        Returns:
+            旧文本和新文本中发生变化的区间（相对于块起始的字符偏移），
+            块过大或超出计算预算时返回 None
+        """
+        if len(old_chunk) + len(new_chunk) > settings.DIFF_REFINE_MAX_CHARS:
+            return None
+
+        unit = "char" if refine == "char" else "word"
+        budget = DiffBudget(float("inf"), settings.DIFF_REFINE_COST_BUDGET)
+        try:
+            script, _ = DiffService._unit_diff(
+                old_chunk, new_chunk, unit, algorithm or settings.DIFF_ALGORITHM, budget
+            )
+        except DiffBudgetExceeded:
+            return None
+
+        old_spans: List[Tuple[int, int]] = []
+        new_spans: List[Tuple[int, int]] = []
+        for change_type, i1, i2, j1, j2 in script:
+            if change_type == UNCHANGED:
+                continue
+            if change_type != ADDED:
+                DiffService._add_span(old_spans, old_chunk, *script.old_span(i1, i2))
+            if change_type != DELETED:
+                DiffService._add_span(new_spans, new_chunk, *script.new_span(j1, j2))
+        return old_spans, new_spans
+
+    @staticmethod
+    def refine_changes(
+        chunks: List[Tuple[str, str]],
+        refine: str = "word",
+        algorithm: Optional[str] = None,
+    ) -> List[Optional[Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]]]:
+        """批量细化多个修改块（便于作为一个任务提交到进程池）"""
+        return [
+            DiffService.refine_change(old_chunk, new_chunk, refine, algorithm)
+            for old_chunk, new_chunk in chunks
+        ]
+
+    @staticmethod
+    def _add_span(spans: List[Tuple[int, int]], text: str, start: int, end: int) -> None:
+        """追加变化区间，去掉末尾空白并与相邻区间合并"""
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if end <= start:
+            return
+        if spans and spans[-1][1] >= start:
+            spans[-1] = (spans[-1][0], max(end, spans[-1][1]))
+        else:
+            spans.append((start, end))
+
+    @staticmethod
+    def _is_similar(
+        old_chunk: str,
+        new_chunk: str,
+        layers: Dict[str, int],
+        budget: Optional[DiffBudget] = None,
+    ) -> bool:
+        """
+        判断替换块的新旧内容是否相似（ratio 超过 DIFF_SIMILARITY_THRESHOLD）
+
+        由低到高逐级判定，能确定结果时不再进入下一层：
+        1. real_quick_ratio：仅由长度得到的上界
+        2. quick_ratio：由字符频次得到的上界
+        3. shingle Jaccard：明显相似或明显不同时直接判定
+        4. ratio：精确计算
+
+        Args:
+            old_chunk: 旧内容
+            new_chunk: 新内容
+            layers: 各层判定次数，做出判定的层计数加一
+            budget: 计算预算（可选）
+
+        Returns:
+            是否相似
+        """
+        threshold = settings.DIFF_SIMILARITY_THRESHOLD
+        matcher = difflib.SequenceMatcher(None, old_chunk, new_chunk)
+
+        if matcher.real_quick_ratio() <= threshold:
+            layers["real_quick_ratio"] += 1
+            return False
+
+        if budget is not None:
+            budget.charge(len(old_chunk) + len(new_chunk))
+        if matcher.quick_ratio() <= threshold:
+            layers["quick_ratio"] += 1
+            return False
+
+        size = settings.DIFF_SHINGLE_SIZE
+        old_shingles = {old_chunk[k:k + size] for k in range(len(old_chunk) - size + 1)}
+        new_shingles = {new_chunk[k:k + size] for k in range(len(new_chunk) - size + 1)}
+        if old_shingles and new_shingles:
+            common = len(old_shingles & new_shingles)
+            jaccard = common / (len(old_shingles) + len(new_shingles) - common)
+            if jaccard >= settings.DIFF_SHINGLE_ACCEPT:
+                layers["shingle"] += 1
+                return True
+            if jaccard <= settings.DIFF_SHINGLE_REJECT:
+                layers["shingle"] += 1
+                return False
+
+        layers["ratio"] += 1
+        return matcher.ratio() > threshold
+
+    @staticmethod
+    def _detect_moves(
+        old_lines: List[str],
+        new_lines: List[str],
+        opcodes: List[Tuple[str, int, int, int, int]],
+        budget: Optional[DiffBudget] = None,
+    ) -> List[Tuple[int, int, int, int]]:
+        """
+        移动检测
+
+        以被删除的非空行建立哈希索引，按新文本顺序扫描插入的行，
+        命中索引后向后延伸到最长的连续相同行块，
+        达到 DIFF_MOVE_MIN_LINES 行即视为移动。每行最多尝试
+        MOVE_MAX_CANDIDATES 个候选位置，整体接近线性
+
+        Returns:
+            (旧起始行, 旧结束行, 新起始行, 新结束行) 列表，按新文本顺序排列
+        """
+        min_lines = settings.DIFF_MOVE_MIN_LINES
+        deleted = bytearray(len(old_lines))
+        inserted = bytearray(len(new_lines))
+        index: Dict[str, List[int]] = {}
+        for tag, i1, i2, j1, j2 in opcodes:
+            if tag in ("delete", "replace"):
+                deleted[i1:i2] = b"\x01" * (i2 - i1)
+                for i in range(i1, i2):
+                    if old_lines[i].strip():
+                        index.setdefault(old_lines[i], []).append(i)
+            if tag in ("insert", "replace"):
+                inserted[j1:j2] = b"\x01" * (j2 - j1)
+
+        moves = []
+        index = {
+            line: positions
+            for line, positions in index.items()
+            if len(positions) <= MOVE_MAX_CANDIDATES
+        }
+        if not index:
+            return moves
+
+        if budget is not None:
+            budget.charge(len(old_lines) + len(new_lines))
+
+        j = 0
+        total = len(new_lines)
+        while j < total:
+            candidates = index.get(new_lines[j]) if inserted[j] else None
+            if not candidates:
+                j += 1
+                continue
+
+            best_start, best_length = -1, 0
+            for i in candidates:
+                if not deleted[i]:
+                    continue
+                length = 1
+                while (
+                    j + length < total
+                    and i + length < len(old_lines)
+                    and inserted[j + length]
+                    and deleted[i + length]
+                    and new_lines[j + length] == old_lines[i + length]
+                ):
+                    length += 1
+                if length > best_length:
+                    best_start, best_length = i, length
+
+            if best_length < min_lines:
+                j += 1
+                continue
+
+            moves.append((best_start, best_start + best_length, j, j + best_length))
+            deleted[best_start:best_start + best_length] = bytes(best_length)
+            inserted[j:j + best_length] = bytes(best_length)
+            j += best_length
+
+        return moves
+
+    @staticmethod
+    def _touches_moves(
+        moved_old_starts: List[int],
+        moved_new_starts: List[int],
+        i1: int,
+        i2: int,
+        j1: int,
+        j2: int,
+    ) -> bool:
+        """判断变化区间是否包含移动的行块"""
+        k = bisect_left(moved_old_starts, i1)
+        if k < len(moved_old_starts) and moved_old_starts[k] < i2:
+            return True
+        k = bisect_left(moved_new_starts, j1)
+        return k < len(moved_new_starts) and moved_new_starts[k] < j2
+
+    @staticmethod
+    def _append_with_moves(
+        script: DiffScript,
+        stats: Dict,
+        moved_old: Dict[int, int],
+        moved_new: Dict[int, Tuple[int, int, int]],
+        i1: int,
+        i2: int,
+        j1: int,
+        j2: int,
+    ) -> None:
+        """
+        输出包含移动行块的变化区间
+
+        旧文本中未被移走的行标记为删除，新文本按顺序输出移动和新增
+        """
+        i = i1
+        while i < i2:
+            end = moved_old.get(i)
+            if end is not None:
+                i = end
+                continue
+            start = i
+            while i < i2 and i not in moved_old:
+                i += 1
+            stats["deleted"] += i - start
+            script.append(DELETED, start, i, j1, j1)
+
+        j = j1
+        while j < j2:
+            move = moved_new.get(j)
+            if move is not None:
+                src_start, src_end, end = move
+                script.append(MOVED, src_start, src_end, j, end)
+                j = end
+                continue
+            start = j
+            while j < j2 and j not in moved_new:
+                j += 1
+            stats["added"] += j - start
+            script.append(ADDED, i2, i2, start, j)
+
+    @staticmethod
+    def _unit_diff(
+        old_text: str,
+        new_text: str,
+        unit: str,
+        algorithm: str,
+        budget: Optional[DiffBudget],
+        ignore_whitespace: bool = False,
+        ignore_case: bool = False,
+    ) -> Tuple[DiffScript, Dict]:
+        """按比较单元（行、单词、字符）进行差异比较"""
+        old_tokens, old_bounds, old_numbers = DiffService._comparison_units(
+            old_text, unit, ignore_whitespace, ignore_case
+        )
+        new_tokens, new_bounds, new_numbers = DiffService._comparison_units(
+            new_text, unit, ignore_whitespace, ignore_case
+        )
+        script = DiffScript(
+            old_text, new_text, unit, old_bounds, new_bounds, old_numbers, new_numbers
+        )
         stats = {"added": 0, "deleted": 0, "modified": 0, "unchanged": 0}
 
-        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        opcodes, stats["preprocess"] = diff_sequences(
+            old_tokens, new_tokens, algorithm, budget
+        )
+        for tag, i1, i2, j1, j2 in opcodes:
             if tag == "equal":
                 stats["unchanged"] += i2 - i1
-                # 添加未变化的内容，用于显示完整文本
-                changes.append(
-                    DiffChange(
-                        type="unchanged",
-                        old_text=old_text[i1:i2],
-                        new_text=old_text[i1:i2],
-                    )
-                )
+                # 保留未变化的内容，用于显示完整文本
+                script.append(UNCHANGED, i1, i2, j1, j2)
             elif tag == "replace":
                 stats["modified"] += max(i2 - i1, j2 - j1)
-                changes.append(
-                    DiffChange(
-                        type="modified",
-                        old_text=old_text[i1:i2],
-                        new_text=new_text[j1:j2],
-                    )
-                )
+                script.append(MODIFIED, i1, i2, j1, j2)
             elif tag == "delete":
                 stats["deleted"] += i2 - i1
-                changes.append(DiffChange(type="deleted", old_text=old_text[i1:i2]))
+                script.append(DELETED, i1, i2, j1, j2)
             elif tag == "insert":
                 stats["added"] += j2 - j1
-                changes.append(DiffChange(type="added", new_text=new_text[j1:j2]))
+                script.append(ADDED, i1, i2, j1, j2)
+
+        return script, stats
 
-        return changes, stats
+    @staticmethod
+    def _line_diff(
+        old_text: str,
+        new_text: str,
+        algorithm: str = "myers",
+        budget: Optional[DiffBudget] = None,
+        **options: bool,
+    ) -> Tuple[DiffScript, Dict]:
+        """行级差异比较"""
+        return DiffService._unit_diff(
+            old_text, new_text, "line", algorithm, budget, **options
+        )
 
     @staticmethod
-    def _semantic_diff(old_text: str, new_text: str) -> Tuple[List[DiffChange], Dict]:
+    def _word_diff(
+        old_text: str,
+        new_text: str,
+        algorithm: str = "myers",
+        budget: Optional[DiffBudget] = None,
+        **options: bool,
+    ) -> Tuple[DiffScript, Dict]:
+        """单词级差异比较"""
+        return DiffService._unit_diff(
+            old_text, new_text, "word", algorithm, budget, **options
+        )
+
+    @staticmethod
+    def _character_diff(
+        old_text: str,
+        new_text: str,
+        algorithm: str = "myers",
+        budget: Optional[DiffBudget] = None,
+        **options: bool,
+    ) -> Tuple[DiffScript, Dict]:
+        """字符级差异比较"""
+        return DiffService._unit_diff(
+            old_text, new_text, "char", algorithm, budget, **options
+        )
+
+    @staticmethod
+    def _semantic_diff(
+        old_text: str,
+        new_text: str,
+        algorithm: str = "myers",
+        budget: Optional[DiffBudget] = None,
+        ignore_whitespace: bool = False,
+        ignore_case: bool = False,
+    ) -> Tuple[DiffScript, Dict]:
         """
         语义级差异比较
         结合行级和字符级差异，提供更智能的对比结果
         """
-        # 先进行行级对比
-        old_lines = old_text.splitlines(keepends=True)
-        new_lines = new_text.splitlines(keepends=True)
+        # 先进行行级对比（按比较用的键）
+        old_lines, old_bounds, old_numbers = DiffService._comparison_units(
+            old_text, "line", ignore_whitespace, ignore_case
+        )
+        new_lines, new_bounds, new_numbers = DiffService._comparison_units(
+            new_text, "line", ignore_whitespace, ignore_case
+        )
+        script = DiffScript(
+            old_text, new_text, "line", old_bounds, new_bounds, old_numbers, new_numbers
+        )
+        stats = {"added": 0, "deleted": 0, "modified": 0, "unchanged": 0, "moved": 0}
+        similarity_layers = dict.fromkeys(SIMILARITY_LAYERS, 0)
+        stats["similarity_layers"] = similarity_layers
 
-        matcher = difflib.SequenceMatcher(None, old_lines, new_lines)
-        changes = []
-        stats = {"added": 0, "deleted": 0, "modified": 0, "unchanged": 0}
+        opcodes, stats["preprocess"] = diff_sequences(
+            old_lines, new_lines, algorithm, budget
+        )
 
-        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
-            if tag == "equal":
-                stats["unchanged"] += i2 - i1
-                # 添加未变化的内容，用于显示完整文本
-                changes.append(
-                    DiffChange(
-                        type="unchanged",
-                        old_text="".join(old_lines[i1:i2]),
-                        new_text="".join(old_lines[i1:i2]),
-                        old_line_start=i1 + 1,
-                        old_line_end=i2,
-                        new_line_start=i1 + 1,
-                        new_line_end=i2,
-                    )
+        # 识别被删除后在别处原样插入的行块
+        moves = DiffService._detect_moves(old_lines, new_lines, opcodes, budget)
+        moved_old = {}
+        moved_new = {}
+        for i1, i2, j1, j2 in moves:
+            moved_old[i1] = i2
+            moved_new[j1] = (i1, i2, j2)
+            stats["moved"] += i2 - i1
+        moved_old_starts = sorted(moved_old)
+        moved_new_starts = sorted(moved_new)
+
+        for tag, i1, i2, j1, j2 in opcodes:
+            if moves and tag != "equal" and DiffService._touches_moves(
+                moved_old_starts, moved_new_starts, i1, i2, j1, j2
+            ):
+                DiffService._append_with_moves(
+                    script, stats, moved_old, moved_new, i1, i2, j1, j2
                 )
+            elif tag == "equal":
+                stats["unchanged"] += i2 - i1
+                # 保留未变化的内容，用于显示完整文本
+                script.append(UNCHANGED, i1, i2, j1, j2)
             elif tag == "replace":
                 # 对于替换的行，进行字符级对比以显示具体变化
-                old_chunk = "".join(old_lines[i1:i2])
-                new_chunk = "".join(new_lines[j1:j2])
+                old_chunk = old_text[old_bounds[i1]:old_bounds[i2]]
+                new_chunk = new_text[new_bounds[j1]:new_bounds[j2]]
 
-                # 如果变化很小，显示详细的字符级差异
-                similarity = difflib.SequenceMatcher(None, old_chunk, new_chunk).ratio()
-                if similarity > 0.3:  # 相似度超过30%，认为是修改
+                # 相似度足够高认为是修改，否则分别标记为删除和添加
+                if DiffService._is_similar(
+                    old_chunk, new_chunk, similarity_layers, budget
+                ):
                     stats["modified"] += 1
-                    changes.append(
-                        DiffChange(
-                            type="modified",
-                            old_text=old_chunk,
-                            new_text=new_chunk,
-                            old_line_start=i1 + 1,
-                            old_line_end=i2,
-                            new_line_start=j1 + 1,
-                            new_line_end=j2,
-                        )
-                    )
+                    script.append(MODIFIED, i1, i2, j1, j2)
                 else:  # 否则分别标记为删除和添加
                     stats["deleted"] += i2 - i1
                     stats["added"] += j2 - j1
-                    changes.append(
-                        DiffChange(
-                            type="deleted",
-                            old_text=old_chunk,
-                            old_line_start=i1 + 1,
-                            old_line_end=i2,
-                        )
-                    )
-                    changes.append(
-                        DiffChange(
-                            type="added",
-                            new_text=new_chunk,
-                            new_line_start=j1 + 1,
-                            new_line_end=j2,
-                        )
-                    )
+                    script.append(DELETED, i1, i2, j1, j1)
+                    script.append(ADDED, i2, i2, j1, j2)
             elif tag == "delete":
                 stats["deleted"] += i2 - i1
-                changes.append(
-                    DiffChange(
-                        type="deleted",
-                        old_text="".join(old_lines[i1:i2]),
-                        old_line_start=i1 + 1,
-                        old_line_end=i2,
-                    )
-                )
+                script.append(DELETED, i1, i2, j1, j2)
             elif tag == "insert":
                 stats["added"] += j2 - j1
-                changes.append(
-                    DiffChange(
-                        type="added",
-                        new_text="".join(new_lines[j1:j2]),
-                        new_line_start=j1 + 1,
-                        new_line_end=j2,
-                    )
-                )
+                script.append(ADDED, i1, i2, j1, j2)
 
-        return changes, stats
+        return script, stats
 
     @staticmethod
     def generate_html_diff(old_text: str, new_text: str) -> str:
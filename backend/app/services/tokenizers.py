@@ -0,0 +1,120 @@
+"""
+单词模式的分词器
+可插拔的分词实现，返回单词及其在原文中的起始偏移
+"""
+import hashlib
+import re
+from array import array
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from ..core.config import settings
+from .diff_cache import DiffResultCache
+
+# 分词器：text -> (单词列表, 每个单词在原文中的起始偏移)
+WordTokenizer = Callable[[str], Tuple[List[str], List[int]]]
+
+# 小于该长度的文本直接分词，不进入缓存
+_CACHE_MIN_LENGTH = 4096
+
+# 分词结果缓存：以 (内容哈希, 分词器名称) 为键，只保存单词的起始偏移和长度，
+# 命中时从原文截取单词，按字节数限制容量
+_token_cache = DiffResultCache(settings.DIFF_TOKEN_CACHE_MAX_BYTES)
+
+# 中日文字符：CJK 统一表意文字（含扩展 A 和兼容区）、平假名、片假名
+_CJK_CHARS = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\u3040-\u30ff"
+
+# 连续的非空白字符
+_WHITESPACE_PATTERN = re.compile(r"\S+")
+
+# 中日文逐字切分，其他文字的字母数字连续成词，标点符号单独成词
+_CJK_PATTERN = re.compile(
+    rf"[{_CJK_CHARS}]|[^\W{_CJK_CHARS}]+|[^\w\s]", re.UNICODE
+)
+
+
+def _regex_tokenizer(pattern: "re.Pattern") -> WordTokenizer:
+    def tokenize(text: str) -> Tuple[List[str], List[int]]:
+        tokens = []
+        starts = []
+        for match in pattern.finditer(text):
+            tokens.append(match.group())
+            starts.append(match.start())
+        return tokens, starts
+
+    return tokenize
+
+
+def _jieba_tokenizer(text: str) -> Tuple[List[str], List[int]]:
+    """使用 jieba 词典分词，空白不作为单词"""
+    tokens = []
+    starts = []
+    for word, start, _ in jieba.tokenize(text):
+        if not word.isspace():
+            tokens.append(word)
+            starts.append(start)
+    return tokens, starts
+
+
+WORD_TOKENIZERS: Dict[str, WordTokenizer] = {
+    "whitespace": _regex_tokenizer(_WHITESPACE_PATTERN),
+    "cjk": _regex_tokenizer(_CJK_PATTERN),
+}
+
+# jieba 为可选依赖，安装后可使用词典分词
+try:
+    import jieba
+
+    WORD_TOKENIZERS["jieba"] = _jieba_tokenizer
+except ImportError:
+    pass
+
+
+def register_word_tokenizer(name: str, tokenizer: WordTokenizer) -> None:
+    """
+    注册自定义分词器
+
+    Args:
+        name: 分词器名称（用于配置 DIFF_WORD_TOKENIZER）
+        tokenizer: 分词函数，返回单词列表和每个单词的起始偏移
+    """
+    WORD_TOKENIZERS[name] = tokenizer
+    _token_cache.clear()
+
+
+def get_word_tokenizer(name: str) -> WordTokenizer:
+    """按名称获取分词器，未知名称时抛出 ValueError"""
+    try:
+        return WORD_TOKENIZERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown word tokenizer: {name}")
+
+
+def split_words(text: str, name: str) -> Tuple[Sequence[str], Sequence[int]]:
+    """
+    分词（较长文本的结果按内容缓存，同一版本的内容被反复比较时无需重新分词）
+
+    Args:
+        text: 文本
+        name: 分词器名称
+
+    Returns:
+        单词列表和每个单词的起始偏移
+    """
+    if len(text) < _CACHE_MIN_LENGTH:
+        return get_word_tokenizer(name)(text)
+
+    key = (hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest(), name)
+    cached = _token_cache.get(key)
+    if cached is not None:
+        starts, lengths = cached
+        return [text[s:s + n] for s, n in zip(starts, lengths)], starts
+
+    tokens, starts = get_word_tokenizer(name)(text)
+    starts = array("I", starts)
+    lengths = array("I", map(len, tokens))
+    _token_cache.put(
+        key,
+        (starts, lengths),
+        (len(starts) + len(lengths)) * starts.itemsize + len(key[0]) + len(name),
+    )
+    return tokens, starts
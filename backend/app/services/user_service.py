@@ -2,14 +2,15 @@
 用户服务模块
 """
 import uuid
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from datetime import datetime
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 
 from ..models.user import User, UserSession, Folder
-from ..models.document import Document, Version
+from ..models.document import ContentBlob, Document, Version
 from ..core.auth import AuthService
+from ..core.pagination import keyset_page
 from ..schemas.user import UserCreate, UserUpdate, UserStats
 
 
@@ -216,28 +217,30 @@ class UserService:
     @staticmethod
     def list_users(
         db: Session,
-        skip: int = 0,
+        cursor: Optional[str] = None,
         limit: int = 100,
         is_active: Optional[bool] = None
-    ) -> List[User]:
+    ) -> Tuple[List[User], Optional[str]]:
         """
-        获取用户列表
+        获取用户列表(按注册时间从新到旧游标分页)
 
         Args:
             db: 数据库会话
-            skip: 跳过数量
+            cursor: 上一页返回的游标(第一页为None),无效时抛出 ValueError
             limit: 限制数量
             is_active: 是否活跃(None表示全部)
 
         Returns:
-            用户列表
+            (用户列表, 下一页的游标)
         """
         query = db.query(User)
 
         if is_active is not None:
             query = query.filter(User.is_active == is_active)
 
-        return query.order_by(User.created_at.desc()).offset(skip).limit(limit).all()
+        return keyset_page(
+            query, [(User.created_at, True), (User.id, True)], cursor, limit, "users"
+        )
 
     @staticmethod
     def get_user_documents(
@@ -290,13 +293,28 @@ class UserService:
             Folder.owner_id == user_id
         ).scalar() or 0
 
-        # 存储使用量(所有版本的内容大小总和)
+        # 存储使用量(所有版本实际保存的内容和增量大小总和)
         storage_used = db.query(
-            func.sum(func.length(Version.content))
+            func.sum(
+                func.coalesce(func.length(Version.content), 0)
+                + func.coalesce(func.length(Version.delta), 0)
+                + func.coalesce(func.length(Version.payload), 0)
+            )
         ).join(
             Document, Version.document_id == Document.id
         ).filter(Document.owner_id == user_id).scalar() or 0
 
+        # 加上版本引用的内容块(多个版本共享的内容块只计算一次)
+        blob_hashes = db.query(Version.blob_hash).join(
+            Document, Version.document_id == Document.id
+        ).filter(Document.owner_id == user_id, Version.blob_hash.isnot(None))
+        storage_used += db.query(
+            func.sum(
+                func.coalesce(func.length(ContentBlob.content), 0)
+                + func.coalesce(func.length(ContentBlob.payload), 0)
+            )
+        ).filter(ContentBlob.hash.in_(blob_hashes)).scalar() or 0
+
         # 最后活跃时间(最近文档更新时间)
         last_active_doc = db.query(Document.updated_at).filter(
             Document.owner_id == user_id
@@ -0,0 +1,298 @@
+"""
+持久化差异缓存服务
+保存新版本时在后台预计算与父版本的差异，结果按内容哈希存入 version_diffs 表，
+重启后依然有效，并由所有 worker 共享；同时记录版本相对父版本的变化量，
+并复用行级差异增量建立 blame 索引
+"""
+import json
+import logging
+from array import array
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models.document import Version, VersionDiff
+from .blame_service import BlameService
+from .diff_executor import diff_executor
+from .diff_script import DiffScript, MODIFIED, DELETED, ADDED
+from .version_storage import VersionStorage
+
+logger = logging.getLogger(__name__)
+
+# 保存版本时预计算的差异模式
+PRECOMPUTE_MODES = ("semantic", "line")
+
+
+class VersionDiffService:
+    """持久化差异缓存服务类"""
+
+    @staticmethod
+    def get_diff(
+        db: Session,
+        old_version: Version,
+        new_version: Version,
+        diff_mode: str,
+        algorithm: str,
+    ) -> Optional[Tuple[DiffScript, Dict]]:
+        """
+        查询已持久化的差异结果
+
+        Args:
+            db: 数据库会话
+            old_version: 旧版本
+            new_version: 新版本
+            diff_mode: 差异模式
+            algorithm: 差异算法
+
+        Returns:
+            差异脚本和统计信息，未命中时返回None
+        """
+        old_hash = old_version.content_hash
+        new_hash = new_version.content_hash
+        row = (
+            db.query(VersionDiff.result)
+            .filter(
+                VersionDiff.old_content_hash == old_hash,
+                VersionDiff.new_content_hash == new_hash,
+                VersionDiff.diff_mode == diff_mode,
+                VersionDiff.algorithm == algorithm,
+            )
+            .first()
+        )
+        if row is None:
+            return None
+
+        data = json.loads(row.result)
+        script = DiffScript.from_state(
+            data["script"], old_version.content, new_version.content
+        )
+        return script, data["stats"]
+
+    @staticmethod
+    def save_diff(
+        db: Session,
+        old_hash: str,
+        new_hash: str,
+        diff_mode: str,
+        algorithm: str,
+        script: DiffScript,
+        stats: Dict,
+    ) -> None:
+        """保存差异结果（只保存 opcodes，不含原文），其他 worker 已写入相同键时忽略"""
+        result = json.dumps({"script": script.to_state(), "stats": stats})
+        db.add(
+            VersionDiff(
+                old_content_hash=old_hash,
+                new_content_hash=new_hash,
+                diff_mode=diff_mode,
+                algorithm=algorithm,
+                result=result,
+            )
+        )
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+
+    @staticmethod
+    def _real_lines(line_numbers: Optional[array], start: int, end: int) -> int:
+        """行单元区间覆盖的真实行数（超长行被切分为伪行时按真实行计）"""
+        if end <= start:
+            return 0
+        if line_numbers is None:
+            return end - start
+        return line_numbers[end - 1] - line_numbers[start] + 1
+
+    @staticmethod
+    def change_magnitude(
+        parent_content: Optional[str],
+        content: str,
+        line_script: Optional[DiffScript] = None,
+    ) -> Dict[str, int]:
+        """
+        计算版本相对父版本的变化量
+
+        Args:
+            parent_content: 父版本内容（没有父版本时为 None）
+            content: 版本内容
+            line_script: 父版本到该版本的行级差异脚本（有父版本时必填）
+
+        Returns:
+            lines_added、lines_removed（修改的行同时计入两者）和 byte_delta
+        """
+        byte_delta = len(content.encode("utf-8"))
+        if parent_content is None:
+            return {
+                "lines_added": len(content.splitlines()),
+                "lines_removed": 0,
+                "byte_delta": byte_delta,
+            }
+
+        added = removed = 0
+        old_numbers = line_script.old_line_numbers
+        new_numbers = line_script.new_line_numbers
+        for change_type, i1, i2, j1, j2 in line_script:
+            if change_type in (MODIFIED, DELETED):
+                removed += VersionDiffService._real_lines(old_numbers, i1, i2)
+            if change_type in (MODIFIED, ADDED):
+                added += VersionDiffService._real_lines(new_numbers, j1, j2)
+        return {
+            "lines_added": added,
+            "lines_removed": removed,
+            "byte_delta": byte_delta - len(parent_content.encode("utf-8")),
+        }
+
+    @staticmethod
+    async def _parent_line_diffs(
+        db: Session, version: Version, parent: Version, algorithm: str
+    ) -> DiffScript:
+        """
+        计算并持久化版本与父版本的预计算差异
+
+        Returns:
+            行级差异脚本（用于统计变化量）
+        """
+        line_script = None
+        for diff_mode in PRECOMPUTE_MODES:
+            # 保存结果时的提交会使已还原的内容过期，每次使用前重新还原
+            VersionStorage.materialize(db, [version, parent])
+            stored = VersionDiffService.get_diff(db, parent, version, diff_mode, algorithm)
+            if stored is not None:
+                script, stats = stored
+            else:
+                script, stats = await diff_executor.compute_script(
+                    parent.content,
+                    version.content,
+                    diff_mode=diff_mode,
+                    algorithm=algorithm,
+                )
+                # 降级结果不持久化，留待请求时按需计算
+                if not stats["degraded"]:
+                    VersionDiffService.save_diff(
+                        db,
+                        parent.content_hash,
+                        version.content_hash,
+                        diff_mode,
+                        algorithm,
+                        script,
+                        stats,
+                    )
+            if diff_mode == "line":
+                line_script = script
+        return line_script
+
+    @staticmethod
+    async def precompute_parent_diffs(version_id: str) -> None:
+        """
+        后台任务：计算版本与其父版本的差异并持久化，同时记录变化量、建立 blame 索引
+
+        Args:
+            version_id: 新创建的版本ID
+        """
+        algorithm = settings.DIFF_ALGORITHM
+        db = SessionLocal()
+        try:
+            version = (
+                db.query(Version)
+                .options(VersionStorage.with_content())
+                .filter(Version.id == version_id)
+                .first()
+            )
+            if not version:
+                return
+            parent = None
+            line_script = None
+            if version.parent_version_id:
+                parent = (
+                    db.query(Version)
+                    .options(VersionStorage.with_content())
+                    .filter(Version.id == version.parent_version_id)
+                    .first()
+                )
+                if not parent:
+                    return
+                line_script = await VersionDiffService._parent_line_diffs(
+                    db, version, parent, algorithm
+                )
+
+            if version.lines_added is None:
+                VersionStorage.materialize(db, [version, parent])
+                VersionDiffService._store_magnitude(db, version, parent, line_script)
+                db.commit()
+
+            VersionStorage.materialize(db, [version, parent])
+            BlameService.index_version(db, version, parent, line_script)
+        except Exception as e:
+            logger.error(f"Failed to precompute diffs for version {version_id}: {e}")
+        finally:
+            db.close()
+
+    @staticmethod
+    def _store_magnitude(
+        db: Session,
+        version: Version,
+        parent: Optional[Version],
+        line_script: Optional[DiffScript],
+    ) -> None:
+        """写入版本的变化量（由调用方提交）"""
+        magnitude = VersionDiffService.change_magnitude(
+            parent.content if parent else None, version.content, line_script
+        )
+        db.query(Version).filter(Version.id == version.id).update(
+            magnitude, synchronize_session=False
+        )
+
+    @staticmethod
+    async def backfill_change_magnitudes(batch_size: int = 100) -> int:
+        """
+        回填已有版本的变化量
+
+        分批处理尚未计算变化量的版本，每批提交一次；差异计算在差异执行器中进行，
+        不占用请求处理。部署后通过 migrations/backfill_change_magnitudes.py 执行
+
+        Args:
+            batch_size: 每批处理的版本数
+
+        Returns:
+            回填的版本数
+        """
+        algorithm = settings.DIFF_ALGORITHM
+        total = 0
+        db = SessionLocal()
+        try:
+            while True:
+                versions = (
+                    db.query(Version)
+                    .options(VersionStorage.with_content())
+                    .filter(Version.lines_added.is_(None))
+                    .order_by(Version.id)
+                    .limit(batch_size)
+                    .all()
+                )
+                if not versions:
+                    break
+
+                VersionStorage.materialize(
+                    db, versions + [version.parent_version for version in versions]
+                )
+                for version in versions:
+                    parent = version.parent_version
+                    line_script = None
+                    if parent is not None:
+                        line_script, _ = await diff_executor.compute_script(
+                            parent.content,
+                            version.content,
+                            diff_mode="line",
+                            algorithm=algorithm,
+                        )
+                    VersionDiffService._store_magnitude(db, version, parent, line_script)
+                db.commit()
+                db.expunge_all()
+                total += len(versions)
+                logger.info(f"Backfilled change magnitudes for {total} versions")
+        finally:
+            db.close()
+        return total
@@ -2,10 +2,12 @@
 版本管理服务
 """
 import hashlib
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import and_, desc, or_
+from ..core.pagination import keyset_page
 from ..models.document import Document, Version, VersionTag
+from .version_storage import VersionStorage
 from ..schemas.document import (
     DocumentCreate,
     DocumentUpdate,
@@ -13,12 +15,21 @@ from ..schemas.document import (
     VersionTagCreate,
 )
 
+# 文档列表的排序键（末尾加上 ID 保证顺序唯一，与 documents 表的复合索引对应）
+DOCUMENT_SORT_KEYS = {
+    "updated_at": [(Document.updated_at, True), (Document.id, True)],
+    "created_at": [(Document.created_at, True), (Document.id, True)],
+    "title": [(Document.title, False), (Document.id, False)],
+}
+
 
 class VersionService:
     """版本管理服务类"""
 
     @staticmethod
-    def create_document(db: Session, doc_data: DocumentCreate, owner_id: str) -> Document:
+    def create_document(
+        db: Session, doc_data: DocumentCreate, owner_id: str
+    ) -> Tuple[Document, Version]:
         """
         创建新文档，同时创建第一个版本
 
@@ -28,7 +39,7 @@ class VersionService:
             owner_id: 文档所有者ID
 
         Returns:
-            创建的文档对象
+            (创建的文档对象, 初始版本)
         """
         # 创建文档
         document = Document(
@@ -39,22 +50,27 @@ class VersionService:
         db.add(document)
         db.flush()  # 获取文档ID
 
-        # 创建初始版本
+        # 创建初始版本（内容保存在共享内容块中）
+        content = doc_data.initial_content or ""
         initial_version = Version(
             document_id=document.id,
             version_number=1,
-            content=doc_data.initial_content or "",
-            content_hash=VersionService._compute_hash(doc_data.initial_content or ""),
+            content_hash=VersionService._compute_hash(content),
+            content_length=len(content),
+            content_bytes=len(content.encode("utf-8")),
             author=doc_data.author or "unknown",
             author_id=owner_id,
             commit_message="Initial version",
             save_type="manual",
         )
+        VersionStorage.store_content(db, initial_version, content)
         db.add(initial_version)
+        db.flush()
+        VersionStorage.set_content(initial_version, content)
         db.commit()
         db.refresh(document)
 
-        return document
+        return document, initial_version
 
     @staticmethod
     def get_document(db: Session, document_id: str) -> Optional[Document]:
@@ -82,24 +98,24 @@ class VersionService:
     def get_user_documents(
         db: Session,
         user_id: str,
-        skip: int = 0,
+        cursor: Optional[str] = None,
         limit: int = 20,
         sort_by: str = "updated_at",
         folder_id: str = None
-    ) -> List[Document]:
+    ) -> Tuple[List[Document], Optional[str]]:
         """
-        获取指定用户的文档列表
+        获取指定用户的文档列表（游标分页）
 
         Args:
             db: 数据库会话
             user_id: 用户ID
-            skip: 跳过数量
+            cursor: 上一页返回的游标（第一页为 None），无效时抛出 ValueError
             limit: 限制数量
-            sort_by: 排序字段
+            sort_by: 排序字段 (updated_at, created_at, title)
             folder_id: 文件夹ID筛选(可选)
 
         Returns:
-            文档列表
+            (文档列表, 下一页的游标)
         """
         query = db.query(Document).filter(Document.owner_id == user_id)
 
@@ -107,15 +123,9 @@ class VersionService:
         if folder_id:
             query = query.filter(Document.folder_id == folder_id)
 
-        # 排序
-        if sort_by == "created_at":
-            query = query.order_by(desc(Document.created_at))
-        elif sort_by == "title":
-            query = query.order_by(Document.title)
-        else:
-            query = query.order_by(desc(Document.updated_at))
-
-        return query.offset(skip).limit(limit).all()
+        if sort_by not in DOCUMENT_SORT_KEYS:
+            sort_by = "updated_at"
+        return keyset_page(query, DOCUMENT_SORT_KEYS[sort_by], cursor, limit, sort_by)
 
     @staticmethod
     def update_document(
@@ -135,12 +145,15 @@ class VersionService:
 
     @staticmethod
     def delete_document(db: Session, document_id: str) -> bool:
-        """删除文档（级联删除所有版本）"""
+        """删除文档（级联删除所有版本，并释放版本引用的内容块）"""
         document = VersionService.get_document(db, document_id)
         if not document:
             return False
 
+        blob_refs = VersionStorage.document_blob_refs(db, document_id)
         db.delete(document)
+        db.flush()
+        VersionStorage.release_blobs(db, blob_refs)
         db.commit()
         return True
 
@@ -176,83 +189,178 @@ class VersionService:
             # 内容未变化，不创建新版本
             return None
 
-        # 创建新版本
+        # 创建新版本（内容相同的版本共享同一个内容块）
         new_version_number = document.current_version_number + 1
         new_version = Version(
             document_id=document_id,
             version_number=new_version_number,
-            content=version_data.content,
             content_hash=content_hash,
+            content_length=len(version_data.content),
+            content_bytes=len(version_data.content.encode("utf-8")),
             author=version_data.author or "unknown",
             author_id=author_id,
             commit_message=version_data.commit_message,
             save_type=version_data.save_type,
             parent_version_id=latest_version.id if latest_version else None,
         )
+        VersionStorage.store_content(db, new_version, version_data.content)
 
         db.add(new_version)
         document.current_version_number = new_version_number
+        db.flush()
+        VersionStorage.set_content(new_version, version_data.content)
         db.commit()
         db.refresh(new_version)
+        VersionStorage.set_content(new_version, version_data.content)
 
         return new_version
 
     @staticmethod
     def get_version(db: Session, version_id: str) -> Optional[Version]:
-        """获取指定版本"""
-        return db.query(Version).filter(Version.id == version_id).first()
+        """获取指定版本（以增量存储的内容自动还原）"""
+        return VersionStorage.load(
+            db,
+            db.query(Version)
+            .options(VersionStorage.with_content())
+            .filter(Version.id == version_id)
+            .first(),
+        )
 
     @staticmethod
     def get_version_by_number(
         db: Session, document_id: str, version_number: int
     ) -> Optional[Version]:
-        """根据版本号获取版本"""
-        return (
+        """根据版本号获取版本（以增量存储的内容自动还原）"""
+        return VersionStorage.load(
+            db,
             db.query(Version)
+            .options(VersionStorage.with_content())
             .filter(
                 Version.document_id == document_id,
                 Version.version_number == version_number,
             )
-            .first()
+            .first(),
         )
 
+    @staticmethod
+    def get_versions_in(
+        db: Session,
+        version_ids: List[str],
+        document_id: Optional[str] = None,
+        version_numbers: Optional[List[int]] = None,
+    ) -> List[Version]:
+        """
+        一次查询获取多个版本
+
+        Args:
+            db: 数据库会话
+            version_ids: 版本ID列表
+            document_id: 文档ID（按版本号查询时必填）
+            version_numbers: 版本号列表
+
+        Returns:
+            版本列表（顺序不定，不存在的版本不返回）
+        """
+        conditions = []
+        if version_ids:
+            conditions.append(Version.id.in_(version_ids))
+        if document_id and version_numbers:
+            conditions.append(
+                and_(
+                    Version.document_id == document_id,
+                    Version.version_number.in_(version_numbers),
+                )
+            )
+        if not conditions:
+            return []
+
+        versions = (
+            db.query(Version)
+            .options(VersionStorage.with_content())
+            .filter(or_(*conditions))
+            .all()
+        )
+        VersionStorage.materialize(db, versions)
+        return versions
+
     @staticmethod
     def get_latest_version(db: Session, document_id: str) -> Optional[Version]:
         """获取文档的最新版本"""
-        return (
+        return VersionStorage.load(
+            db,
             db.query(Version)
+            .options(VersionStorage.with_content())
             .filter(Version.document_id == document_id)
             .order_by(desc(Version.version_number))
-            .first()
+            .first(),
         )
 
     @staticmethod
     def get_versions(
         db: Session,
         document_id: str,
-        skip: int = 0,
+        cursor: Optional[str] = None,
         limit: int = 50,
         save_type: Optional[str] = None,
-    ) -> List[Version]:
+    ) -> Tuple[List[Tuple], Optional[str]]:
         """
-        获取文档的版本列表
+        获取文档的版本列表（只查询列表所需的列，不读取内容；按版本号从新到旧游标分页）
 
         Args:
             db: 数据库会话
             document_id: 文档ID
-            skip: 跳过数量
+            cursor: 上一页返回的游标（第一页为 None），无效时抛出 ValueError
             limit: 限制数量
             save_type: 保存类型筛选 (manual, auto, draft)
 
         Returns:
-            版本列表
+            (版本列表行（列名与 VersionListItem 的字段相同）, 下一页的游标)
         """
-        query = db.query(Version).filter(Version.document_id == document_id)
+        query = db.query(
+            Version.id,
+            Version.version_number,
+            Version.created_at,
+            Version.author,
+            Version.commit_message,
+            Version.save_type,
+            Version.content_length,
+            Version.content_bytes,
+            Version.lines_added,
+            Version.lines_removed,
+            Version.byte_delta,
+        ).filter(Version.document_id == document_id)
 
         if save_type:
             query = query.filter(Version.save_type == save_type)
 
-        return query.order_by(desc(Version.version_number)).offset(skip).limit(limit).all()
+        return keyset_page(
+            query, [(Version.version_number, True)], cursor, limit, "versions"
+        )
+
+    @staticmethod
+    def get_version_activity(db: Session, document_id: str) -> List[Tuple]:
+        """
+        获取文档所有版本的变化量（只查询所需的列，不读取内容）
+
+        Args:
+            db: 数据库会话
+            document_id: 文档ID
+
+        Returns:
+            (版本号, 创建时间, 新增行数, 删除行数, 字节变化) 列表，按版本号升序
+        """
+        return (
+            db.query(
+                Version.version_number,
+                Version.created_at,
+                Version.lines_added,
+                Version.lines_removed,
+                Version.byte_delta,
+            )
+            .filter(Version.document_id == document_id)
+            .order_by(Version.version_number)
+            .all()
+        )
 
     @staticmethod
     def restore_version(db: Session, document_id: str, version_id: str) -> Optional[Version]:
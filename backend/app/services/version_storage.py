@@ -0,0 +1,692 @@
+"""
+版本内容存储
+最新版本保存完整内容，较旧的版本保存相对于下一个版本的反向增量，
+每隔 VERSION_KEYFRAME_INTERVAL 个版本保留一个完整的关键帧，
+还原任意版本最多只需应用 interval - 1 个增量。
+超过 VERSION_COMPRESS_MIN_BYTES 的完整内容或增量压缩后保存在 payload 列。
+新保存的完整内容放在按 SHA-256 去重的共享内容块（content_blobs）中，
+恢复旧版本、重复的自动保存等内容相同的版本只增加引用计数
+"""
+import hashlib
+import json
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, undefer_group
+from sqlalchemy.orm.attributes import set_committed_value
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models.document import ContentBlob, Version
+from .diff_algorithms import (
+    DiffBudget,
+    DiffBudgetExceeded,
+    diff_sequences,
+    prepare_sequences,
+)
+from .diff_script import tokenize_lines
+from .content_codecs import CODEC_PLAIN, compress_text, decompress_text
+
+logger = logging.getLogger(__name__)
+
+# 存储方式（codec 不为 plain 时，content / delta 为空，压缩后的数据在 payload 中）
+STORAGE_FULL = "full"  # content 为完整内容
+STORAGE_DELTA = "delta"  # delta 为相对 delta_base_id 版本的反向增量，content 为空
+STORAGE_BLOB = "blob"  # 完整内容保存在 blob_hash 指向的内容块中，content 为空
+
+
+class VersionStorage:
+    """
+    版本内容存储服务
+
+    增量格式为 JSON 列表：[start, end] 表示复制基准版本内容的 [start, end) 区间，
+    字符串表示插入的文本。增量按行（超长行按伪行）计算，只在明显小于
+    完整内容时才替换完整内容
+    """
+
+    @staticmethod
+    def with_content():
+        """查询选项：同时加载延迟加载的内容列（content / delta / payload）"""
+        return undefer_group("content")
+
+    @staticmethod
+    def is_keyframe(version_number: int) -> bool:
+        """是否为关键帧（始终保存完整内容），间隔为 0 时不使用增量存储"""
+        interval = settings.VERSION_KEYFRAME_INTERVAL
+        return interval <= 0 or (version_number - 1) % interval == 0
+
+    @staticmethod
+    def encode_delta(base: str, target: str) -> str:
+        """
+        计算由基准内容还原目标内容的增量
+
+        Args:
+            base: 基准内容（较新的版本）
+            target: 目标内容（较旧的版本）
+
+        Returns:
+            增量（JSON）
+        """
+        base_lines, base_bounds, _ = tokenize_lines(base)
+        target_lines, target_bounds, _ = tokenize_lines(target)
+
+        budget = DiffBudget(
+            time.monotonic() + settings.DIFF_TIME_BUDGET_MS / 1000,
+            settings.DIFF_COST_BUDGET,
+        )
+        try:
+            opcodes, _ = diff_sequences(
+                base_lines, target_lines, settings.DIFF_ALGORITHM, budget
+            )
+        except DiffBudgetExceeded:
+            # 超出预算时只复用公共首尾
+            prepared = prepare_sequences(base_lines, target_lines)
+            prefix, suffix = prepared.prefix, prepared.suffix
+            base_end = len(base_lines) - suffix
+            target_end = len(target_lines) - suffix
+            opcodes = [
+                ("equal", 0, prefix, 0, prefix),
+                ("replace", prefix, base_end, prefix, target_end),
+                ("equal", base_end, len(base_lines), target_end, len(target_lines)),
+            ]
+
+        delta: List = []
+        for tag, i1, i2, j1, j2 in opcodes:
+            if tag == "equal":
+                if i2 == i1:
+                    continue
+                start, end = base_bounds[i1], base_bounds[i2]
+                if delta and isinstance(delta[-1], list) and delta[-1][1] == start:
+                    delta[-1][1] = end
+                else:
+                    delta.append([start, end])
+            elif j2 > j1:
+                text = target[target_bounds[j1]:target_bounds[j2]]
+                if delta and isinstance(delta[-1], str):
+                    delta[-1] += text
+                else:
+                    delta.append(text)
+        return json.dumps(delta, ensure_ascii=False, separators=(",", ":"))
+
+    @staticmethod
+    def apply_delta(base: str, delta: str) -> str:
+        """由基准内容和增量还原内容"""
+        return "".join(
+            base[item[0]:item[1]] if isinstance(item, list) else item
+            for item in json.loads(delta)
+        )
+
+    @staticmethod
+    def encode_payload(text: str) -> Tuple[str, Optional[bytes]]:
+        """
+        按配置压缩要保存的文本
+
+        Returns:
+            (编码名称, 压缩后的数据)；小于阈值时为 ("plain", None)，文本按原样保存
+        """
+        codec = settings.VERSION_CODEC
+        if codec == CODEC_PLAIN:
+            return CODEC_PLAIN, None
+        # 阈值按 UTF-8 字节数比较（中文等字符占 3 个字节）；字符数已达到阈值时无需编码
+        if (
+            len(text) < settings.VERSION_COMPRESS_MIN_BYTES
+            and len(text.encode("utf-8")) < settings.VERSION_COMPRESS_MIN_BYTES
+        ):
+            return CODEC_PLAIN, None
+        return codec, compress_text(text, codec)
+
+    @staticmethod
+    def content_digest(content: str) -> str:
+        """计算内容块的键（内容的 SHA-256）"""
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def store_content(db: Session, version: Version, content: str) -> None:
+        """
+        将新版本的内容保存到共享内容块（须在 db.add(version) 之前调用，由调用方提交）
+
+        内容块已存在时只增加引用计数。版本插入后 content 列为空，
+        需要继续使用内容时调用 set_content 放回会话中的对象
+
+        Args:
+            db: 数据库会话
+            version: 尚未加入会话的新版本
+            content: 版本内容
+        """
+        digest = VersionStorage.content_digest(content)
+        VersionStorage._acquire_blob(db, digest, content)
+        version.storage = STORAGE_BLOB
+        version.blob_hash = digest
+        version.content = None
+
+    @staticmethod
+    def set_content(version: Version, content: str) -> None:
+        """将已知的完整内容放回会话中的版本对象（不会被当作修改提交）"""
+        set_committed_value(version, "content", content)
+
+    @staticmethod
+    def _acquire_blob(db: Session, digest: str, content: str) -> None:
+        """引用内容块，不存在时创建（并发创建同一内容块时改为增加引用计数）"""
+        if VersionStorage._add_blob_refs(db, digest, 1):
+            return
+        try:
+            with db.begin_nested():
+                db.add(
+                    ContentBlob(
+                        hash=digest, size=len(content), content=content, ref_count=1
+                    )
+                )
+        except IntegrityError:
+            VersionStorage._add_blob_refs(db, digest, 1)
+
+    @staticmethod
+    def _add_blob_refs(db: Session, digest: str, count: int) -> bool:
+        """调整内容块的引用计数，返回内容块是否存在"""
+        return bool(
+            db.query(ContentBlob)
+            .filter(ContentBlob.hash == digest)
+            .update(
+                {ContentBlob.ref_count: ContentBlob.ref_count + count},
+                synchronize_session=False,
+            )
+        )
+
+    @staticmethod
+    def document_blob_refs(db: Session, document_id: str) -> Dict[str, int]:
+        """文档的版本对各内容块的引用数（删除文档前调用，删除后用 release_blobs 释放）"""
+        return dict(
+            db.query(Version.blob_hash, func.count(Version.id))
+            .filter(Version.document_id == document_id, Version.blob_hash.isnot(None))
+            .group_by(Version.blob_hash)
+            .all()
+        )
+
+    @staticmethod
+    def release_blobs(db: Session, refs: Dict[str, int]) -> None:
+        """
+        释放内容块引用（引用版本已删除或已改为其他存储方式后调用，由调用方提交）
+
+        Args:
+            db: 数据库会话
+            refs: 内容块键 -> 释放的引用数
+        """
+        for digest, count in refs.items():
+            VersionStorage._add_blob_refs(db, digest, -count)
+        if refs:
+            db.query(ContentBlob).filter(
+                ContentBlob.hash.in_(list(refs)), ContentBlob.ref_count <= 0
+            ).delete(synchronize_session=False)
+
+    @staticmethod
+    def _blob_text(blob: ContentBlob) -> str:
+        """内容块的文本，按需解压"""
+        if blob.codec == CODEC_PLAIN:
+            return blob.content
+        return decompress_text(blob.payload, blob.codec)
+
+    @staticmethod
+    def _stored_text(version: Version) -> str:
+        """版本实际保存的文本（完整内容或增量），按需解压"""
+        if version.codec == CODEC_PLAIN:
+            return version.content if version.storage == STORAGE_FULL else version.delta
+        return decompress_text(version.payload, version.codec)
+
+    @staticmethod
+    def _load_delta_bases(db: Session, versions: List[Version]) -> Dict[str, Version]:
+        """
+        一次查询加载增量链上的全部基准版本（含内容列）
+
+        递归 CTE 沿 delta_base_id 向上遍历，直到完整内容或内容块存储的版本为止
+
+        Args:
+            db: 数据库会话
+            versions: 需要还原的版本
+
+        Returns:
+            版本 ID 到基准版本的映射
+        """
+        base_ids = {
+            version.delta_base_id
+            for version in versions
+            if version.storage == STORAGE_DELTA
+        }
+        if not base_ids:
+            return {}
+
+        columns = (Version.id, Version.delta_base_id, Version.storage)
+        chain = (
+            select(*columns)
+            .where(Version.id.in_(base_ids))
+            .cte("delta_chain", recursive=True)
+        )
+        chain = chain.union(
+            select(*columns)
+            .join(chain, Version.id == chain.c.delta_base_id)
+            .where(chain.c.storage == STORAGE_DELTA)
+        )
+        bases = (
+            db.query(Version)
+            .options(VersionStorage.with_content())
+            .filter(Version.id.in_(select(chain.c.id)))
+            .all()
+        )
+        return {base.id: base for base in bases}
+
+    @staticmethod
+    def materialize(db: Session, versions: Iterable[Optional[Version]]) -> None:
+        """
+        还原以增量、内容块或压缩存储的版本内容（写入 version.content，不会被当作修改提交）
+
+        增量链上的基准版本和引用的内容块各用一次查询批量加载，之后在内存中还原；
+        同一批版本按版本号从新到旧还原，已还原的版本直接作为后续版本的基准，
+        相邻版本的列表只需各应用一次增量
+
+        Args:
+            db: 数据库会话
+            versions: 版本列表（可包含 None）
+        """
+        pending = [
+            version
+            for version in versions
+            if version is not None and version.content is None
+        ]
+        if not pending:
+            return
+
+        known = {version.id: version for version in pending}
+        known.update(VersionStorage._load_delta_bases(db, pending))
+
+        blob_hashes = {
+            version.blob_hash
+            for version in known.values()
+            if version.storage == STORAGE_BLOB and version.content is None
+        }
+        blobs = {}
+        if blob_hashes:
+            blobs = {
+                blob.hash: blob
+                for blob in db.query(ContentBlob).filter(ContentBlob.hash.in_(blob_hashes))
+            }
+
+        for version in sorted(pending, key=lambda v: v.version_number, reverse=True):
+            if version.content is not None:
+                continue
+
+            chain = []
+            current = version
+            while current.content is None:
+                if current.storage == STORAGE_FULL:
+                    set_committed_value(
+                        current, "content", VersionStorage._stored_text(current)
+                    )
+                    break
+                if current.storage == STORAGE_BLOB:
+                    blob = blobs.get(current.blob_hash)
+                    if blob is None:
+                        raise ValueError(f"Missing content blob for version {current.id}")
+                    set_committed_value(
+                        current, "content", VersionStorage._blob_text(blob)
+                    )
+                    break
+                chain.append(current)
+                current = known.get(current.delta_base_id)
+                if current is None:
+                    raise ValueError(f"Missing delta base for version {chain[-1].id}")
+
+            content = current.content
+            for delta_version in reversed(chain):
+                content = VersionStorage.apply_delta(
+                    content, VersionStorage._stored_text(delta_version)
+                )
+                set_committed_value(delta_version, "content", content)
+
+    @staticmethod
+    def load(db: Session, version: Optional[Version]) -> Optional[Version]:
+        """还原单个版本的内容并返回该版本"""
+        VersionStorage.materialize(db, [version])
+        return version
+
+    @staticmethod
+    def deltify(db: Session, version: Version, base: Version) -> bool:
+        """
+        将版本改为相对基准版本的反向增量存储（由调用方提交）
+
+        关键帧、已是增量存储、增量不够小或内容块被其他版本共享
+        （转换不能释放任何空间）的版本保持不变
+
+        Args:
+            db: 数据库会话
+            version: 要转换的版本
+            base: 基准版本（同一文档中紧随其后的版本）
+
+        Returns:
+            是否已转换
+        """
+        if (
+            version.storage not in (STORAGE_FULL, STORAGE_BLOB)
+            or VersionStorage.is_keyframe(version.version_number)
+            or base.document_id != version.document_id
+            or base.version_number <= version.version_number
+        ):
+            return False
+        blob_hash = version.blob_hash if version.storage == STORAGE_BLOB else None
+        if blob_hash is not None:
+            ref_count = (
+                db.query(ContentBlob.ref_count)
+                .filter(ContentBlob.hash == blob_hash)
+                .scalar()
+            )
+            if ref_count != 1:
+                return False
+
+        VersionStorage.materialize(db, [version, base])
+        content = version.content
+        delta = VersionStorage.encode_delta(base.content, content)
+        if len(delta) > len(content) * settings.VERSION_DELTA_MAX_RATIO:
+            return False
+        if VersionStorage.apply_delta(base.content, delta) != content:
+            logger.error(f"Delta round trip failed for version {version.id}")
+            return False
+
+        codec, payload = VersionStorage.encode_payload(delta)
+        values = {
+            "storage": STORAGE_DELTA,
+            "delta_base_id": base.id,
+            "delta": delta if payload is None else None,
+            "content": None,
+            "blob_hash": None,
+            "codec": codec,
+            "payload": payload,
+        }
+        if not VersionStorage._update_stored(db, version, version.storage, values):
+            return False
+        if blob_hash is not None:
+            VersionStorage.release_blobs(db, {blob_hash: 1})
+        return True
+
+    @staticmethod
+    def move_to_blob(db: Session, version: Version) -> bool:
+        """
+        将以完整内容保存在版本行中的版本改为引用共享内容块（由调用方提交）
+
+        Args:
+            db: 数据库会话
+            version: 版本
+
+        Returns:
+            是否已转换
+        """
+        if version.storage != STORAGE_FULL:
+            return False
+
+        VersionStorage.materialize(db, [version])
+        digest = VersionStorage.content_digest(version.content)
+        VersionStorage._acquire_blob(db, digest, version.content)
+        values = {
+            "storage": STORAGE_BLOB,
+            "blob_hash": digest,
+            "content": None,
+            "codec": CODEC_PLAIN,
+            "payload": None,
+        }
+        if VersionStorage._update_stored(db, version, STORAGE_FULL, values):
+            return True
+        VersionStorage.release_blobs(db, {digest: 1})
+        return False
+
+    @staticmethod
+    def _update_stored(
+        db: Session, version: Version, expected_storage: str, values: Dict
+    ) -> bool:
+        """
+        条件更新版本的存储列（存储方式已被其他 worker 改变时不更新）
+
+        当前会话中的对象保留已还原的完整内容，无需再次还原
+        """
+        updated = (
+            db.query(Version)
+            .filter(Version.id == version.id, Version.storage == expected_storage)
+            .update(
+                {getattr(Version, key): value for key, value in values.items()},
+                synchronize_session=False,
+            )
+        )
+        for key, value in values.items():
+            if key != "content":
+                set_committed_value(version, key, value)
+        return bool(updated)
+
+    @staticmethod
+    def compress(db: Session, version: Version) -> bool:
+        """
+        按当前配置重新编码版本保存的文本（由调用方提交）
+
+        Args:
+            db: 数据库会话
+            version: 版本
+
+        Returns:
+            编码是否发生变化
+        """
+        if version.storage == STORAGE_BLOB:
+            blob = db.get(ContentBlob, version.blob_hash)
+            return blob is not None and VersionStorage._compress_blob(db, blob)
+
+        text = VersionStorage._stored_text(version)
+        codec, payload = VersionStorage.encode_payload(text)
+        if codec == version.codec:
+            return False
+
+        # 只重新编码保存的文本，增量版本无需还原完整内容
+        full = version.storage == STORAGE_FULL
+        if full and version.content is None:
+            set_committed_value(version, "content", text)
+        values = {
+            "codec": codec,
+            "payload": payload,
+            "content": text if full and payload is None else None,
+            "delta": text if not full and payload is None else None,
+        }
+        return VersionStorage._update_stored(db, version, version.storage, values)
+
+    @staticmethod
+    def _compress_blob(db: Session, blob: ContentBlob) -> bool:
+        """按当前配置重新编码内容块（由调用方提交），返回编码是否发生变化"""
+        text = VersionStorage._blob_text(blob)
+        codec, payload = VersionStorage.encode_payload(text)
+        if codec == blob.codec:
+            return False
+
+        values = {
+            "codec": codec,
+            "payload": payload,
+            "content": text if payload is None else None,
+        }
+        updated = (
+            db.query(ContentBlob)
+            .filter(ContentBlob.hash == blob.hash, ContentBlob.codec == blob.codec)
+            .update(
+                {getattr(ContentBlob, key): value for key, value in values.items()},
+                synchronize_session=False,
+            )
+        )
+        for key, value in values.items():
+            set_committed_value(blob, key, value)
+        return bool(updated)
+
+    @staticmethod
+    def compact_after_save(version_id: str) -> None:
+        """
+        后台任务：新版本保存后压缩其内容块，并将父版本（上一个最新版本）转换为增量存储
+
+        Args:
+            version_id: 新创建的版本ID
+        """
+        db = SessionLocal()
+        try:
+            options = [VersionStorage.with_content()]
+            version = db.get(Version, version_id, options=options)
+            if not version:
+                return
+            parent = (
+                db.get(Version, version.parent_version_id, options=options)
+                if version.parent_version_id
+                else None
+            )
+            if parent:
+                VersionStorage.deltify(db, parent, version)
+            VersionStorage.compress(db, version)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to compact storage after version {version_id}: {e}")
+        finally:
+            db.close()
+
+    @staticmethod
+    def recompress_all(batch_size: int = 100) -> int:
+        """
+        按当前配置（VERSION_CODEC、VERSION_COMPRESS_MIN_BYTES）重新编码已有版本
+
+        按版本ID分批遍历，每批提交一次，可随时中断后重新执行。
+        内容块通过引用它的版本重新编码，已按当前配置编码的内容块直接跳过
+
+        Args:
+            batch_size: 每批处理的版本数
+
+        Returns:
+            编码发生变化的版本数
+        """
+        changed = 0
+        last_id = ""
+        db = SessionLocal()
+        try:
+            while True:
+                versions = (
+                    db.query(Version)
+                    .options(VersionStorage.with_content())
+                    .filter(Version.id > last_id)
+                    .order_by(Version.id)
+                    .limit(batch_size)
+                    .all()
+                )
+                if not versions:
+                    break
+                for version in versions:
+                    if VersionStorage.compress(db, version):
+                        changed += 1
+                db.commit()
+                last_id = versions[-1].id
+                db.expunge_all()
+                logger.info(f"Recompressed {changed} versions (up to {last_id})")
+        finally:
+            db.close()
+        return changed
+
+    @staticmethod
+    def migrate_document(db: Session, document_id: str) -> Dict[str, int]:
+        """
+        将文档的已有版本转换为增量存储（迁移工具，逐个版本提交）
+
+        每个版本以同一文档中紧随其后的版本为基准，最新版本、关键帧
+        以及增量不够小的版本改为引用共享内容块
+
+        Args:
+            db: 数据库会话
+            document_id: 文档ID
+
+        Returns:
+            转换为增量的版本数、转换前后的存储字符数和改为引用内容块的版本数
+        """
+        ids = [
+            row.id
+            for row in db.query(Version.id)
+            .filter(Version.document_id == document_id)
+            .order_by(Version.version_number.desc())
+        ]
+        result = {"converted": 0, "chars_before": 0, "chars_after": 0, "blobs": 0}
+        base = None
+        for version_id in ids:
+            version = VersionStorage.load(
+                db,
+                db.get(Version, version_id, options=[VersionStorage.with_content()]),
+            )
+            content = version.content
+            if base is not None and version.storage in (STORAGE_FULL, STORAGE_BLOB):
+                if VersionStorage.deltify(db, version, base):
+                    delta = version.delta
+                    db.commit()
+                    # 提交后保留已还原的内容，作为下一个版本的基准
+                    set_committed_value(version, "content", content)
+                    result["converted"] += 1
+                    result["chars_before"] += len(content)
+                    result["chars_after"] += len(delta)
+            if VersionStorage.move_to_blob(db, version):
+                db.commit()
+                set_committed_value(version, "content", content)
+                result["blobs"] += 1
+            # 只保留基准版本，其余版本及时释放
+            if base is not None:
+                db.expunge(base)
+            base = version
+        return result
+
+    @staticmethod
+    def backfill_content_lengths(batch_size: int = 100) -> int:
+        """
+        回填已有版本的内容字符数和字节数（列表接口只读取这两列，不读取内容）
+
+        按文档逐个处理，同一文档的版本按版本号从新到旧分批还原，每批提交一次。
+        部署后通过 migrations/backfill_content_lengths.py 执行
+
+        Args:
+            batch_size: 每批处理的版本数
+
+        Returns:
+            回填的版本数
+        """
+        total = 0
+        db = SessionLocal()
+        try:
+            document_ids = [
+                row.document_id
+                for row in db.query(Version.document_id)
+                .filter(Version.content_bytes.is_(None))
+                .distinct()
+            ]
+            for document_id in document_ids:
+                while True:
+                    versions = (
+                        db.query(Version)
+                        .options(VersionStorage.with_content())
+                        .filter(
+                            Version.document_id == document_id,
+                            Version.content_bytes.is_(None),
+                        )
+                        .order_by(Version.version_number.desc())
+                        .limit(batch_size)
+                        .all()
+                    )
+                    if not versions:
+                        break
+                    VersionStorage.materialize(db, versions)
+                    for version in versions:
+                        db.query(Version).filter(Version.id == version.id).update(
+                            {
+                                Version.content_length: len(version.content),
+                                Version.content_bytes: len(
+                                    version.content.encode("utf-8")
+                                ),
+                            },
+                            synchronize_session=False,
+                        )
+                    db.commit()
+                    db.expunge_all()
+                    total += len(versions)
+                logger.info(f"Backfilled content lengths of {total} versions")
+        finally:
+            db.close()
+        return total
@@ -0,0 +1,19 @@
+-- 添加持久化差异缓存表
+-- 执行时间: 2026-10-16
+
+USE textdiff;
+
+-- 相邻版本差异缓存：按两个版本的内容哈希和比较模式索引，跨文档共享
+CREATE TABLE IF NOT EXISTS version_diffs (
+    id VARCHAR(36) PRIMARY KEY COMMENT '记录ID',
+    old_content_hash VARCHAR(64) NOT NULL COMMENT '旧版本内容哈希',
+    new_content_hash VARCHAR(64) NOT NULL COMMENT '新版本内容哈希',
+    diff_mode VARCHAR(20) NOT NULL COMMENT '差异模式: semantic, line',
+    algorithm VARCHAR(20) NOT NULL COMMENT '差异算法: myers, patience, histogram, difflib',
+    result LONGTEXT NOT NULL COMMENT '差异结果(JSON)',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+
+    UNIQUE INDEX idx_version_diff_key (old_content_hash, new_content_hash, diff_mode, algorithm)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='版本差异缓存表';
+
+SELECT 'version_diffs table created successfully' AS status;
@@ -0,0 +1,16 @@
+-- 添加版本行来源索引表（blame）
+-- 执行时间: 2026-10-16
+
+USE textdiff;
+
+-- 每个版本一条记录：各行最后一次被修改时的版本号（游程编码）
+-- 已有版本无需回填，首次查询 blame 时按父版本链自动补建
+CREATE TABLE IF NOT EXISTS version_line_origins (
+    version_id VARCHAR(36) PRIMARY KEY COMMENT '版本ID',
+    origins LONGTEXT NOT NULL COMMENT '行来源(JSON): [[版本号, 连续行数], ...]',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+
+    FOREIGN KEY (version_id) REFERENCES versions(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='版本行来源索引表';
+
+SELECT 'version_line_origins table created successfully' AS status;
@@ -0,0 +1,13 @@
+-- 添加版本变化量字段
+-- 执行时间: 2026-10-17
+
+USE textdiff;
+
+-- 相对父版本的变化量，保存版本后在后台计算，尚未计算时为 NULL
+-- 已有版本执行 backfill_change_magnitudes.py 回填
+ALTER TABLE versions
+    ADD COLUMN lines_added INT NULL COMMENT '相对父版本新增的行数',
+    ADD COLUMN lines_removed INT NULL COMMENT '相对父版本删除的行数',
+    ADD COLUMN byte_delta INT NULL COMMENT '相对父版本的字节数变化(UTF-8)';
+
+SELECT 'versions change magnitude columns added successfully' AS status;
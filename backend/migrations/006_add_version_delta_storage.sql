@@ -0,0 +1,15 @@
+-- 添加版本增量存储字段
+-- 执行时间: 2026-10-17
+
+USE textdiff;
+
+-- 最新版本和关键帧保存完整内容，其余版本保存相对下一个版本的反向增量
+-- 已有版本执行 migrate_version_storage.py 转换
+ALTER TABLE versions
+    MODIFY COLUMN content LONGTEXT NULL COMMENT '完整内容（增量存储时为空）',
+    ADD COLUMN storage VARCHAR(10) NOT NULL DEFAULT 'full' COMMENT '存储方式: full, delta',
+    ADD COLUMN delta_base_id VARCHAR(36) NULL COMMENT '增量的基准版本ID',
+    ADD COLUMN delta LONGTEXT NULL COMMENT '反向增量(JSON)',
+    ADD CONSTRAINT fk_versions_delta_base FOREIGN KEY (delta_base_id) REFERENCES versions(id);
+
+SELECT 'versions delta storage columns added successfully' AS status;
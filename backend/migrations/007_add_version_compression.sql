@@ -0,0 +1,12 @@
+-- 添加版本内容压缩字段
+-- 执行时间: 2026-10-17
+
+USE textdiff;
+
+-- codec 不为 plain 时，完整内容或增量压缩后保存在 payload 中，content / delta 为空
+-- 已有版本执行 recompress_versions.py 转换
+ALTER TABLE versions
+    ADD COLUMN codec VARCHAR(10) NOT NULL DEFAULT 'plain' COMMENT '压缩编码: plain, zlib, lzma, zstd',
+    ADD COLUMN payload LONGBLOB NULL COMMENT '压缩后的完整内容或增量';
+
+SELECT 'versions compression columns added successfully' AS status;
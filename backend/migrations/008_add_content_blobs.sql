@@ -0,0 +1,23 @@
+-- 添加共享内容块表
+-- 执行时间: 2026-10-17
+
+USE textdiff;
+
+-- 按内容的 SHA-256 去重，内容相同的版本（恢复、重复的自动保存等）共享同一行
+-- 已有版本执行 migrate_version_storage.py 转换
+CREATE TABLE IF NOT EXISTS content_blobs (
+    hash VARCHAR(64) PRIMARY KEY COMMENT '内容的 SHA-256',
+    size INT NOT NULL COMMENT '内容字符数',
+    codec VARCHAR(10) NOT NULL DEFAULT 'plain' COMMENT '压缩编码: plain, zlib, lzma, zstd',
+    content LONGTEXT NULL COMMENT '内容（压缩时为空）',
+    payload LONGBLOB NULL COMMENT '压缩后的内容',
+    ref_count INT NOT NULL DEFAULT 0 COMMENT '引用该内容块的版本数',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='版本内容块表';
+
+ALTER TABLE versions
+    MODIFY COLUMN storage VARCHAR(10) NOT NULL DEFAULT 'full' COMMENT '存储方式: full, delta, blob',
+    ADD COLUMN blob_hash VARCHAR(64) NULL COMMENT '内容块的 SHA-256',
+    ADD CONSTRAINT fk_versions_blob FOREIGN KEY (blob_hash) REFERENCES content_blobs(hash);
+
+SELECT 'content_blobs table created successfully' AS status;
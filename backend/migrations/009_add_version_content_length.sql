@@ -0,0 +1,22 @@
+-- 添加版本内容长度字段
+-- 执行时间: 2026-10-17
+
+USE textdiff;
+
+-- 保存版本时记录内容的字符数和字节数，版本列表不再读取内容
+ALTER TABLE versions
+    ADD COLUMN content_length INT NULL COMMENT '内容字符数',
+    ADD COLUMN content_bytes INT NULL COMMENT '内容字节数(UTF-8)';
+
+-- 完整内容保存在版本行或未压缩内容块中的版本直接回填，
+-- 其余版本（增量、压缩）执行 backfill_content_lengths.py 回填
+UPDATE versions
+SET content_length = CHAR_LENGTH(content), content_bytes = LENGTH(content)
+WHERE content IS NOT NULL;
+
+UPDATE versions v
+JOIN content_blobs b ON v.blob_hash = b.hash
+SET v.content_length = CHAR_LENGTH(b.content), v.content_bytes = LENGTH(b.content)
+WHERE b.content IS NOT NULL;
+
+SELECT 'versions content length columns added successfully' AS status;
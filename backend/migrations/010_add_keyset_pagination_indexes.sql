@@ -0,0 +1,18 @@
+-- 添加游标分页索引
+-- 执行时间: 2026-10-17
+
+USE textdiff;
+
+-- 文档列表按 (owner_id, 排序字段, id) 游标分页
+ALTER TABLE documents
+    ADD INDEX idx_owner_updated (owner_id, updated_at, id),
+    ADD INDEX idx_owner_created (owner_id, created_at, id),
+    ADD INDEX idx_owner_title (owner_id, title, id);
+
+-- 用户列表按 (created_at, id) 游标分页
+ALTER TABLE users
+    ADD INDEX idx_users_created (created_at, id);
+
+-- 版本列表按 (document_id, version_number) 游标分页，使用已有的 idx_document_version
+
+SELECT 'keyset pagination indexes added successfully' AS status;
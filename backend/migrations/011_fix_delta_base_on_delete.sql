@@ -0,0 +1,13 @@
+-- 修正增量基准版本外键的删除行为
+-- 执行时间: 2026-10-17
+
+USE textdiff;
+
+-- 删除文档时基准版本可能先于依赖它的增量版本被删除，外键改为 ON DELETE SET NULL
+-- （006 迁移创建的外键为默认的 RESTRICT，删除含增量版本的文档会失败）
+ALTER TABLE versions DROP FOREIGN KEY fk_versions_delta_base;
+
+ALTER TABLE versions
+    ADD CONSTRAINT fk_versions_delta_base FOREIGN KEY (delta_base_id) REFERENCES versions(id) ON DELETE SET NULL;
+
+SELECT 'versions delta base foreign key updated successfully' AS status;
@@ -0,0 +1,28 @@
+"""
+回填版本变化量
+为执行 005 迁移前已存在的版本计算 lines_added / lines_removed / byte_delta
+
+用法（在 backend 目录下）: python migrations/backfill_change_magnitudes.py [每批数量]
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.diff_executor import diff_executor
+from app.services.version_diff_service import VersionDiffService
+
+
+def main():
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    diff_executor.start()
+    try:
+        total = asyncio.run(VersionDiffService.backfill_change_magnitudes(batch_size))
+    finally:
+        diff_executor.shutdown()
+    print(f"✓ 已回填 {total} 个版本的变化量")
+
+
+if __name__ == "__main__":
+    main()
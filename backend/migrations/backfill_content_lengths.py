@@ -0,0 +1,23 @@
+"""
+回填版本内容长度
+为执行 009 迁移后仍未记录 content_length / content_bytes 的版本（增量或压缩存储）
+还原内容并记录长度
+
+用法（在 backend 目录下）: python migrations/backfill_content_lengths.py [每批数量]
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.version_storage import VersionStorage
+
+
+def main():
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    total = VersionStorage.backfill_content_lengths(batch_size)
+    print(f"✓ 已回填 {total} 个版本的内容长度")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+版本存储迁移
+将已有文档的历史版本转换为反向增量存储，最新版本、关键帧等保存完整内容的版本
+改为引用共享内容块。需先执行 006、008 迁移。可重复执行，已转换的版本会被跳过
+
+用法（在 backend 目录下）: python migrations/migrate_version_storage.py [文档ID ...]
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.database import SessionLocal
+from app.models.document import Document
+from app.services.version_storage import VersionStorage
+
+
+def main():
+    db = SessionLocal()
+    try:
+        document_ids = sys.argv[1:] or [row.id for row in db.query(Document.id)]
+        total = {"converted": 0, "chars_before": 0, "chars_after": 0, "blobs": 0}
+        for document_id in document_ids:
+            result = VersionStorage.migrate_document(db, document_id)
+            db.expunge_all()
+            for key, value in result.items():
+                total[key] += value
+            print(
+                f"  {document_id}: 转换 {result['converted']} 个版本，"
+                f"{result['blobs']} 个版本改为引用内容块"
+            )
+
+        print(
+            f"✓ 共转换 {total['converted']} 个版本，"
+            f"内容 {total['chars_before']} 字符 -> 增量 {total['chars_after']} 字符，"
+            f"{total['blobs']} 个版本改为引用内容块"
+        )
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
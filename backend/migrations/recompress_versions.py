@@ -0,0 +1,24 @@
+"""
+版本内容重新压缩
+按当前配置（VERSION_CODEC、VERSION_COMPRESS_MIN_BYTES）转换已有版本的压缩编码，
+需先执行 007 迁移。可随时中断后重新执行，编码已符合配置的版本会被跳过
+
+用法（在 backend 目录下）: python migrations/recompress_versions.py [每批数量]
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.config import settings
+from app.services.version_storage import VersionStorage
+
+
+def main():
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    changed = VersionStorage.recompress_all(batch_size)
+    print(f"✓ 已按 {settings.VERSION_CODEC} 重新编码 {changed} 个版本")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+测试公共夹具：使用内存 SQLite 数据库（启用外键约束）
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine, event  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+from app.core.database import Base  # noqa: E402
+from app.models import document, user  # noqa: E402,F401
+from app.models.user import User  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    """每个测试使用独立的内存数据库"""
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+    @event.listens_for(engine, "connect")
+    def _enable_foreign_keys(dbapi_connection, _):
+        dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+@pytest.fixture
+def owner(db):
+    """文档所有者"""
+    owner = User(id="owner", username="owner", email="owner@example.com", password_hash="x")
+    db.add(owner)
+    db.commit()
+    return owner
@@ -0,0 +1,69 @@
+"""
+逐行溯源服务测试
+"""
+import random
+
+from app.core.config import settings
+from app.models.document import VersionLineOrigin
+from app.schemas.document import DocumentCreate, VersionCreate
+from app.services.blame_service import BlameService
+from app.services.diff_service import DiffService
+from app.services.version_service import VersionService
+
+
+def _random_edit(lines, rng):
+    lines = list(lines)
+    for _ in range(rng.randrange(1, 4)):
+        position = rng.randrange(len(lines) + 1)
+        action = rng.random()
+        if action < 0.4 and position < len(lines):
+            del lines[position]
+        elif action < 0.7 and position < len(lines):
+            lines[position] = f"changed {rng.random()}\n"
+        else:
+            lines.insert(position, f"added {rng.random()}\n")
+    return lines
+
+
+def test_origins_from_script_matches_recomputed_origins(monkeypatch):
+    # 阈值较小时部分行被切分为伪行
+    monkeypatch.setattr(settings, "DIFF_LONG_LINE_THRESHOLD", 60)
+    monkeypatch.setattr(settings, "DIFF_PSEUDO_LINE_WIDTH", 20)
+    rng = random.Random(7)
+    lines = [f"line {i}\n" if i % 5 else "long, " * 20 + "\n" for i in range(40)]
+    old = "".join(lines)
+    runs = BlameService.compute_origins(None, None, old, 1)
+    for number in range(2, 30):
+        lines = _random_edit(lines, rng)
+        if rng.random() < 0.3:
+            index = rng.randrange(len(lines))
+            lines[index] = lines[index].rstrip("\n") + " tail, " * 15 + "\n"
+        new = "".join(lines)
+        script, _ = DiffService.compute_script(old, new, diff_mode="line")
+        from_script = BlameService.origins_from_script(runs, script, number)
+        expected = BlameService.compute_origins(old, runs, new, number)
+        # 伪行粒度可能把未修改的行对齐到不同位置，但行数和修改行的判定必须一致
+        assert sum(count for _, count in from_script) == len(new.splitlines())
+        assert [n == number for n in BlameService._expand(from_script)] == [
+            n == number for n in BlameService._expand(expected)
+        ]
+        old, runs = new, from_script
+
+
+def test_get_blame_does_not_write_missing_origins(db, owner):
+    document, _ = VersionService.create_document(
+        db, DocumentCreate(title="doc", initial_content="a\nb\n"), owner.id
+    )
+    version = VersionService.create_version(
+        db, document.id, VersionCreate(content="a\nc\nb\n")
+    )
+    assert not BlameService.is_indexed(db, version.id)
+
+    ranges = BlameService.get_blame(db, version)
+    assert [(r["start_line"], r["end_line"], r["version_number"]) for r in ranges] == [
+        (1, 1, 1),
+        (2, 2, 2),
+        (3, 3, 1),
+    ]
+    db.rollback()
+    assert db.query(VersionLineOrigin).count() == 0
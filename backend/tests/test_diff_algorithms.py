@@ -0,0 +1,72 @@
+"""
+差异算法测试
+"""
+import random
+
+import pytest
+
+from app.services.diff_algorithms import (
+    DiffBudget,
+    DiffBudgetExceeded,
+    diff_sequences,
+    myers_opcodes,
+)
+
+ALGORITHMS = ("myers", "patience", "histogram")
+
+
+def _assert_valid(a, b, opcodes):
+    i = j = 0
+    for tag, i1, i2, j1, j2 in opcodes:
+        assert (i1, j1) == (i, j)
+        if tag == "equal":
+            assert a[i1:i2] == b[j1:j2]
+        i, j = i2, j2
+    assert (i, j) == (len(a), len(b))
+
+
+def _lcs_length(a, b):
+    row = [0] * (len(b) + 1)
+    for item in a:
+        prev = 0
+        for j, other in enumerate(b):
+            cur = row[j + 1]
+            row[j + 1] = prev + 1 if item == other else max(row[j + 1], row[j])
+            prev = cur
+    return row[-1]
+
+
+@pytest.mark.parametrize("algorithm", ALGORITHMS)
+def test_skewed_inputs_with_shared_alphabet_stay_cheap(algorithm):
+    rng = random.Random(1)
+    a = [rng.choice("abcd") for _ in range(20000)]
+    b = [rng.choice("abcd") for _ in range(100)]
+    budget = DiffBudget(float("inf"), 2_000_000)
+
+    opcodes, _ = diff_sequences(a, b, algorithm, budget)
+    _assert_valid(a, b, opcodes)
+
+
+def test_myers_is_minimal_for_small_edits():
+    rng = random.Random(5)
+    for _ in range(20):
+        a = [rng.randrange(30) for _ in range(300)]
+        b = list(a)
+        for _ in range(15):
+            position = rng.randrange(len(b))
+            if rng.random() < 0.5:
+                del b[position]
+            else:
+                b.insert(position, rng.randrange(30))
+        opcodes = myers_opcodes(a, b)
+        _assert_valid(a, b, opcodes)
+        matched = sum(i2 - i1 for tag, i1, i2, _, _ in opcodes if tag == "equal")
+        assert matched == _lcs_length(a, b)
+
+
+def test_budget_exceeded_is_raised():
+    rng = random.Random(2)
+    a = [rng.randrange(1000) for _ in range(5000)]
+    b = [rng.randrange(1000) for _ in range(5000)]
+    with pytest.raises(DiffBudgetExceeded):
+        diff_sequences(a, b, "myers", DiffBudget(float("inf"), 10_000))
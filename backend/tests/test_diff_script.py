@@ -0,0 +1,64 @@
+"""
+差异脚本测试
+"""
+import random
+
+from app.services.diff_script import MOVED, UNCHANGED
+from app.services.diff_service import DiffService
+
+
+def _lines(count):
+    return [f"line {i}\n" for i in range(count)]
+
+
+def _assert_hunks_consistent(script, context):
+    for hunk in script.hunks(context):
+        assert any(op[0] != UNCHANGED for op in hunk.ops)
+        assert hunk.old_start <= hunk.old_end
+        assert hunk.new_start <= hunk.new_end
+        # 旧文本区间按顺序覆盖非移动变化（移走的行没有对应的变化，区间中可能有空隙）
+        position = hunk.old_start
+        for op in hunk.ops:
+            if op[0] != MOVED:
+                assert position <= op[1] <= op[2] <= hunk.old_end
+                position = op[2]
+        new_covered = sum(op[4] - op[3] for op in hunk.ops)
+        assert hunk.new_end - hunk.new_start == new_covered
+
+
+def test_hunks_with_move_to_end():
+    lines = _lines(100)
+    old = "".join(lines)
+    new = "".join(lines[:5] + lines[10:] + lines[5:10])
+    script, _ = DiffService.compute_script(old, new, "semantic")
+
+    hunks = script.hunks(3)
+    assert len(hunks) == 1
+    hunk = hunks[0]
+    assert [op[0] for op in hunk.ops] == [UNCHANGED, MOVED]
+    assert (hunk.old_start, hunk.old_end) == (97, 100)
+    assert (hunk.new_start, hunk.new_end) == (92, 100)
+
+    only_move = script.hunks(0)
+    assert len(only_move) == 1
+    assert (only_move[0].old_start, only_move[0].old_end) == (100, 100)
+
+
+def test_hunks_consistent_with_random_moves():
+    random.seed(7)
+    for _ in range(100):
+        lines = _lines(random.randint(10, 60))
+        new_lines = list(lines)
+        for _ in range(random.randint(1, 3)):
+            start = random.randrange(len(new_lines) - 4)
+            block = new_lines[start:start + 4]
+            del new_lines[start:start + 4]
+            target = random.randint(0, len(new_lines))
+            new_lines[target:target] = block
+        if random.random() < 0.5:
+            new_lines.insert(random.randint(0, len(new_lines)), "inserted\n")
+        script, _ = DiffService.compute_script(
+            "".join(lines), "".join(new_lines), "semantic"
+        )
+        for context in (0, 1, 3):
+            _assert_hunks_consistent(script, context)
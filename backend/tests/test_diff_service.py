@@ -0,0 +1,45 @@
+"""
+差异服务测试
+"""
+import random
+
+from app.services.diff_service import DiffService
+
+
+def _document(lines, edited=()):
+    return "".join(
+        f"edited {i}\n" if i in edited else f"line {i} of the document\n"
+        for i in range(lines)
+    )
+
+
+def test_trimmed_middle_matches_naive_trim():
+    random.seed(3)
+    for _ in range(200):
+        old = "".join(random.choice("ab\n") for _ in range(random.randrange(30)))
+        new = "".join(random.choice("ab\n") for _ in range(random.randrange(30)))
+        prefix = 0
+        while prefix < min(len(old), len(new)) and old[prefix] == new[prefix]:
+            prefix += 1
+        suffix = 0
+        while (
+            suffix < min(len(old), len(new)) - prefix
+            and old[-1 - suffix] == new[-1 - suffix]
+        ):
+            suffix += 1
+        assert DiffService._trimmed_middle(old, new) == (
+            old[prefix:len(old) - suffix],
+            new[prefix:len(new) - suffix],
+        )
+
+
+def test_fine_mode_over_budget_degrades_to_line_not_block():
+    old = _document(2000)
+    new = _document(2000, edited={10, 900, 1500})
+    # 字符级单元数远超计算量预算，应跳过字符和单词粒度，行级仍能完成
+    script, stats = DiffService.compute_script(
+        old, new, diff_mode="character", cost_budget=5_000
+    )
+    assert stats["effective_mode"] == "line"
+    assert stats["degraded"] is True
+    assert stats["modified"] == 3
@@ -0,0 +1,38 @@
+"""
+文档路由测试
+"""
+import asyncio
+
+import pytest
+from fastapi import BackgroundTasks, HTTPException
+
+from app.api.routes.documents import create_document, get_documents
+from app.core.pagination import encode_cursor
+from app.schemas.document import DocumentCreate
+from app.services.version_diff_service import VersionDiffService
+from app.services.version_storage import VersionStorage
+
+
+def test_create_document_schedules_compaction_of_initial_version(db, owner):
+    background_tasks = BackgroundTasks()
+    document = asyncio.run(
+        create_document(
+            DocumentCreate(title="doc", initial_content="hello\n"),
+            background_tasks,
+            current_user=owner,
+            db=db,
+        )
+    )
+
+    initial_version = document.versions[0]
+    assert [(task.func, task.args) for task in background_tasks.tasks] == [
+        (VersionDiffService.precompute_parent_diffs, (initial_version.id,)),
+        (VersionStorage.compact_after_save, (initial_version.id,)),
+    ]
+
+
+def test_get_documents_rejects_malformed_cursor(db, owner):
+    cursor = encode_cursor("title", [["doc"], "id"])
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(get_documents(cursor=cursor, sort_by="title", current_user=owner, db=db))
+    assert exc_info.value.status_code == 400
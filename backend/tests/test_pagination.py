@@ -0,0 +1,70 @@
+"""
+键集分页测试
+"""
+import pytest
+
+from app.core.pagination import decode_cursor, encode_cursor
+from app.schemas.document import DocumentCreate, VersionCreate
+from app.services.version_service import DOCUMENT_SORT_KEYS, VersionService
+
+
+def _create_documents(db, owner, count):
+    return [
+        VersionService.create_document(
+            db, DocumentCreate(title=f"doc {i % 3}", initial_content="x\n"), owner.id
+        )[0].id
+        for i in range(count)
+    ]
+
+
+@pytest.mark.parametrize("sort_by", sorted(DOCUMENT_SORT_KEYS))
+def test_document_cursor_round_trip(db, owner, sort_by):
+    document_ids = _create_documents(db, owner, 7)
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = VersionService.get_user_documents(
+            db, owner.id, cursor=cursor, limit=3, sort_by=sort_by
+        )
+        seen.extend(document.id for document in page)
+        if cursor is None:
+            break
+
+    everything, last_cursor = VersionService.get_user_documents(
+        db, owner.id, limit=100, sort_by=sort_by
+    )
+    assert last_cursor is None
+    assert seen == [document.id for document in everything]
+    assert sorted(seen) == sorted(document_ids)
+
+
+def test_version_cursor_round_trip(db, owner):
+    document_id = _create_documents(db, owner, 1)[0]
+    for number in range(2, 8):
+        VersionService.create_version(
+            db, document_id, VersionCreate(content=f"x\n{number}\n")
+        )
+
+    numbers, cursor = [], None
+    while True:
+        rows, cursor = VersionService.get_versions(db, document_id, cursor=cursor, limit=3)
+        numbers.extend(row.version_number for row in rows)
+        if cursor is None:
+            break
+    assert numbers == list(range(7, 0, -1))
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not a cursor!",
+        encode_cursor("created_at", ["2026-01-01T00:00:00", "id"]),
+        encode_cursor("title", ["doc", "id", "extra"]),
+        encode_cursor("title", [["doc"], "id"]),
+        encode_cursor("title", ["doc", {"id": 1}]),
+        encode_cursor("title", [True, "id"]),
+    ],
+)
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, "title", DOCUMENT_SORT_KEYS["title"])
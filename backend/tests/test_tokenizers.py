@@ -0,0 +1,18 @@
+from app.services import tokenizers
+from app.services.tokenizers import get_word_tokenizer, split_words
+
+
+def test_cached_split_matches_tokenizer():
+    text = "中文 words, 标点！ more text\n" * 500
+    expected_tokens, expected_starts = get_word_tokenizer("cjk")(text)
+
+    tokenizers._token_cache.clear()
+    for _ in range(2):
+        tokens, starts = split_words(text, "cjk")
+        assert list(tokens) == list(expected_tokens)
+        assert list(starts) == list(expected_starts)
+
+    stats = tokenizers._token_cache.stats()
+    assert stats["entries"] == 1 and stats["hits"] == 1
+    # 缓存只保存偏移数组，远小于单词字符串本身
+    assert stats["current_bytes"] < sum(map(len, expected_tokens)) * 4
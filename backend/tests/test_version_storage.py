@@ -0,0 +1,117 @@
+"""
+版本存储测试
+"""
+import pytest
+from sqlalchemy import event
+
+from app.core.config import settings
+from app.models.document import ContentBlob, Version
+from app.schemas.document import DocumentCreate, VersionCreate
+from app.services.version_service import VersionService
+from app.services.version_storage import STORAGE_DELTA, VersionStorage
+
+
+def _lines(count, edited):
+    return "".join(
+        f"edited {i}\n" if i == edited else f"line {i}\n" for i in range(count)
+    )
+
+
+def _create_history(db, owner, count, monkeypatch):
+    """创建 count 个版本，并像后台任务一样将每个父版本转为增量存储"""
+    monkeypatch.setattr(settings, "VERSION_KEYFRAME_INTERVAL", 3)
+    document, _ = VersionService.create_document(
+        db, DocumentCreate(title="doc", initial_content=_lines(200, -1)), owner.id
+    )
+    contents = {1: _lines(200, -1)}
+    for number in range(2, count + 1):
+        contents[number] = _lines(200, number)
+        version = VersionService.create_version(
+            db, document.id, VersionCreate(content=contents[number])
+        )
+        parent = VersionService.get_version(db, version.parent_version_id)
+        VersionStorage.deltify(db, parent, version)
+        db.commit()
+    return document, contents
+
+
+def test_delta_versions_round_trip(db, owner, monkeypatch):
+    document, contents = _create_history(db, owner, 8, monkeypatch)
+    document_id = document.id
+    db.expunge_all()
+
+    storages = {
+        v.version_number: v.storage
+        for v in db.query(Version).filter(Version.document_id == document_id)
+    }
+    assert storages[2] == STORAGE_DELTA
+    for number, content in contents.items():
+        version = VersionService.get_version_by_number(db, document_id, number)
+        assert version.content == content
+
+
+def test_delete_document_with_delta_versions(db, owner, monkeypatch):
+    document, _ = _create_history(db, owner, 8, monkeypatch)
+    assert db.query(Version).filter(Version.storage == STORAGE_DELTA).count() > 0
+
+    assert VersionService.delete_document(db, document.id)
+    assert db.query(Version).count() == 0
+    assert db.query(ContentBlob).count() == 0
+
+
+def test_materialize_loads_chain_in_bulk(db, owner, monkeypatch):
+    document, contents = _create_history(db, owner, 9, monkeypatch)
+    document_id = document.id
+    db.expunge_all()
+
+    versions = (
+        db.query(Version)
+        .options(VersionStorage.with_content())
+        .filter(Version.document_id == document_id, Version.version_number.in_([2, 5]))
+        .all()
+    )
+    statements = []
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(db.get_bind(), "before_cursor_execute", listener)
+    try:
+        VersionStorage.materialize(db, versions)
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", listener)
+
+    # 增量链上的基准版本一次查询，内容块一次查询
+    assert len(statements) == 2
+    for version in versions:
+        assert version.content == contents[version.version_number]
+
+
+def test_compress_threshold_counts_utf8_bytes(monkeypatch):
+    monkeypatch.setattr(settings, "VERSION_CODEC", "zlib")
+    monkeypatch.setattr(settings, "VERSION_COMPRESS_MIN_BYTES", 3000)
+    assert VersionStorage.encode_payload("a" * 1500)[0] == "plain"
+    assert VersionStorage.encode_payload("中" * 1500)[0] == "zlib"
+
+
+def test_compress_delta_version_does_not_materialize(db, owner, monkeypatch):
+    monkeypatch.setattr(settings, "VERSION_CODEC", "plain")
+    document, contents = _create_history(db, owner, 5, monkeypatch)
+    document_id = document.id
+    db.expunge_all()
+
+    monkeypatch.setattr(settings, "VERSION_CODEC", "zlib")
+    monkeypatch.setattr(settings, "VERSION_COMPRESS_MIN_BYTES", 1)
+    version = (
+        db.query(Version)
+        .options(VersionStorage.with_content())
+        .filter(Version.document_id == document_id, Version.version_number == 2)
+        .one()
+    )
+    assert version.storage == STORAGE_DELTA
+    monkeypatch.setattr(
+        VersionStorage, "materialize", staticmethod(lambda *args: pytest.fail("materialized"))
+    )
+    assert VersionStorage.compress(db, version)
+    db.commit()
+    monkeypatch.undo()
+
+    db.expunge_all()
+    assert VersionService.get_version_by_number(db, document_id, 2).content == contents[2]
@@ -4,14 +4,20 @@
  */
 import axios, { AxiosInstance, AxiosError } from 'axios'
 import type {
+  CursorPage,
   Document,
   DocumentCreate,
   DocumentUpdate,
   Version,
   VersionListItem,
+  VersionActivity,
   VersionCreate,
+  BlameResponse,
   DiffResponse,
+  DiffStatsResponse,
   DiffOptions,
+  BatchDiffRequest,
+  BatchDiffResponse,
   VersionTag,
   VersionTagCreate,
 } from '@/types'
@@ -105,13 +111,13 @@ export const documentApi = {
   },
 
   /**
-   * 获取文档列表
+   * 获取文档列表（游标分页，下一页传入上一页返回的 next_cursor）
    */
   list: (params?: {
-    skip?: number
+    cursor?: string
     limit?: number
     sort_by?: string
-  }): Promise<Document[]> => {
+  }): Promise<CursorPage<Document>> => {
     return api.get('/documents', { params })
   },
 
@@ -148,16 +154,16 @@ export const versionApi = {
   },
 
   /**
-   * 获取版本列表
+   * 获取版本列表（游标分页，按版本号从新到旧）
    */
   list: (
     documentId: string,
     params?: {
-      skip?: number
+      cursor?: string
       limit?: number
       save_type?: string
     }
-  ): Promise<VersionListItem[]> => {
+  ): Promise<CursorPage<VersionListItem>> => {
     return api.get(`/documents/${documentId}/versions`, { params })
   },
 
@@ -181,6 +187,20 @@ export const versionApi = {
   restore: (documentId: string, versionId: string): Promise<Version> => {
     return api.post(`/documents/${documentId}/restore/${versionId}`)
   },
+
+  /**
+   * 获取指定版本的逐行溯源信息
+   */
+  blame: (documentId: string, versionNumber: number): Promise<BlameResponse> => {
+    return api.get(`/documents/${documentId}/blame/${versionNumber}`)
+  },
+
+  /**
+   * 获取文档所有版本的变化量（用于活动曲线）
+   */
+  activity: (documentId: string): Promise<VersionActivity> => {
+    return api.get(`/documents/${documentId}/activity`)
+  },
 }
 
 // ========== 差异比较 API ==========
@@ -225,6 +245,27 @@ export const diffApi = {
       params: options,
     })
   },
+
+  /**
+   * 批量比较多对版本
+   */
+  compareBatch: (request: BatchDiffRequest): Promise<BatchDiffResponse> => {
+    return api.post('/diff/batch', request)
+  },
+
+  /**
+   * 只获取两个版本之间的变化量（通过版本号，不含变化内容）
+   */
+  statsByNumber: (
+    documentId: string,
+    versionNum1: number,
+    versionNum2: number,
+    options?: Pick<DiffOptions, 'diff_mode' | 'ignore_whitespace' | 'ignore_case' | 'algorithm' | 'time_budget_ms'>
+  ): Promise<DiffStatsResponse> => {
+    return api.get(`/diff/document/${documentId}/number/${versionNum1}/${versionNum2}`, {
+      params: { ...options, stats_only: true },
+    })
+  },
 }
 
 // ========== 验证码 API ==========
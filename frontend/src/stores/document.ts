@@ -72,10 +72,11 @@ export const useDocumentStore = defineStore('document', () => {
    */
   async function loadVersions(documentId: string, saveType?: string) {
     try {
-      versions.value = await versionApi.list(documentId, {
+      const page = await versionApi.list(documentId, {
         limit: 100,
         save_type: saveType,
       })
+      versions.value = page.items
     } catch (error) {
       console.error('Failed to load versions:', error)
       throw error
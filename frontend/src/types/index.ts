@@ -12,6 +12,12 @@ export interface Document {
   current_version_number: number
 }
 
+// 游标分页响应：next_cursor 为下一页的游标，没有下一页时为 null
+export interface CursorPage<T> {
+  items: T[]
+  next_cursor: string | null
+}
+
 export interface DocumentCreate {
   title: string
   initial_content?: string
@@ -37,6 +43,24 @@ export interface Version {
   parent_version_id?: string
 }
 
+// 逐行溯源：连续且来源版本相同的行区间
+export interface BlameRange {
+  start_line: number
+  end_line: number
+  version_number: number
+  version_id?: string
+  author?: string
+  author_id?: string
+  created_at?: string
+}
+
+export interface BlameResponse {
+  document_id: string
+  version_id: string
+  version_number: number
+  ranges: BlameRange[]
+}
+
 export interface VersionListItem {
   id: string
   version_number: number
@@ -44,7 +68,23 @@ export interface VersionListItem {
   author: string
   commit_message?: string
   save_type: string
-  content_length: number
+  // 内容字符数和 UTF-8 字节数（旧版本回填前为 null）
+  content_length?: number | null
+  content_bytes?: number | null
+  // 相对父版本的变化量（后台计算，尚未计算时为 null）
+  lines_added?: number | null
+  lines_removed?: number | null
+  byte_delta?: number | null
+}
+
+// 文档的版本活动数据：各数组按版本号升序一一对应
+export interface VersionActivity {
+  document_id: string
+  version_numbers: number[]
+  created_at: string[]
+  lines_added: (number | null)[]
+  lines_removed: (number | null)[]
+  byte_delta: (number | null)[]
 }
 
 export interface VersionCreate {
@@ -57,13 +97,16 @@ export interface VersionCreate {
 // ========== 差异类型 ==========
 
 export interface DiffChange {
-  type: 'added' | 'deleted' | 'modified' | 'unchanged'
+  type: 'added' | 'deleted' | 'modified' | 'unchanged' | 'moved'
   old_text?: string
   new_text?: string
   old_line_start?: number
   old_line_end?: number
   new_line_start?: number
   new_line_end?: number
+  // refine 时修改块内实际变化的区间（相对于 old_text / new_text 的字符偏移）
+  old_spans?: [number, number][]
+  new_spans?: [number, number][]
 }
 
 export interface DiffResponse {
@@ -77,13 +120,92 @@ export interface DiffResponse {
     deleted: number
     modified: number
     unchanged: number
+    moved?: number
+  }
+  degraded?: boolean
+}
+
+// stats_only 响应：只含变化量，不含变化内容
+export interface DiffStatsResponse {
+  old_version_id: string
+  new_version_id: string
+  old_version_number: number
+  new_version_number: number
+  stats: DiffResponse['stats'] & {
+    effective_mode?: string
   }
+  degraded?: boolean
+}
+
+// 批量差异比较：字符串为版本ID，数字为版本号（需提供 document_id）
+export interface DiffPair {
+  old: string | number
+  new: string | number
+}
+
+export interface BatchDiffRequest extends Omit<DiffOptions, 'format' | 'context' | 'hunk_offset' | 'limit' | 'refine'> {
+  document_id?: string
+  pairs: DiffPair[]
+  format?: 'full' | 'compact'
+}
+
+// results / errors 的键为 "旧:新"
+export interface BatchDiffResponse {
+  results: Record<string, DiffResponse | CompactDiffResponse>
+  errors: Record<string, string>
+}
+
+// hunk 格式差异响应：只包含变化及其上下文，按 hunk_offset / limit 分页
+export interface DiffHunk {
+  old_start: number
+  old_count: number
+  new_start: number
+  new_count: number
+  changes: DiffChange[]
+}
+
+export interface HunkDiffResponse {
+  old_version_id: string
+  new_version_id: string
+  old_version_number: number
+  new_version_number: number
+  unit: 'line' | 'word' | 'char'
+  context: number
+  hunks: DiffHunk[]
+  total_hunks: number
+  hunk_offset: number
+  next_hunk_offset: number | null
+  stats: DiffResponse['stats']
+  degraded?: boolean
+}
+
+// 紧凑格式差异响应：opcodes 为 [类型, 旧起, 旧止, 新起, 新止]（字符偏移）
+// 类型: 0 未变化, 1 修改, 2 删除, 3 新增；inserted 依次为修改/新增的新文本
+export interface CompactDiffResponse {
+  old_version_id: string
+  new_version_id: string
+  old_version_number: number
+  new_version_number: number
+  old_content_hash?: string
+  new_content_hash?: string
+  unit: 'line' | 'word' | 'char'
+  opcodes: [number, number, number, number, number][]
+  inserted: string[]
+  stats: DiffResponse['stats']
+  degraded?: boolean
 }
 
 export interface DiffOptions {
   diff_mode?: 'character' | 'word' | 'line' | 'semantic'
   ignore_whitespace?: boolean
   ignore_case?: boolean
+  algorithm?: 'difflib' | 'myers' | 'patience' | 'histogram'
+  time_budget_ms?: number
+  format?: 'full' | 'compact' | 'hunks' | 'ndjson'
+  refine?: 'word' | 'char'
+  context?: number
+  hunk_offset?: number
+  limit?: number
 }
 
 // ========== 版本标签类型 ==========